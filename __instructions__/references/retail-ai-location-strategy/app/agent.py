@@ -15,7 +15,7 @@
 """Retail Location Strategy Agent - Root Agent Definition.
 
 This module defines the root agent for the Location Strategy Pipeline.
-It uses a SequentialAgent to orchestrate 6 specialized sub-agents:
+It orchestrates 6 specialized sub-agents:
 
 1. MarketResearchAgent - Live web research with Google Search
 2. CompetitorMappingAgent - Competitor mapping with Maps Places API
@@ -24,6 +24,10 @@ It uses a SequentialAgent to orchestrate 6 specialized sub-agents:
 5. ReportGeneratorAgent - HTML executive report generation
 6. InfographicGeneratorAgent - Visual infographic generation
 
+Stages that do not depend on each other run concurrently (1 with 2, and
+5 with 6); set PIPELINE_MODE=sequential to run them one at a time. See
+pipeline.py for the stage graph.
+
 The pipeline analyzes a target location for a specific business type and
 produces comprehensive location intelligence including recommendations,
 an HTML report, and an infographic.
@@ -46,10 +50,10 @@ Usage:
     - maps_api_key: Google Maps API key for Places search
 """
 
-from google.adk.agents import SequentialAgent
 from google.adk.agents.llm_agent import Agent
 from google.adk.tools.agent_tool import AgentTool
 
+from .pipeline import build_pipeline
 
 from .sub_agents.intake_agent.agent import intake_agent
 from .sub_agents.market_research.agent import market_research_agent
@@ -59,10 +63,10 @@ from .sub_agents.strategy_advisor.agent import strategy_advisor_agent
 from .sub_agents.infographic_generator.agent import infographic_generator_agent
 from .sub_agents.report_generator.agent import report_generator_agent
 
-from .config import FAST_MODEL, APP_NAME
+from .config import FAST_MODEL, APP_NAME, PIPELINE_MODE
 
 # location_strategy_pipeline
-location_strategy_pipeline = SequentialAgent(
+location_strategy_pipeline = build_pipeline(
     name="LocationStrategyPipeline",
     description="""Comprehensive retail location strategy analysis pipeline.
 
@@ -81,7 +85,7 @@ To use, get the following details:
 The analysis runs automatically through all stages and produces artifacts
 including JSON report, HTML report, and infographic image.
 """,
-    sub_agents=[
+    stages=[
         market_research_agent,      # Part 1: Market research with search
         competitor_mapping_agent,   # Part 2A: Competitor mapping with Maps
         gap_analysis_agent,         # Part 2B: Gap analysis with code exec
@@ -89,6 +93,7 @@ including JSON report, HTML report, and infographic image.
         report_generator_agent,     # Part 4: HTML report generation
         infographic_generator_agent,  # Part 5: Infographic generation
     ],
+    parallel=PIPELINE_MODE != "sequential",
 )
 
 # Root agent orchestrating the complete location strategy pipeline
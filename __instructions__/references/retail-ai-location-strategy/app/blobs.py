@@ -0,0 +1,177 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Content-addressed blob store for binary outputs such as the infographic.
+
+Session state is copied and serialized on every state delta and streamed to
+the AG-UI frontend, so a multi-megabyte image kept there as a base64 data URL
+is paid for again and again. Tools put the bytes here instead and keep only a
+short reference in state:
+
+    state["infographic_url"] = "/blobs/<id>"
+
+The id is a truncated SHA-256 of the content, so storing the same image twice
+keeps one file, and a blob never changes once written (clients may cache it
+forever). `blob_response` serves a blob with single-range support; the AG-UI
+backend mounts it at /blobs/{blob_id}.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+from collections.abc import Iterator, Mapping
+from pathlib import Path
+from typing import NamedTuple
+
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+
+ID_LENGTH = 32  # hex characters (128 bits)
+CHUNK_SIZE = 64 * 1024
+URL_PREFIX = "/blobs/"
+
+_ID = re.compile(rf"^[0-9a-f]{{{ID_LENGTH}}}$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class BlobRef(NamedTuple):
+    id: str
+    mime_type: str
+    size: int
+
+    @property
+    def url(self) -> str:
+        return f"{URL_PREFIX}{self.id}"
+
+
+class BlobStore:
+    """Blobs on local disk as <root>/<id[:2]>/<id>, with a small JSON sidecar for the MIME type."""
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+
+    def _path(self, blob_id: str) -> Path:
+        return self.root / blob_id[:2] / blob_id
+
+    def put(self, data: bytes, mime_type: str) -> BlobRef:
+        blob_id = hashlib.sha256(data).hexdigest()[:ID_LENGTH]
+        ref = BlobRef(blob_id, mime_type, len(data))
+        path = self._path(blob_id)
+        if path.exists():
+            return ref
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Sidecar first: a blob file is only ever visible with its metadata
+        _write_atomic(path.with_suffix(".json"), json.dumps({"mime_type": mime_type, "size": len(data)}).encode("utf-8"))
+        _write_atomic(path, data)
+        return ref
+
+    def get(self, blob_id: str) -> BlobRef | None:
+        """The blob's metadata, or None for an unknown or malformed id."""
+        if not _ID.match(blob_id):
+            return None
+        path = self._path(blob_id)
+        try:
+            meta = json.loads(path.with_suffix(".json").read_text(encoding="utf-8"))
+            size = path.stat().st_size
+        except (OSError, ValueError):
+            return None
+        return BlobRef(blob_id, meta.get("mime_type", "application/octet-stream"), size)
+
+    def read(self, blob_id: str, start: int = 0, end: int | None = None) -> Iterator[bytes]:
+        """Bytes [start, end] (inclusive) of the blob, in chunks."""
+        path = self._path(blob_id)
+        remaining = (end if end is not None else path.stat().st_size - 1) - start + 1
+        with open(path, "rb") as f:
+            f.seek(start)
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    return
+                remaining -= len(chunk)
+                yield chunk
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """(start, end) inclusive for a single `bytes=` range, or None to send the whole blob.
+
+    Multiple ranges and other units are answered with the whole blob, which
+    HTTP allows.
+
+    Raises:
+        ValueError: If the range cannot be satisfied (416).
+    """
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, end
+
+
+def blob_response(store: BlobStore, blob_id: str, headers: Mapping[str, str]) -> Response:
+    """Serve a blob: 200, 206 for a satisfiable Range, 304, 404 or 416."""
+    ref = store.get(blob_id)
+    if ref is None:
+        return Response(status_code=404)
+    etag = f'"{ref.id}"'
+    common = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        # Content-addressed: the bytes behind an id never change
+        "Cache-Control": "public, max-age=31536000, immutable",
+    }
+    if headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=common)
+    try:
+        byte_range = parse_range(headers.get("range"), ref.size)
+    except ValueError:
+        return Response(status_code=416, headers={**common, "Content-Range": f"bytes */{ref.size}"})
+
+    if byte_range is None:
+        return StreamingResponse(
+            store.read(ref.id), media_type=ref.mime_type, headers={**common, "Content-Length": str(ref.size)}
+        )
+    start, end = byte_range
+    return StreamingResponse(
+        store.read(ref.id, start, end),
+        status_code=206,
+        media_type=ref.mime_type,
+        headers={**common, "Content-Length": str(end - start + 1), "Content-Range": f"bytes {start}-{end}/{ref.size}"},
+    )
@@ -18,17 +18,27 @@ This module provides before/after callbacks for each agent in the
 Location Strategy Pipeline. Callbacks handle:
 - Logging stage transitions
 - Tracking pipeline progress in state
+- Timing each stage (state["stage_timings"])
+- Checkpointing stage outputs, and restoring them on resume (state["stage_cache"])
 - Saving artifacts (JSON report, HTML report, infographic)
+
+Stages may run concurrently (see pipeline.py), so progress is recorded per
+stage and the pipeline summary is logged when the last stage completes,
+whichever one that is.
 """
 
 import json
 import logging
+import time
 from datetime import datetime
 from typing import Optional
 
 from google.adk.agents.callback_context import CallbackContext
 from google.genai import types
 
+from ..checkpoints import CHECKPOINT_STAGES, CheckpointStore
+from ..config import CHECKPOINT_DIR, CODE_EXEC_MODEL, FAST_MODEL, PIPELINE_RESUME, PRO_MODEL
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -36,6 +46,138 @@ logging.basicConfig(
 )
 logger = logging.getLogger("LocationStrategyPipeline")
 
+# Stages tracked in stages_completed and stage_timings, besides intake
+PIPELINE_STAGES = (
+    "market_research",
+    "competitor_mapping",
+    "gap_analysis",
+    "strategy_synthesis",
+    "report_generation",
+    "infographic_generation",
+)
+
+# Placeholders set before a stage runs (AG-UI workaround below); never checkpointed
+COMPETITOR_PLACEHOLDER = "Competitor data being collected via Google Maps API..."
+GAP_PLACEHOLDER = "Gap analysis being computed..."
+
+CHECKPOINTS = CheckpointStore(CHECKPOINT_DIR) if CHECKPOINT_DIR else None
+RESUME = PIPELINE_RESUME
+
+
+# ============================================================================
+# STAGE TRACKING
+# ============================================================================
+
+def _start_stage(callback_context: CallbackContext, stage: str) -> None:
+    """Mark a stage as current and record its start time."""
+    callback_context.state["pipeline_stage"] = stage
+    timings = callback_context.state.get("stage_timings", {})
+    timings[stage] = {"started_at": time.time()}
+    callback_context.state["stage_timings"] = timings
+
+
+def _complete_stage(callback_context: CallbackContext, stage: str, restored: bool = False) -> None:
+    """Add a stage to stages_completed, record how long it took and checkpoint its output.
+
+    Logs the pipeline summary once every stage has completed.
+    """
+    if not restored:
+        _save_checkpoint(callback_context, stage)
+
+    timings = callback_context.state.get("stage_timings", {})
+    timing = timings.get(stage, {})
+    if "started_at" in timing:
+        timing["seconds"] = round(time.time() - timing["started_at"], 3)
+        timings[stage] = timing
+        callback_context.state["stage_timings"] = timings
+        logger.info(f"  Stage time: {timing['seconds']:.1f}s")
+
+    stages = callback_context.state.get("stages_completed", [])
+    stages.append(stage)
+    callback_context.state["stages_completed"] = stages
+
+    if all(s in stages for s in PIPELINE_STAGES):
+        _log_pipeline_summary(callback_context, stages, timings)
+
+
+# ============================================================================
+# CHECKPOINTS
+# ============================================================================
+
+def _run_key(state) -> str:
+    """Checkpoint directory for this run: location, business type and a hash of the other inputs."""
+    inputs = {
+        "additional_context": state.get("additional_context", ""),
+        "models": [FAST_MODEL, PRO_MODEL, CODE_EXEC_MODEL],
+    }
+    return CheckpointStore.run_key(state.get("target_location", ""), state.get("business_type", ""), inputs)
+
+
+def _save_checkpoint(callback_context: CallbackContext, stage: str) -> None:
+    if CHECKPOINTS is None or stage not in CHECKPOINT_STAGES:
+        return
+    outputs, inputs = CHECKPOINT_STAGES[stage]
+    state = callback_context.state
+    values = {key: state.get(key) for key in outputs if state.get(key) not in (None, "")}
+    if outputs[0] not in values or values[outputs[0]] in (COMPETITOR_PLACEHOLDER, GAP_PLACEHOLDER):
+        logger.warning(f"  No {outputs[0]} in state; {stage} not checkpointed")
+        return
+    try:
+        path = CHECKPOINTS.save(_run_key(state), stage, {key: state.get(key) for key in inputs}, values)
+        logger.info(f"  Checkpoint saved: {path}")
+    except OSError as e:
+        logger.warning(f"  Failed to save {stage} checkpoint: {e}")
+
+
+def _resume_stage(callback_context: CallbackContext, stage: str) -> Optional[types.Content]:
+    """When resuming, restore the stage's output from its checkpoint.
+
+    Returning content makes ADK skip the agent (and its after callback), so
+    the stage is completed here. Hits and misses go to state["stage_cache"].
+    """
+    if not RESUME or CHECKPOINTS is None or stage not in CHECKPOINT_STAGES:
+        return None
+    outputs, inputs = CHECKPOINT_STAGES[stage]
+    state = callback_context.state
+    saved = CHECKPOINTS.load(_run_key(state), stage, {key: state.get(key) for key in inputs})
+
+    cache = state.get("stage_cache", {})
+    cache[stage] = "hit" if saved is not None else "miss"
+    state["stage_cache"] = cache
+    if saved is None:
+        logger.info("  Checkpoint: miss - running stage")
+        return None
+
+    for key, value in saved.items():
+        state[key] = value
+    logger.info(f"  Checkpoint: hit - restored {', '.join(saved)}, skipping stage")
+    _complete_stage(callback_context, stage, restored=True)
+    return types.Content(
+        role="model",
+        parts=[types.Part(text=f"Restored {stage.replace('_', ' ')} from checkpoint.")],
+    )
+
+
+def _log_pipeline_summary(callback_context: CallbackContext, stages: list, timings: dict) -> None:
+    logger.info("=" * 60)
+    logger.info("PIPELINE COMPLETE")
+    logger.info(f"  Stages completed: {stages}")
+    logger.info(f"  Total stages: {len(stages)}/7")
+    for stage in PIPELINE_STAGES:
+        seconds = timings.get(stage, {}).get("seconds")
+        if seconds is not None:
+            logger.info(f"    {stage}: {seconds:.1f}s")
+    start = callback_context.state.get("pipeline_start_time")
+    if start:
+        elapsed = (datetime.now() - datetime.fromisoformat(start)).total_seconds()
+        busy = sum(t.get("seconds", 0) for t in timings.values())
+        logger.info(f"  Wall clock: {elapsed:.1f}s (stage time: {busy:.1f}s)")
+    cache = callback_context.state.get("stage_cache", {})
+    if cache:
+        hits = sum(1 for result in cache.values() if result == "hit")
+        logger.info(f"  Checkpoint hits: {hits}/{len(cache)} {cache}")
+    logger.info("=" * 60)
+
 
 # ============================================================================
 # BEFORE AGENT CALLBACKS
@@ -53,13 +195,14 @@ def before_market_research(callback_context: CallbackContext) -> Optional[types.
     callback_context.state["current_date"] = datetime.now().strftime("%Y-%m-%d")
 
     # Initialize pipeline tracking
-    callback_context.state["pipeline_stage"] = "market_research"
+    _start_stage(callback_context, "market_research")
     callback_context.state["pipeline_start_time"] = datetime.now().isoformat()
     # Don't reset stages_completed - intake stage may already be tracked
     if "stages_completed" not in callback_context.state:
         callback_context.state["stages_completed"] = []
 
-    return None  # Allow agent to proceed
+    # Restore from checkpoint when resuming, otherwise allow agent to proceed
+    return _resume_stage(callback_context, "market_research")
 
 
 def before_competitor_mapping(callback_context: CallbackContext) -> Optional[types.Content]:
@@ -71,14 +214,14 @@ def before_competitor_mapping(callback_context: CallbackContext) -> Optional[typ
 
     # Set current date for state injection in agent instruction
     callback_context.state["current_date"] = datetime.now().strftime("%Y-%m-%d")
-    callback_context.state["pipeline_stage"] = "competitor_mapping"
+    _start_stage(callback_context, "competitor_mapping")
 
     # Workaround for AG-UI middleware issue: initialize state variable
     # The middleware may end agent prematurely after tool calls, preventing output_key from being set
     if "competitor_analysis" not in callback_context.state:
-        callback_context.state["competitor_analysis"] = "Competitor data being collected via Google Maps API..."
+        callback_context.state["competitor_analysis"] = COMPETITOR_PLACEHOLDER
 
-    return None
+    return _resume_stage(callback_context, "competitor_mapping")
 
 
 def before_gap_analysis(callback_context: CallbackContext) -> Optional[types.Content]:
@@ -90,13 +233,13 @@ def before_gap_analysis(callback_context: CallbackContext) -> Optional[types.Con
 
     # Set current date for state injection in agent instruction
     callback_context.state["current_date"] = datetime.now().strftime("%Y-%m-%d")
-    callback_context.state["pipeline_stage"] = "gap_analysis"
+    _start_stage(callback_context, "gap_analysis")
 
     # Workaround for AG-UI middleware issue: initialize state variable
     if "gap_analysis" not in callback_context.state:
-        callback_context.state["gap_analysis"] = "Gap analysis being computed..."
+        callback_context.state["gap_analysis"] = GAP_PLACEHOLDER
 
-    return None
+    return _resume_stage(callback_context, "gap_analysis")
 
 
 def before_strategy_advisor(callback_context: CallbackContext) -> Optional[types.Content]:
@@ -109,9 +252,9 @@ def before_strategy_advisor(callback_context: CallbackContext) -> Optional[types
 
     # Set current date for state injection in agent instruction
     callback_context.state["current_date"] = datetime.now().strftime("%Y-%m-%d")
-    callback_context.state["pipeline_stage"] = "strategy_synthesis"
+    _start_stage(callback_context, "strategy_synthesis")
 
-    return None
+    return _resume_stage(callback_context, "strategy_synthesis")
 
 
 def before_report_generator(callback_context: CallbackContext) -> Optional[types.Content]:
@@ -123,7 +266,7 @@ def before_report_generator(callback_context: CallbackContext) -> Optional[types
 
     # Set current date for state injection in agent instruction
     callback_context.state["current_date"] = datetime.now().strftime("%Y-%m-%d")
-    callback_context.state["pipeline_stage"] = "report_generation"
+    _start_stage(callback_context, "report_generation")
 
     return None
 
@@ -137,7 +280,7 @@ def before_infographic_generator(callback_context: CallbackContext) -> Optional[
 
     # Set current date for state injection in agent instruction
     callback_context.state["current_date"] = datetime.now().strftime("%Y-%m-%d")
-    callback_context.state["pipeline_stage"] = "infographic_generation"
+    _start_stage(callback_context, "infographic_generation")
 
     return None
 
@@ -153,10 +296,7 @@ def after_market_research(callback_context: CallbackContext) -> Optional[types.C
 
     logger.info(f"STAGE 1: COMPLETE - Market research findings: {findings_len} characters")
 
-    # Update stages completed
-    stages = callback_context.state.get("stages_completed", [])
-    stages.append("market_research")
-    callback_context.state["stages_completed"] = stages
+    _complete_stage(callback_context, "market_research")
 
     return None
 
@@ -168,9 +308,7 @@ def after_competitor_mapping(callback_context: CallbackContext) -> Optional[type
 
     logger.info(f"STAGE 2A: COMPLETE - Competitor analysis: {analysis_len} characters")
 
-    stages = callback_context.state.get("stages_completed", [])
-    stages.append("competitor_mapping")
-    callback_context.state["stages_completed"] = stages
+    _complete_stage(callback_context, "competitor_mapping")
 
     return None
 
@@ -195,9 +333,7 @@ def after_gap_analysis(callback_context: CallbackContext) -> Optional[types.Cont
     else:
         logger.info("  No Python code blocks found to extract")
 
-    stages = callback_context.state.get("stages_completed", [])
-    stages.append("gap_analysis")
-    callback_context.state["stages_completed"] = stages
+    _complete_stage(callback_context, "gap_analysis")
 
     return None
 
@@ -297,9 +433,7 @@ def after_strategy_advisor(callback_context: CallbackContext) -> Optional[types.
         except Exception as e:
             logger.warning(f"  Failed to save JSON artifact: {e}")
 
-    stages = callback_context.state.get("stages_completed", [])
-    stages.append("strategy_synthesis")
-    callback_context.state["stages_completed"] = stages
+    _complete_stage(callback_context, "strategy_synthesis")
 
     return None
 
@@ -315,9 +449,7 @@ def after_report_generator(callback_context: CallbackContext) -> Optional[types.
     logger.info("STAGE 4: COMPLETE - HTML report generation finished")
     logger.info("  (Artifact saved directly by generate_html_report tool)")
 
-    stages = callback_context.state.get("stages_completed", [])
-    stages.append("report_generation")
-    callback_context.state["stages_completed"] = stages
+    _complete_stage(callback_context, "report_generation")
 
     return None
 
@@ -333,15 +465,6 @@ def after_infographic_generator(callback_context: CallbackContext) -> Optional[t
     logger.info("STAGE 5: COMPLETE - Infographic generation finished")
     logger.info("  (Artifact saved directly by generate_infographic tool)")
 
-    stages = callback_context.state.get("stages_completed", [])
-    stages.append("infographic_generation")
-    callback_context.state["stages_completed"] = stages
-
-    # Log final pipeline summary
-    logger.info("=" * 60)
-    logger.info("PIPELINE COMPLETE")
-    logger.info(f"  Stages completed: {stages}")
-    logger.info(f"  Total stages: {len(stages)}/7")
-    logger.info("=" * 60)
+    _complete_stage(callback_context, "infographic_generation")
 
     return None
@@ -0,0 +1,113 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Local checkpoint store for pipeline stage outputs.
+
+A pipeline run takes up to 30 minutes, and a failure late in the run (say,
+in infographic generation) used to mean starting again from market research.
+Each completed stage now writes the state keys it produced to a JSON file:
+
+    <root>/<location>--<business type>--<input hash>/<stage>.json
+
+The input hash covers everything else the run depends on (additional
+context, models), so changing any of it starts a fresh set of checkpoints.
+Each file also records a digest of the upstream outputs the stage read; a
+checkpoint is only used while those still match, so a re-run upstream stage
+invalidates everything after it.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any
+
+# Stage -> (state keys it writes, state keys it reads from earlier stages)
+CHECKPOINT_STAGES: dict[str, tuple[tuple[str, ...], tuple[str, ...]]] = {
+    "market_research": (("market_research_findings",), ()),
+    "competitor_mapping": (("competitor_analysis",), ()),
+    "gap_analysis": (
+        ("gap_analysis", "gap_analysis_code"),
+        ("market_research_findings", "competitor_analysis"),
+    ),
+    "strategy_synthesis": (
+        ("strategic_report",),
+        ("market_research_findings", "competitor_analysis", "gap_analysis"),
+    ),
+}
+
+
+def _jsonable(value: Any) -> Any:
+    # The strategic report may still be a Pydantic model
+    return value.model_dump() if hasattr(value, "model_dump") else value
+
+
+def digest(values: Mapping[str, Any]) -> str:
+    """Stable hash of a set of state values."""
+    encoded = json.dumps({k: _jsonable(v) for k, v in values.items()}, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", (text or "").lower()).strip("-")[:48] or "none"
+
+
+class CheckpointStore:
+    """Stage outputs on local disk, one directory per (location, business type, input hash)."""
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+
+    @staticmethod
+    def run_key(location: str, business_type: str, inputs: Mapping[str, Any]) -> str:
+        return f"{_slug(location)}--{_slug(business_type)}--{digest(inputs)[:16]}"
+
+    def _path(self, run_key: str, stage: str) -> Path:
+        return self.root / run_key / f"{stage}.json"
+
+    def load(self, run_key: str, stage: str, upstream: Mapping[str, Any]) -> dict[str, Any] | None:
+        """The state values saved for the stage, or None if missing, unreadable or stale."""
+        try:
+            record = json.loads(self._path(run_key, stage).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if record.get("upstream") != digest(upstream):
+            return None
+        return record.get("state")
+
+    def save(
+        self, run_key: str, stage: str, upstream: Mapping[str, Any], state: Mapping[str, Any]
+    ) -> Path:
+        """Atomically write the stage's state values (a crash never leaves a torn checkpoint)."""
+        path = self._path(run_key, stage)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        record = {
+            "stage": stage,
+            "saved_at": time.time(),
+            "upstream": digest(upstream),
+            "state": {k: _jsonable(v) for k, v in state.items()},
+        }
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{stage}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(record, f, default=str)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return path
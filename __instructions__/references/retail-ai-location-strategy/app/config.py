@@ -86,5 +86,21 @@ RETRY_INITIAL_DELAY = 5  # seconds - longer wait for overloaded models
 RETRY_ATTEMPTS = 5  # More attempts for transient errors
 RETRY_MAX_DELAY = 60  # seconds
 
+# Pipeline Configuration
+# "parallel" runs independent stages concurrently (market research with
+# competitor mapping, report with infographic); "sequential" runs all six
+# stages one after another.
+PIPELINE_MODE = os.environ.get("PIPELINE_MODE", "parallel").lower()
+
+# Checkpoints: completed stage outputs are saved under CHECKPOINT_DIR (empty
+# disables them). With PIPELINE_RESUME=TRUE a run for the same location,
+# business type and inputs restores completed stages instead of rerunning them.
+CHECKPOINT_DIR = os.environ.get("CHECKPOINT_DIR", str(Path(__file__).parent.parent / ".checkpoints"))
+PIPELINE_RESUME = os.environ.get("PIPELINE_RESUME", "FALSE").upper() == "TRUE"
+
+# Binary outputs (the infographic) are stored here and referenced from state
+# by URL, served by the AG-UI backend at /blobs/{id}
+BLOB_DIR = os.environ.get("BLOB_DIR", str(Path(__file__).parent.parent / ".blobs"))
+
 # App Configuration
 APP_NAME = "retail_location_strategy"
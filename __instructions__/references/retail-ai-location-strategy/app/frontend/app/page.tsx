@@ -9,6 +9,7 @@ import { MarketCard } from "@/components/MarketCard";
 import { AlternativeLocations } from "@/components/AlternativeLocations";
 import { ArtifactViewer } from "@/components/ArtifactViewer";
 import type { AgentState } from "@/lib/types";
+import { blobUrl } from "@/lib/blobs";
 
 export default function Home() {
   // Connect to agent state - this receives STATE_SNAPSHOT and STATE_DELTA events
@@ -153,10 +154,10 @@ Tell me where you want to open your business and I'll analyze the market, map co
               </div>
 
               {/* Artifact Viewer - HTML Report and Infographic (full-screen view) */}
-              {(state.html_report_content || state.infographic_base64) && (
+              {(state.html_report_content || state.infographic_url || state.infographic_base64) && (
                 <ArtifactViewer
                   htmlReport={state.html_report_content}
-                  infographic={state.infographic_base64}
+                  infographic={blobUrl(state.infographic_url) || state.infographic_base64}
                 />
               )}
             </div>
@@ -33,7 +33,7 @@ from pathlib import Path
 
 import uvicorn
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
 # Add app directory to path for imports
@@ -52,6 +52,8 @@ from ag_ui_adk import ADKAgent, add_adk_fastapi_endpoint
 
 # Import the EXISTING root_agent - no modifications needed
 from app.agent import root_agent
+from app.blobs import BlobStore, blob_response
+from app.config import BLOB_DIR
 
 # Create AG-UI wrapper around the existing ADK agent
 # Increase timeout for Strategy Synthesis which uses extended thinking
@@ -89,6 +91,16 @@ async def health_check():
     return {"status": "healthy", "agent": "LocationStrategyPipeline"}
 
 
+# Binary outputs referenced from agent state (e.g. state["infographic_url"])
+blobs = BlobStore(BLOB_DIR)
+
+
+@app.get("/blobs/{blob_id}")
+async def get_blob(blob_id: str, request: Request):
+    """Stream a stored blob; supports single byte ranges and If-None-Match."""
+    return blob_response(blobs, blob_id, request.headers)
+
+
 # Add AG-UI endpoint at root path
 # This handles all AG-UI protocol communication
 add_adk_fastapi_endpoint(app, adk_agent, path="/")
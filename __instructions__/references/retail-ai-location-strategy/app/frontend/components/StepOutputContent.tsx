@@ -1,6 +1,7 @@
 "use client";
 
 import type { AgentState } from "@/lib/types";
+import { blobUrl } from "@/lib/blobs";
 import {
   summarizeCompetitorAnalysis,
 } from "@/lib/summaryHelpers";
@@ -119,8 +120,9 @@ export function StepOutputContent({ stepId, state }: StepOutputContentProps) {
         </div>
       );
 
-    case "infographic_generation":
-      if (!state.infographic_base64) {
+    case "infographic_generation": {
+      const infographic = blobUrl(state.infographic_url) || state.infographic_base64;
+      if (!infographic) {
         return <p className="text-gray-500 text-sm italic">Creating infographic...</p>;
       }
       return (
@@ -132,7 +134,7 @@ export function StepOutputContent({ stepId, state }: StepOutputContentProps) {
                 onClick={() => {
                   const win = window.open("", "_blank");
                   if (win) {
-                    win.document.write(`<img src="${state.infographic_base64}" style="max-width:100%;"/>`);
+                    win.document.write(`<img src="${infographic}" style="max-width:100%;"/>`);
                   }
                 }}
                 className="px-3 py-1 text-xs bg-blue-500 text-white rounded hover:bg-blue-600 transition-colors"
@@ -140,7 +142,7 @@ export function StepOutputContent({ stepId, state }: StepOutputContentProps) {
                 View Image
               </button>
               <a
-                href={state.infographic_base64}
+                href={infographic}
                 download="infographic.png"
                 className="px-3 py-1 text-xs bg-gray-200 text-gray-700 rounded hover:bg-gray-300 transition-colors"
               >
@@ -150,12 +152,13 @@ export function StepOutputContent({ stepId, state }: StepOutputContentProps) {
           </div>
           {/* Small thumbnail preview */}
           <img
-            src={state.infographic_base64}
+            src={infographic}
             alt="Infographic preview"
             className="w-32 h-auto rounded shadow-sm border"
           />
         </div>
       );
+    }
 
     default:
       return null;
@@ -0,0 +1,15 @@
+/**
+ * Binary outputs (the infographic) are served by the backend's blob store;
+ * agent state only carries their path, e.g. "/blobs/<id>".
+ */
+
+const BACKEND_URL = process.env.NEXT_PUBLIC_BACKEND_URL || "http://localhost:8000";
+
+/**
+ * Resolves a blob path from agent state against the backend URL.
+ * Absolute and data: URLs are returned unchanged.
+ */
+export function blobUrl(path: string | undefined): string | undefined {
+  if (!path) return undefined;
+  return path.startsWith("/") ? `${BACKEND_URL}${path}` : path;
+}
@@ -144,7 +144,9 @@ export interface AgentState {
 
   // Artifact content (set by tools for AG-UI frontend display)
   html_report_content?: string;
-  infographic_base64?: string;
+  infographic_url?: string; // Blob path ("/blobs/<id>"), resolve with blobUrl()
+  infographic_blob?: { id: string; mime_type: string; size: number };
+  infographic_base64?: string; // Sessions from before the blob store
 
   // Metadata
   current_date?: string;
@@ -0,0 +1,94 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Stage graph for the Location Strategy Pipeline.
+
+Each stage lists the stages whose outputs it reads from state. Stages are
+grouped into layers: a layer holds every stage whose dependencies all
+finished in earlier layers. In parallel mode each layer with more than one
+stage runs as a ParallelAgent, and the layers run in order:
+
+    [MarketResearch || CompetitorMapping] -> GapAnalysis -> StrategyAdvisor
+        -> [ReportGenerator || InfographicGenerator]
+
+In sequential mode the stages run one after another, in the given order.
+"""
+
+from collections.abc import Mapping, Sequence
+
+from google.adk.agents import BaseAgent, ParallelAgent, SequentialAgent
+
+# Stage name -> stages whose output_key it reads
+STAGE_DEPENDENCIES: dict[str, tuple[str, ...]] = {
+    "MarketResearchAgent": (),
+    "CompetitorMappingAgent": (),
+    "GapAnalysisAgent": ("MarketResearchAgent", "CompetitorMappingAgent"),
+    "StrategyAdvisorAgent": ("MarketResearchAgent", "CompetitorMappingAgent", "GapAnalysisAgent"),
+    "ReportGeneratorAgent": ("StrategyAdvisorAgent",),
+    "InfographicGeneratorAgent": ("StrategyAdvisorAgent",),
+}
+
+
+def stage_layers(
+    stages: Sequence[BaseAgent],
+    dependencies: Mapping[str, Sequence[str]] = STAGE_DEPENDENCIES,
+) -> list[list[BaseAgent]]:
+    """Group stages into layers that can run concurrently, keeping the given order within a layer.
+
+    Raises:
+        ValueError: If a dependency is not one of the stages, or the dependencies form a cycle.
+    """
+    names = {stage.name for stage in stages}
+    for stage in stages:
+        unknown = set(dependencies.get(stage.name, ())) - names
+        if unknown:
+            raise ValueError(f"{stage.name} depends on unknown stage(s): {sorted(unknown)}")
+
+    done: set[str] = set()
+    pending = list(stages)
+    layers = []
+    while pending:
+        ready = [s for s in pending if set(dependencies.get(s.name, ())) <= done]
+        if not ready:
+            raise ValueError(f"Stage dependencies form a cycle: {[s.name for s in pending]}")
+        layers.append(ready)
+        done.update(s.name for s in ready)
+        pending = [s for s in pending if s.name not in done]
+    return layers
+
+
+def build_pipeline(
+    name: str,
+    description: str,
+    stages: Sequence[BaseAgent],
+    dependencies: Mapping[str, Sequence[str]] = STAGE_DEPENDENCIES,
+    parallel: bool = True,
+) -> SequentialAgent:
+    """Build the pipeline over `stages`, running independent stages concurrently when `parallel`."""
+    if not parallel:
+        return SequentialAgent(name=name, description=description, sub_agents=list(stages))
+
+    sub_agents: list[BaseAgent] = []
+    for layer in stage_layers(stages, dependencies):
+        if len(layer) == 1:
+            sub_agents.append(layer[0])
+        else:
+            sub_agents.append(
+                ParallelAgent(
+                    name=f"{name}Stage{len(sub_agents) + 1}",
+                    description=f"Runs {', '.join(s.name for s in layer)} concurrently.",
+                    sub_agents=layer,
+                )
+            )
+    return SequentialAgent(name=name, description=description, sub_agents=sub_agents)
@@ -92,7 +92,7 @@ If failed, report the error for troubleshooting.
 ## Output
 The generate_infographic tool will return a result dict containing:
 - status: "success" or "error"
-- image_data: Base64 encoded PNG (if successful)
+- image_url: URL of the generated image (if successful)
 - error_message: Error details (if failed)
 
 Store this result so the after_agent_callback can save the artifact.
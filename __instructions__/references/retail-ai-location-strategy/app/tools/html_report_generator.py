@@ -17,8 +17,13 @@
 Uses direct text generation (same as original notebook Part 4) to create
 McKinsey/BCG style 7-slide HTML presentations from strategic report data.
 Saves the generated HTML as an artifact for download in adk web.
+
+The model call goes through the async client (client.aio), so a generation
+does not block the event loop and other pipeline runs keep making progress
+while it is in flight. Cancelling the tool cancels the request.
 """
 
+import asyncio
 import logging
 from datetime import datetime
 from google.adk.tools import ToolContext
@@ -145,7 +150,9 @@ Current date: {current_date}
 
         logger.info("Generating HTML report using Gemini...")
 
-        # Retry wrapper for handling model overload errors
+        # Retry wrapper for handling model overload errors.
+        # On a coroutine function tenacity retries with asyncio.sleep, so the
+        # backoff does not block the event loop either.
         @retry(
             stop=stop_after_attempt(3),
             wait=wait_exponential(multiplier=2, min=2, max=30),
@@ -155,8 +162,8 @@ Current date: {current_date}
                 f"(attempt {retry_state.attempt_number}/3)"
             ),
         )
-        def generate_with_retry():
-            return client.models.generate_content(
+        async def generate_with_retry():
+            return await client.aio.models.generate_content(
                 model=PRO_MODEL,
                 contents=prompt,
                 config=types.GenerateContentConfig(temperature=1.0),
@@ -164,7 +171,7 @@ Current date: {current_date}
 
         # Direct text generation (NOT code execution)
         # Same as original notebook: types.GenerateContentConfig(temperature=1.0)
-        response = generate_with_retry()
+        response = await generate_with_retry()
 
         # Extract HTML from response.text
         html_code = response.text
@@ -213,6 +220,11 @@ Current date: {current_date}
             "html_length": len(html_code),
         }
 
+    except asyncio.CancelledError:
+        # Let the runner's cancellation propagate; nothing is saved
+        logger.warning("HTML report generation cancelled")
+        raise
+
     except Exception as e:
         logger.error(f"Failed to generate HTML report: {e}")
         return {
@@ -20,19 +20,30 @@ Requires GOOGLE_API_KEY environment variable to be set.
 
 Saves the generated infographic directly as an artifact using tool_context.save_artifact()
 so it's accessible in adk web UI.
+
+For the AG-UI frontend the image goes to the blob store (app/blobs.py) and
+state only holds its URL (infographic_url); the bytes never enter session
+state or the tool result.
+
+The model call goes through the async client (client.aio), so a generation
+does not block the event loop and other pipeline runs keep making progress
+while it is in flight. Cancelling the tool cancels the request.
 """
 
-import base64
+import asyncio
 import logging
 from google.adk.tools import ToolContext
 from google.genai import types
 from google.genai.errors import ServerError
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
-from ..config import IMAGE_MODEL
+from ..blobs import BlobStore
+from ..config import BLOB_DIR, IMAGE_MODEL
 
 logger = logging.getLogger("LocationStrategyPipeline")
 
+BLOBS = BlobStore(BLOB_DIR)
+
 
 async def generate_infographic(data_summary: str, tool_context: ToolContext) -> dict:
     """Generate an infographic image using Gemini's image generation capabilities.
@@ -56,6 +67,7 @@ async def generate_infographic(data_summary: str, tool_context: ToolContext) ->
             - status: "success" or "error"
             - message: Status message
             - artifact_saved: True if artifact was saved successfully
+            - image_url: Blob store URL of the image (/blobs/<id>)
             - error_message: Error details (if failed)
     """
     try:
@@ -83,7 +95,9 @@ DESIGN REQUIREMENTS:
 Create an infographic that a business executive would use in a board presentation.
 """
 
-        # Retry wrapper for handling model overload errors
+        # Retry wrapper for handling model overload errors.
+        # On a coroutine function tenacity retries with asyncio.sleep, so the
+        # backoff does not block the event loop either.
         @retry(
             stop=stop_after_attempt(3),
             wait=wait_exponential(multiplier=2, min=2, max=30),
@@ -93,8 +107,8 @@ Create an infographic that a business executive would use in a board presentatio
                 f"(attempt {retry_state.attempt_number}/3)"
             ),
         )
-        def generate_with_retry():
-            return client.models.generate_content(
+        async def generate_with_retry():
+            return await client.aio.models.generate_content(
                 model=IMAGE_MODEL,
                 contents=prompt,
                 config=types.GenerateContentConfig(
@@ -106,7 +120,7 @@ Create an infographic that a business executive would use in a board presentatio
             )
 
         # Generate the image using Gemini 3 Pro Image model
-        response = generate_with_retry()
+        response = await generate_with_retry()
 
         # Check for successful generation
         if response.candidates and len(response.candidates) > 0:
@@ -115,6 +129,17 @@ Create an infographic that a business executive would use in a board presentatio
                     image_bytes = part.inline_data.data
                     mime_type = part.inline_data.mime_type or "image/png"
 
+                    # Keep the bytes out of session state: store them once and
+                    # reference them by URL for the AG-UI frontend
+                    blob_url = None
+                    try:
+                        blob = BLOBS.put(image_bytes, mime_type)
+                        blob_url = blob.url
+                        tool_context.state["infographic_url"] = blob_url
+                        tool_context.state["infographic_blob"] = blob._asdict()
+                    except OSError as blob_error:
+                        logger.warning(f"Failed to store infographic blob: {blob_error}")
+
                     # Save the image directly as an artifact using tool_context
                     # This is the recommended ADK pattern for saving binary artifacts
                     # Note: save_artifact is async, so we must await it
@@ -130,10 +155,6 @@ Create an infographic that a business executive would use in a board presentatio
                         )
                         logger.info(f"Saved infographic artifact: {artifact_filename} (version {version})")
 
-                        # Also store base64 in state for AG-UI frontend display
-                        b64_image = base64.b64encode(image_bytes).decode('utf-8')
-                        tool_context.state["infographic_base64"] = f"data:{mime_type};base64,{b64_image}"
-
                         return {
                             "status": "success",
                             "message": f"Infographic generated and saved as artifact '{artifact_filename}'",
@@ -141,15 +162,18 @@ Create an infographic that a business executive would use in a board presentatio
                             "artifact_filename": artifact_filename,
                             "artifact_version": version,
                             "mime_type": mime_type,
+                            "image_url": blob_url,
                         }
                     except Exception as save_error:
                         logger.warning(f"Failed to save artifact: {save_error}")
-                        # Still return success with base64 data as fallback
+                        if blob_url is None:
+                            raise
+                        # Still return success: the image is reachable by URL
                         return {
                             "status": "success",
                             "message": "Infographic generated but artifact save failed",
                             "artifact_saved": False,
-                            "image_data": base64.b64encode(image_bytes).decode("utf-8"),
+                            "image_url": blob_url,
                             "mime_type": mime_type,
                             "save_error": str(save_error),
                         }
@@ -160,6 +184,11 @@ Create an infographic that a business executive would use in a board presentatio
             "error_message": "No image was generated in the response. The model may have returned text only.",
         }
 
+    except asyncio.CancelledError:
+        # Let the runner's cancellation propagate; nothing is saved
+        logger.warning("Infographic generation cancelled")
+        raise
+
     except Exception as e:
         logger.error(f"Failed to generate infographic: {e}")
         return {
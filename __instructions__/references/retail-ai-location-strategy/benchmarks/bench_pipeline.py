@@ -0,0 +1,132 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Pipeline wall clock, sequential versus parallel stages, with a stub model.
+
+Every stage agent is cloned with a model that answers after a fixed delay
+instead of calling Gemini (no API keys needed, no tool calls are made), and
+the pipeline is run through an in-memory Runner in both modes. The stage
+callbacks run as usual, so the per-stage times come from state["stage_timings"].
+
+Usage: python -m benchmarks.bench_pipeline [--latency 0.5] [--runs 3]
+"""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+from collections.abc import AsyncGenerator
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from app.callbacks import pipeline_callbacks
+from app.callbacks.pipeline_callbacks import PIPELINE_STAGES
+from app.pipeline import build_pipeline
+from app.sub_agents.competitor_mapping.agent import competitor_mapping_agent
+from app.sub_agents.gap_analysis.agent import gap_analysis_agent
+from app.sub_agents.infographic_generator.agent import infographic_generator_agent
+from app.sub_agents.market_research.agent import market_research_agent
+from app.sub_agents.report_generator.agent import report_generator_agent
+from app.sub_agents.strategy_advisor.agent import strategy_advisor_agent
+
+STAGES = [
+    market_research_agent,
+    competitor_mapping_agent,
+    gap_analysis_agent,
+    strategy_advisor_agent,
+    report_generator_agent,
+    infographic_generator_agent,
+]
+
+
+class StubLlm(BaseLlm):
+    """Answers every request with a short text after `latency` seconds."""
+
+    # A Gemini 2+ name keeps the built-in search and code execution tools happy
+    model: str = "gemini-2.5-flash"
+    latency: float = 0.5
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        await asyncio.sleep(self.latency)
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text="Stub stage output.")])
+        )
+
+
+def stub_pipeline(parallel: bool, latency: float):
+    stub = StubLlm(latency=latency)
+    # Structured output is skipped: the stub does not produce a LocationIntelligenceReport
+    stages = [stage.clone(update={"model": stub, "output_schema": None}) for stage in STAGES]
+    return build_pipeline(
+        name="LocationStrategyPipeline",
+        description="Stub-model benchmark pipeline",
+        stages=stages,
+        parallel=parallel,
+    )
+
+
+async def run_once(parallel: bool, latency: float) -> tuple[float, dict]:
+    runner = Runner(
+        app_name="bench_pipeline",
+        agent=stub_pipeline(parallel, latency),
+        session_service=InMemorySessionService(),
+    )
+    session = await runner.session_service.create_session(
+        app_name="bench_pipeline",
+        user_id="bench",
+        state={"target_location": "Indiranagar, Bangalore", "business_type": "coffee shop"},
+    )
+    message = types.Content(role="user", parts=[types.Part(text="Analyze the location.")])
+
+    start = time.perf_counter()
+    async for _ in runner.run_async(user_id="bench", session_id=session.id, new_message=message):
+        pass
+    elapsed = time.perf_counter() - start
+
+    session = await runner.session_service.get_session(
+        app_name="bench_pipeline", user_id="bench", session_id=session.id
+    )
+    return elapsed, session.state.get("stage_timings", {})
+
+
+async def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.5, help="stub model latency per stage, seconds")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    logging.getLogger("LocationStrategyPipeline").setLevel(logging.WARNING)
+    # Stub outputs are not worth checkpointing (and a resume would skip the stages)
+    pipeline_callbacks.CHECKPOINTS = None
+
+    print(f"== Location strategy pipeline ({len(STAGES)} stages, stub model {args.latency:.2f}s per call) ==")
+    for mode, parallel in (("sequential", False), ("parallel", True)):
+        runs = [await run_once(parallel, args.latency) for _ in range(args.runs)]
+        wall = statistics.median(elapsed for elapsed, _ in runs)
+        timings = runs[-1][1]
+        busy = sum(timings.get(stage, {}).get("seconds", 0) for stage in PIPELINE_STAGES)
+        print(f"  {mode:<10}  wall p50 {wall:6.2f} s   stage time {busy:6.2f} s")
+    print()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,132 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Session state size with the infographic embedded versus referenced.
+
+Runs generate_infographic with a stub image model to get the state it leaves
+behind (a blob URL), and compares it with the state the tool used to leave (a
+base64 data URL of the same image). Both states also carry typical text
+outputs of the other stages. Reports the JSON size of the state, and the
+time and peak memory of a JSON round trip (what persisting the session or
+sending an AG-UI state snapshot costs).
+
+Usage: python -m benchmarks.bench_session_state [--image-kb 1500]
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import google.genai
+from google.genai import types
+
+from app.blobs import BlobStore
+from app.tools import generate_infographic, image_generator
+
+
+class StubImageClient:
+    """Stands in for genai.Client: client.aio.models.generate_content returns `image`."""
+
+    image = b""
+
+    def __init__(self, *args, **kwargs):
+        self.aio = SimpleNamespace(models=self)
+
+    async def generate_content(self, model, contents, config):
+        part = types.Part.from_bytes(data=self.image, mime_type="image/png")
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+
+class ToolContext:
+    def __init__(self, state):
+        self.state = state
+
+    async def save_artifact(self, filename, artifact):
+        return 0
+
+
+def base_state() -> dict:
+    """Text outputs of the earlier stages, at roughly their usual sizes."""
+    return {
+        "target_location": "Indiranagar, Bangalore",
+        "business_type": "coffee shop",
+        "market_research_findings": "x" * 8_000,
+        "competitor_analysis": "x" * 12_000,
+        "gap_analysis": "x" * 10_000,
+        "strategic_report": {"summary": "x" * 6_000},
+        "html_report_content": "x" * 60_000,
+    }
+
+
+def median_ms(fn, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e3)
+    return statistics.median(samples)
+
+
+def round_trip(state: dict) -> dict:
+    return json.loads(json.dumps(state))
+
+
+def peak_bytes(fn) -> int:
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+async def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image-kb", type=int, default=1500, help="infographic size (PNG is already compressed)")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    image = os.urandom(args.image_kb * 1024)
+
+    embedded = base_state()
+    embedded["infographic_base64"] = f"data:image/png;base64,{base64.b64encode(image).decode('utf-8')}"
+
+    referenced = base_state()
+    StubImageClient.image = image
+    google.genai.Client = StubImageClient
+    logging.getLogger("LocationStrategyPipeline").setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as root:
+        image_generator.BLOBS = BlobStore(root)
+        result = await generate_infographic("summary", ToolContext(referenced))
+    assert result["status"] == "success", result
+
+    print(f"== Session state, {args.image_kb:,} KB infographic ==")
+    for name, state in (("embedded (base64)", embedded), ("referenced (blob)", referenced)):
+        size = len(json.dumps(state))
+        elapsed = median_ms(lambda: round_trip(state), args.runs)
+        peak = peak_bytes(lambda: round_trip(state))
+        print(f"  {name:<18}  state {size / 1024:8.1f} KB   json round trip {elapsed:6.2f} ms, peak {peak / 2**20:6.2f} MB")
+    print(f"  tool result: {len(json.dumps(result))} bytes")
+    print()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""The report and infographic tools must not block the event loop."""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from google.genai import types
+
+from app.blobs import BlobStore
+from app.tools import generate_html_report, generate_infographic, image_generator
+
+LATENCY = 0.3
+RUNS = 4
+
+
+class FakeModels:
+    """Stands in for client.aio.models: answers after LATENCY seconds."""
+
+    async def generate_content(self, model, contents, config):
+        await asyncio.sleep(LATENCY)
+        if config.response_modalities:
+            part = types.Part.from_bytes(data=b"\x89PNG", mime_type="image/png")
+            return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+        return SimpleNamespace(text="<!DOCTYPE html><html></html>")
+
+
+class FakeClient:
+    def __init__(self, *args, **kwargs):
+        self.aio = SimpleNamespace(models=FakeModels())
+        # The blocking client must not be used from the tools
+        self.models = None
+
+
+class FakeToolContext:
+    def __init__(self):
+        self.state = {}
+        self.artifacts = {}
+
+    async def save_artifact(self, filename, artifact):
+        self.artifacts[filename] = artifact
+        return 0
+
+
+@pytest.fixture(autouse=True)
+def fake_client(monkeypatch, tmp_path):
+    monkeypatch.setattr("google.genai.Client", FakeClient)
+    monkeypatch.setattr(image_generator, "BLOBS", BlobStore(tmp_path))
+
+
+@pytest.mark.asyncio
+async def test_parallel_runs_do_not_serialize():
+    contexts = [FakeToolContext() for _ in range(RUNS)]
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(generate_html_report("report data", ctx) for ctx in contexts),
+        *(generate_infographic("summary", ctx) for ctx in contexts),
+    )
+    elapsed = time.perf_counter() - start
+
+    assert [r["status"] for r in results] == ["success"] * (2 * RUNS)
+    assert all(set(ctx.artifacts) == {"executive_report.html", "infographic.png"} for ctx in contexts)
+    # The image is referenced from state, not embedded in it
+    assert all(ctx.state["infographic_url"].startswith("/blobs/") for ctx in contexts)
+    assert not any("infographic_base64" in ctx.state for ctx in contexts)
+    # 2 * RUNS generations of LATENCY each overlap instead of adding up
+    assert elapsed < 2 * LATENCY
+
+
+@pytest.mark.asyncio
+async def test_cancellation_propagates_and_saves_nothing():
+    ctx = FakeToolContext()
+    task = asyncio.create_task(generate_html_report("report data", ctx))
+    await asyncio.sleep(LATENCY / 3)
+    task.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert ctx.artifacts == {}
+    assert "html_report_content" not in ctx.state
@@ -0,0 +1,81 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Content-addressed blob store and the range-capable blob endpoint."""
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.blobs import BlobStore, blob_response, parse_range
+
+DATA = bytes(range(256)) * 40  # 10240 bytes
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(tmp_path)
+
+
+@pytest.fixture
+def client(store):
+    app = FastAPI()
+
+    @app.get("/blobs/{blob_id}")
+    async def get_blob(blob_id: str, request: Request):
+        return blob_response(store, blob_id, request.headers)
+
+    return TestClient(app)
+
+
+def test_same_content_is_stored_once(store, tmp_path):
+    first = store.put(DATA, "image/png")
+    second = store.put(DATA, "image/png")
+
+    assert first == second
+    assert first.url == f"/blobs/{first.id}" and len(first.id) == 32
+    assert len([p for p in tmp_path.rglob("*") if p.is_file()]) == 2  # blob + sidecar
+    assert store.get(first.id) == first
+    assert store.get("../../etc/passwd") is None
+
+
+def test_parse_range():
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=50-500", 100) == (50, 99)
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    with pytest.raises(ValueError):
+        parse_range("bytes=100-", 100)
+
+
+def test_endpoint_streams_whole_blob_and_ranges(store, client):
+    ref = store.put(DATA, "image/png")
+
+    full = client.get(ref.url)
+    assert full.status_code == 200
+    assert full.content == DATA
+    assert full.headers["content-type"] == "image/png"
+    assert full.headers["accept-ranges"] == "bytes"
+
+    part = client.get(ref.url, headers={"Range": "bytes=100-199"})
+    assert part.status_code == 206
+    assert part.content == DATA[100:200]
+    assert part.headers["content-range"] == f"bytes 100-199/{len(DATA)}"
+
+    assert client.get(ref.url, headers={"Range": f"bytes={len(DATA)}-"}).status_code == 416
+    assert client.get(ref.url, headers={"If-None-Match": full.headers["etag"]}).status_code == 304
+    assert client.get("/blobs/" + "0" * 32).status_code == 404
@@ -0,0 +1,69 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Stage checkpoints and resume."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from app.callbacks import after_gap_analysis, after_market_research, before_gap_analysis, before_market_research
+from app.callbacks import pipeline_callbacks
+from app.checkpoints import CheckpointStore
+
+RUN = {"target_location": "Indiranagar, Bangalore", "business_type": "coffee shop"}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = CheckpointStore(tmp_path)
+    monkeypatch.setattr(pipeline_callbacks, "CHECKPOINTS", store)
+    monkeypatch.setattr(pipeline_callbacks, "RESUME", True)
+    return store
+
+
+def test_checkpoint_is_used_only_while_upstream_matches(tmp_path):
+    store = CheckpointStore(tmp_path)
+    key = CheckpointStore.run_key("Indiranagar, Bangalore", "coffee shop", {"additional_context": ""})
+    upstream = {"market_research_findings": "strong market"}
+    store.save(key, "gap_analysis", upstream, {"gap_analysis": "zones"})
+
+    assert key.startswith("indiranagar-bangalore--coffee-shop--")
+    assert store.load(key, "gap_analysis", upstream) == {"gap_analysis": "zones"}
+    assert store.load(key, "gap_analysis", {"market_research_findings": "weak market"}) is None
+    assert store.load(key, "strategy_synthesis", upstream) is None
+    other = CheckpointStore.run_key("Indiranagar, Bangalore", "coffee shop", {"additional_context": "vegan"})
+    assert other != key
+
+
+def test_resume_restores_completed_stages_and_reports_hits(store):
+    first = SimpleNamespace(state=dict(RUN))
+    assert before_market_research(first) is None
+    first.state["market_research_findings"] = "strong market"
+    after_market_research(first)
+    first.state["competitor_analysis"] = "12 competitors"
+    assert before_gap_analysis(first) is None
+    # The AG-UI placeholder is never checkpointed
+    after_gap_analysis(first)
+
+    second = SimpleNamespace(state=dict(RUN))
+    content = before_market_research(second)
+    assert content is not None and "checkpoint" in content.parts[0].text
+    assert second.state["market_research_findings"] == "strong market"
+    assert "market_research" in second.state["stages_completed"]
+
+    second.state["competitor_analysis"] = "12 competitors"
+    assert before_gap_analysis(second) is None
+    assert second.state["stage_cache"] == {"market_research": "hit", "gap_analysis": "miss"}
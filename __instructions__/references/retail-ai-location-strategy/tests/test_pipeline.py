@@ -0,0 +1,64 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Stage graph layering for the parallel pipeline mode."""
+
+import pytest
+from google.adk.agents import BaseAgent, ParallelAgent
+
+from app.pipeline import build_pipeline, stage_layers
+
+
+def stages(*names):
+    return [BaseAgent(name=name) for name in names]
+
+
+def test_independent_stages_share_a_layer():
+    pipeline = build_pipeline(
+        name="Pipeline",
+        description="",
+        stages=stages(
+            "MarketResearchAgent",
+            "CompetitorMappingAgent",
+            "GapAnalysisAgent",
+            "StrategyAdvisorAgent",
+            "ReportGeneratorAgent",
+            "InfographicGeneratorAgent",
+        ),
+    )
+
+    groups = [
+        [a.name for a in s.sub_agents] if isinstance(s, ParallelAgent) else s.name
+        for s in pipeline.sub_agents
+    ]
+    assert groups == [
+        ["MarketResearchAgent", "CompetitorMappingAgent"],
+        "GapAnalysisAgent",
+        "StrategyAdvisorAgent",
+        ["ReportGeneratorAgent", "InfographicGeneratorAgent"],
+    ]
+
+
+def test_sequential_mode_keeps_every_stage_in_order():
+    names = ["A", "B", "C"]
+    pipeline = build_pipeline(name="Pipeline", description="", stages=stages(*names), dependencies={}, parallel=False)
+    assert [s.name for s in pipeline.sub_agents] == names
+
+
+def test_cycles_and_unknown_dependencies_are_rejected():
+    with pytest.raises(ValueError, match="cycle"):
+        stage_layers(stages("A", "B"), {"A": ("B",), "B": ("A",)})
+    with pytest.raises(ValueError, match="unknown"):
+        stage_layers(stages("A"), {"A": ("Missing",)})
@@ -1,12 +1,22 @@
+import asyncio
+import functools
+import hashlib
 import os
 import logging
+import weakref
 from typing import List, Dict, Any, Optional
 
 from google.adk.agents.llm_agent import LlmAgent
 from google.adk.tools import FunctionTool, google_search
 from google.adk.tools.agent_tool import AgentTool
+from google.adk.tools.tool_context import ToolContext
 
 import httpx
+from cachetools import LRUCache
+from opentelemetry import propagate, trace
+
+from agent_app.history import compact_history_callback
+from agent_app.prompts import record_prompt_prefix, static_instruction
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -16,52 +26,128 @@ logger = logging.getLogger(__name__)
 MODEL_NAME = "gemini-2.5-pro"
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:9999")
 
+tracer = trace.get_tracer(__name__)
+
+async def api_request(
+    client: httpx.AsyncClient, method: str, url: str, headers: Optional[Dict[str, str]] = None, **kwargs
+) -> httpx.Response:
+    """Sends the request in a CLIENT span, with the trace context headers so the mock API joins the trace."""
+    with tracer.start_as_current_span(
+        f"HTTP {method}", kind=trace.SpanKind.CLIENT, attributes={"http.method": method, "http.url": url}
+    ) as span:
+        headers = dict(headers or {})
+        propagate.inject(headers)
+        response = await getattr(client, method.lower())(url, headers=headers, **kwargs)
+        span.set_attribute("http.status_code", response.status_code)
+        return response
+
+# (url, sorted params) -> (ETag, body) of the last successful GET, least recently used dropped first
+_conditional_cache: LRUCache = LRUCache(maxsize=int(os.getenv("CONDITIONAL_CACHE_SIZE", 256)))
+
+async def conditional_get(client: httpx.AsyncClient, url: str, params: Dict[str, Any]) -> Any:
+    """GET that revalidates a previously seen body with If-None-Match and reuses it on 304."""
+    key = (url, tuple(sorted(params.items())))
+    headers = {}
+    cached = _conditional_cache.get(key)
+    if cached is not None:
+        headers["If-None-Match"] = cached[0]
+    response = await api_request(client, "GET", url, headers=headers, params=params)
+    if cached is not None and response.status_code == 304:
+        return cached[1]
+    response.raise_for_status()
+    data = response.json()
+    etag = response.headers.get("ETag")
+    if isinstance(etag, str):
+        _conditional_cache[key] = (etag, data)
+    return data
+
+# ADK runs the function calls of one model response concurrently; this
+# bounds how many of them hit the API at once.
+TOOL_CONCURRENCY = int(os.getenv("TOOL_CONCURRENCY", 4))
+
+# A semaphore belongs to the loop it first waits in: one per running loop, made there
+_tool_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+def tool_slots() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    slots = _tool_slots.get(loop)
+    if slots is None:
+        slots = _tool_slots[loop] = asyncio.Semaphore(TOOL_CONCURRENCY)
+    return slots
+
+def bounded(tool):
+    """Runs the tool in one of TOOL_CONCURRENCY slots (signature and docstring are kept for the model)."""
+    @functools.wraps(tool)
+    async def wrapper(*args, **kwargs):
+        async with tool_slots():
+            return await tool(*args, **kwargs)
+    return wrapper
+
 # --- Tools ---
 
-async def search_vehicles_tool(make: Optional[str] = None, model: Optional[str] = None, type: Optional[str] = None) -> List[Dict[str, Any]]:
-    """Searches for vehicles based on make, model, or type."""
+@bounded
+async def search_vehicles_tool(make: Optional[str] = None, model: Optional[str] = None, type: Optional[str] = None, query: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Searches for vehicles based on make, model, or type, and/or a free-text query (e.g. "fuel efficient sedan with advanced tech") ranked by relevance."""
     params = {}
     if make: params['make'] = make
     if model: params['model'] = model
     if type: params['type'] = type
+    if query: params['q'] = query
     
     async with httpx.AsyncClient() as client:
-        response = await client.get(f"{API_BASE_URL}/search", params=params)
-        response.raise_for_status()
-        return response.json()
+        return await conditional_get(client, f"{API_BASE_URL}/search", params)
+
+@bounded
+async def find_similar_vehicles_tool(vehicle_id: str, k: int = 5) -> Dict[str, Any]:
+    """Finds the k vehicles most similar to the given vehicle ID (price, year, body type, make and features)."""
+    params = {'vehicle_id': vehicle_id, 'k': k}
+    async with httpx.AsyncClient() as client:
+        return await conditional_get(client, f"{API_BASE_URL}/similar", params)
 
+@bounded
 async def compare_vehicles_tool(vehicle1_id: str, vehicle2_id: str) -> Dict[str, Any]:
     """Compares two vehicles given their IDs."""
     params = {'vehicle1_id': vehicle1_id, 'vehicle2_id': vehicle2_id}
     async with httpx.AsyncClient() as client:
-        response = await client.get(f"{API_BASE_URL}/compare", params=params)
-        response.raise_for_status()
-        return response.json()
+        return await conditional_get(client, f"{API_BASE_URL}/compare", params)
 
+@bounded
 async def book_vehicle_tool(vehicle_id: str, customer_name: str, date: str) -> Dict[str, Any]:
     """Books a vehicle for inspection."""
     payload = {'vehicle_id': vehicle_id, 'customer_name': customer_name, 'date': date}
+    # A repeated call with the same arguments (a retried tool call) returns the original booking
+    headers = {"Idempotency-Key": hashlib.sha256(f"{vehicle_id}|{customer_name}|{date}".encode("utf-8")).hexdigest()[:32]}
     async with httpx.AsyncClient() as client:
-        response = await client.post(f"{API_BASE_URL}/book", json=payload)
+        response = await api_request(client, "POST", f"{API_BASE_URL}/book", headers=headers, json=payload)
+        if response.status_code == 409:
+            return {"status": "Conflict", "detail": response.json().get("detail")}
         response.raise_for_status()
         return response.json()
 
-async def negotiate_price_tool(vehicle_id: str, offer_price: float) -> Dict[str, Any]:
-    """Negotiates the price of a vehicle."""
+@bounded
+async def negotiate_price_tool(vehicle_id: str, offer_price: float, tool_context: Optional[ToolContext] = None) -> Dict[str, Any]:
+    """Makes an offer on a vehicle. Repeated offers in one conversation are rounds of the same negotiation; the result is accepted (with final_price), countered (with counter_price) or rejected."""
     payload = {'vehicle_id': vehicle_id, 'offer_price': offer_price}
+    if tool_context is not None:
+        payload['session_id'] = tool_context.session.id
     async with httpx.AsyncClient() as client:
-        response = await client.post(f"{API_BASE_URL}/negotiate", json=payload)
+        response = await api_request(client, "POST", f"{API_BASE_URL}/negotiate", json=payload)
         response.raise_for_status()
         return response.json()
 
 # --- Agents ---
 
+# Every agent's system instruction is a byte-stable static prefix (see
+# agent_app/prompts.py); the conversation history follows it.
+MODEL_CALLBACKS = [record_prompt_prefix, compact_history_callback]
+
 # 1. Product Search Agent
 search_agent = LlmAgent(
     name="ProductSearchAgent",
     model=MODEL_NAME,
-    instruction="You are a vehicle search specialist. Use the search_vehicles_tool to find vehicles that match the user's criteria.",
-    tools=[FunctionTool(search_vehicles_tool)]
+    static_instruction=static_instruction("ProductSearchAgent"),
+    tools=[FunctionTool(search_vehicles_tool), FunctionTool(find_similar_vehicles_tool)],
+    before_model_callback=MODEL_CALLBACKS,
 )
 
 # 2. Product Compare Agent
@@ -69,8 +155,9 @@ compare_agent = LlmAgent(
     name="ProductCompareAgent",
     model=MODEL_NAME,
     description="You are a vehicle comparison specialist. Use the compare_vehicles_tool to compare two vehicles.",
-    instruction="You are a vehicle comparison specialist. Use the compare_vehicles_tool to compare two vehicles.",
-    tools=[FunctionTool(compare_vehicles_tool)]
+    static_instruction=static_instruction("ProductCompareAgent"),
+    tools=[FunctionTool(compare_vehicles_tool)],
+    before_model_callback=MODEL_CALLBACKS,
 )
 
 # 3. Product Book Agent
@@ -78,8 +165,9 @@ book_agent = LlmAgent(
     name="ProductBookAgent",
     model=MODEL_NAME,
     description="You are a booking specialist. Use the book_vehicle_tool to book a vehicle for inspection.",
-    instruction="You are a booking specialist. Use the book_vehicle_tool to book a vehicle for inspection.",
-    tools=[FunctionTool(book_vehicle_tool)]
+    static_instruction=static_instruction("ProductBookAgent"),
+    tools=[FunctionTool(book_vehicle_tool)],
+    before_model_callback=MODEL_CALLBACKS,
 )
 
 # 4. Product Negotiate Agent
@@ -87,8 +175,9 @@ negotiate_agent = LlmAgent(
     name="ProductNegotiateAgent",
     model=MODEL_NAME,
     description="You are a negotiation specialist. Use the negotiate_price_tool to negotiate the price of a vehicle.",
-    instruction="You are a negotiation specialist. Use the negotiate_price_tool to negotiate the price of a vehicle.",
-    tools=[FunctionTool(negotiate_price_tool)]
+    static_instruction=static_instruction("ProductNegotiateAgent"),
+    tools=[FunctionTool(negotiate_price_tool)],
+    before_model_callback=MODEL_CALLBACKS,
 )
 
 # 5. Market Trend Agent
@@ -96,8 +185,9 @@ market_trend_agent = LlmAgent(
     name="MarketTrendAgent",
     model=MODEL_NAME,
     description="You are a market trend analyst. Use the mock_market_research tool to find information about current market trends.",
-    instruction="You are a market trend analyst. Use the mock_market_research tool to find information about current market trends.",
-    tools=[google_search]
+    static_instruction=static_instruction("MarketTrendAgent"),
+    tools=[google_search],
+    before_model_callback=MODEL_CALLBACKS,
 )
 
 # 6. Intent Agent (Router)
@@ -109,27 +199,19 @@ market_trend_agent = LlmAgent(
 intent_agent = LlmAgent(
     name="IntentAgent",
     model=MODEL_NAME,
-    instruction="""You are an intent classifier. Analyze the user's request and determine which specialist agent should handle it.
-    - If the user wants to find cars, delegate to ProductSearchAgent.
-    - If the user wants to compare cars, delegate to ProductCompareAgent.
-    - If the user wants to book a test drive or inspection, delegate to ProductBookAgent.
-    - If the user wants to negotiate price, delegate to ProductNegotiateAgent.
-    - If the user wants to know about popular cars or market trends or is unsure about what car to buy, you MUST call the MarketTrendAgent tool. Do NOT answer with general knowledge.
-    
-    Examples:
-    User: "What are the latest market trends?"
-    Action: Delegate to MarketTrendAgent.
-    """,
+    static_instruction=static_instruction("IntentAgent"),
     sub_agents=[search_agent, compare_agent, book_agent, negotiate_agent],
-    tools=[AgentTool(market_trend_agent)]
+    tools=[AgentTool(market_trend_agent)],
+    before_model_callback=MODEL_CALLBACKS,
 )
 
 # 6. Root Agent
 root_agent = LlmAgent(
     name="RootAgent",
     model=MODEL_NAME,
-    instruction="You are the main interface for the Vehicle Agent System. You help users with car related queries and tasks by delegating to the IntentAgent. If the user greets you, greet them back and ask how you can help. If the user asks a specific question or request, delegate immediately to the IntentAgent.",
-    sub_agents=[intent_agent]
+    static_instruction=static_instruction("RootAgent"),
+    sub_agents=[intent_agent],
+    before_model_callback=MODEL_CALLBACKS,
 )
 
 if __name__ == "__main__":
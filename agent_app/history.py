@@ -0,0 +1,184 @@
+"""
+Bounds the conversation history sent with each model call.
+
+Runs as a before_model_callback on every agent:
+
+1. Tool results and A2UI payloads from earlier turns are replaced by a short
+   summary and a content hash. The current turn is left intact, because the
+   model is still working with those results.
+2. If the history is still over HISTORY_TOKEN_BUDGET, turns older than the
+   last HISTORY_KEEP_TURNS are folded into one summary message.
+
+ADK rebuilds the contents from the session for every call, so the session
+itself keeps the full history; only what is sent is compacted.
+
+Token counts are estimated at about four characters per token. Actual
+prompt token counts come back in each response's usage metadata; the agent
+server reports those.
+"""
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.genai import types
+from opentelemetry import trace
+
+logger = logging.getLogger(__name__)
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 4000))
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", 4))
+# Tool results and A2UI payloads longer than this (in characters) are compacted
+MAX_PAYLOAD_CHARS = int(os.getenv("HISTORY_MAX_PAYLOAD_CHARS", 400))
+
+CHARS_PER_TOKEN = 4
+SUMMARY_PREFIX = "Summary of the earlier conversation:"
+
+
+def estimate_tokens(contents: List[types.Content]) -> int:
+    chars = 0
+    for content in contents:
+        for part in content.parts or ():
+            if part.text:
+                chars += len(part.text)
+            if part.function_call:
+                chars += len(json.dumps(part.function_call.args or {}, default=str)) + len(part.function_call.name or "")
+            if part.function_response:
+                chars += len(json.dumps(part.function_response.response or {}, default=str))
+    return chars // CHARS_PER_TOKEN
+
+
+def _ref(payload: str) -> str:
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def _describe(value: Any) -> str:
+    """One line describing a tool result or A2UI data block."""
+    if isinstance(value, dict):
+        for key in ("result", "rows", "cars", "results"):
+            if isinstance(value.get(key), list):
+                return _describe(value[key])
+        if isinstance(value.get("comparison"), dict):
+            return _describe([v for v in value["comparison"].values() if isinstance(v, dict)])
+    if isinstance(value, list):
+        vehicles = [v for v in value if isinstance(v, dict) and "make" in v]
+        if vehicles:
+            shown = ", ".join(f"{v['make']} {v.get('model', '')} (id {v.get('id')})".strip() for v in vehicles[:5])
+            more = f" and {len(vehicles) - 5} more" if len(vehicles) > 5 else ""
+            return f"{len(vehicles)} vehicle(s): {shown}{more}"
+        return f"{len(value)} item(s)"
+    text = json.dumps(value, default=str)
+    return text[:MAX_PAYLOAD_CHARS // 2] + "..."
+
+
+def _a2ui_message(text: str) -> Optional[Dict[str, Any]]:
+    stripped = text.strip()
+    if not (stripped.startswith("{") and "surfaceType" in stripped):
+        return None
+    try:
+        msg = json.loads(stripped)
+    except ValueError:
+        return None
+    return msg if isinstance(msg, dict) and "surfaceType" in msg else None
+
+
+def compact_part(part: types.Part) -> Optional[types.Part]:
+    """A compact stand-in for a bulky part, or None to keep the part as is."""
+    if part.function_response is not None:
+        payload = json.dumps(part.function_response.response or {}, default=str)
+        if len(payload) <= MAX_PAYLOAD_CHARS:
+            return None
+        response = part.function_response
+        return types.Part(function_response=types.FunctionResponse(
+            id=response.id,
+            name=response.name,
+            response={"summary": _describe(response.response), "ref": _ref(payload), "compacted": True},
+        ))
+    if part.text and len(part.text) > MAX_PAYLOAD_CHARS:
+        msg = _a2ui_message(part.text)
+        if msg is not None:
+            return types.Part(text=(
+                f"[A2UI {msg['surfaceType']} surface {msg.get('surfaceId', '')}: "
+                f"{_describe(msg.get('data'))}; ref {_ref(part.text)}]"
+            ))
+    return None
+
+
+def _is_user_turn(content: types.Content) -> bool:
+    """A message typed by the user (not a tool result or another agent's output relayed as context)."""
+    if content.role != "user" or not content.parts:
+        return False
+    first = content.parts[0]
+    return bool(first.text) and first.text != "For context:"
+
+
+def _turn_starts(contents: List[types.Content]) -> List[int]:
+    return [i for i, content in enumerate(contents) if _is_user_turn(content)]
+
+
+def _turn_summary(turn: List[types.Content]) -> str:
+    user = " ".join(p.text for p in turn[0].parts if p.text)
+    replies = [p.text for c in turn[1:] if c.role == "model" for p in c.parts or () if p.text]
+    calls = [p.function_call.name for c in turn for p in c.parts or () if p.function_call]
+    line = f"- User: {user[:150]}"
+    if calls:
+        line += f" | tools: {', '.join(dict.fromkeys(calls))}"
+    if replies:
+        line += f" | Agent: {replies[-1][:200]}"
+    return line
+
+
+def compact_history(
+    contents: List[types.Content],
+    budget: int = HISTORY_TOKEN_BUDGET,
+    keep_turns: int = HISTORY_KEEP_TURNS,
+) -> Tuple[List[types.Content], Dict[str, int]]:
+    """Returns the compacted contents (the input is not modified) and what was done."""
+    stats = {"tokens_before": estimate_tokens(contents), "compacted_parts": 0, "summarized_turns": 0}
+    starts = _turn_starts(contents)
+    current = starts[-1] if starts else len(contents)
+
+    compacted: List[types.Content] = []
+    for i, content in enumerate(contents):
+        if i < current and content.parts:
+            parts = []
+            for part in content.parts:
+                replacement = compact_part(part)
+                stats["compacted_parts"] += replacement is not None
+                parts.append(replacement or part)
+            content = types.Content(role=content.role, parts=parts)
+        compacted.append(content)
+
+    if estimate_tokens(compacted) > budget and len(starts) > keep_turns:
+        cut = starts[-keep_turns] if keep_turns > 0 else current
+        old_starts = [s for s in starts if s < cut]
+        bounds = old_starts + [cut]
+        lines = [_turn_summary(compacted[a:b]) for a, b in zip(bounds, bounds[1:])]
+        # Keep the summary itself to a quarter of the budget, newest turns first
+        kept, chars = [], 0
+        for line in reversed(lines):
+            chars += len(line) + 1
+            if chars > budget * CHARS_PER_TOKEN // 4:
+                break
+            kept.append(line)
+        summary = types.Content(role="user", parts=[types.Part(text="\n".join([SUMMARY_PREFIX] + kept[::-1]))])
+        compacted = [summary] + compacted[cut:]
+        stats["summarized_turns"] = len(bounds) - 1
+
+    stats["tokens_after"] = estimate_tokens(compacted)
+    return compacted, stats
+
+
+def compact_history_callback(callback_context, llm_request) -> None:
+    """before_model_callback: compacts llm_request.contents in place; never short-circuits the call."""
+    llm_request.contents, stats = compact_history(llm_request.contents or [])
+    span = trace.get_current_span()
+    for key, value in stats.items():
+        span.set_attribute(f"llm.history.{key}", value)
+    if stats["compacted_parts"] or stats["summarized_turns"]:
+        logger.info(
+            f"{callback_context.agent_name}: history {stats['tokens_before']} -> {stats['tokens_after']} tokens "
+            f"({stats['compacted_parts']} payload(s) compacted, {stats['summarized_turns']} turn(s) summarized)"
+        )
+    return None
@@ -0,0 +1,176 @@
+"""
+Prompt assembly for the agent tree.
+
+Each agent's system instruction is one byte-stable string:
+
+    SHARED_PREFIX    rules common to every agent
+    catalog summary  makes, body types and price range (computed once per process)
+    agent section    what this agent does
+
+It is passed as ADK's `static_instruction`, which is never templated with
+session state. Dynamic content (the conversation) only follows it in the
+request, so provider-side prefix caching can reuse everything up to the
+history. Putting the shared text first also lets the agents share a prefix.
+
+`record_prompt_prefix` (a before_model_callback) hashes what precedes the
+history: model, system instruction and tool declarations. It logs the hash
+for each call, so a change in the prefix, and the cache misses it causes,
+shows up.
+
+This module must not import google.adk; the agent server imports it at
+startup.
+"""
+import functools
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from opentelemetry import trace
+
+logger = logging.getLogger(__name__)
+
+CATALOG_FILE = Path(__file__).resolve().parent.parent / "data" / "product_search.json"
+
+SHARED_PREFIX = """You are part of the Vehicle Agent System, a team of agents that helps customers find, compare, book and negotiate on vehicles from one dealership catalog.
+
+Rules for every agent:
+- Only state vehicle facts (prices, features, availability) that come from a tool result or the catalog summary below.
+- Refer to vehicles by make and model, and by ID when the user needs one to act on.
+- Keep answers short; the UI renders tables and cards for tool results."""
+
+AGENT_INSTRUCTIONS: Dict[str, str] = {
+    "RootAgent": "You are the main interface for the Vehicle Agent System. You help users with car related queries and tasks by delegating to the IntentAgent. If the user greets you, greet them back and ask how you can help. If the user asks a specific question or request, delegate immediately to the IntentAgent.",
+    "IntentAgent": """You are an intent classifier. Analyze the user's request and determine which specialist agent should handle it.
+- If the user wants to find cars, delegate to ProductSearchAgent.
+- If the user wants to compare cars, delegate to ProductCompareAgent.
+- If the user wants to book a test drive or inspection, delegate to ProductBookAgent.
+- If the user wants to negotiate price, delegate to ProductNegotiateAgent.
+- If the user wants to know about popular cars or market trends or is unsure about what car to buy, you MUST call the MarketTrendAgent tool. Do NOT answer with general knowledge.
+
+Examples:
+User: "What are the latest market trends?"
+Action: Delegate to MarketTrendAgent.""",
+    "ProductSearchAgent": "You are a vehicle search specialist. Use the search_vehicles_tool to find vehicles that match the user's criteria. Pass descriptive wishes (features, body style, color) as the free-text query. When the user asks for cars like a specific vehicle, use the find_similar_vehicles_tool with its ID.",
+    "ProductCompareAgent": "You are a vehicle comparison specialist. Use the compare_vehicles_tool to compare two vehicles.",
+    "ProductBookAgent": "You are a booking specialist. Use the book_vehicle_tool to book a vehicle for inspection.",
+    "ProductNegotiateAgent": "You are a negotiation specialist. Use the negotiate_price_tool to negotiate the price of a vehicle.",
+    "MarketTrendAgent": "You are a market trend analyst. Use the mock_market_research tool to find information about current market trends.",
+}
+
+# Instruction for a model that emits A2UI commands itself. The agent server
+# currently builds A2UI surfaces from tool results instead (see process_message).
+A2UI_INSTRUCTION = """You are a helpful vehicle agent. You can search for cars, compare them, and book test drives.
+
+CRITICAL: You communicate with the UI using specific JSON commands.
+When you want to show a UI component, output a VALID JSON block (and nothing else for that part) with this schema:
+{
+  "action": "beginRendering" | "surfaceUpdate",
+  "surfaceId": "unique-id",
+  "surfaceType": "table" | "card-comparison" | "booking-form" | "markdown",
+  "data": { ... component specific data ... }
+}
+
+MAPPINGS:
+1. If user asks to search cars -> Call search_cars() -> Then output A2UI JSON with surfaceType="table" and data={"columns": ["Make", "Model", "Year", "Price"], "rows": [ ...from tool result... ]}.
+2. If user asks to compare cars -> Call compare_cars() -> Then output A2UI JSON with surfaceType="card-comparison" and data={"cards": [ ...from tool result... ]}.
+3. If user wants to book -> Output A2UI JSON with surfaceType="booking-form" and data={"carId": "..."}.
+4. If you receive a 'formSubmit' event -> Call book_appointment() -> Output confirmation text or markdown."""
+
+
+# Fields the summary reads; a catalog's facets(fields=SUMMARY_FACETS, price_buckets=1) has all it needs
+SUMMARY_FACETS = ("make", "type")
+
+
+def catalog_summary(facets: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Deterministic one-paragraph summary of the catalog (sorted, no
+    timestamps), from its facet counts: `total`, `facets` per SUMMARY_FACETS
+    field and the `price` min/max.
+    """
+    try:
+        if facets is None:
+            facets = _catalog_facets()
+    except (OSError, ValueError) as e:
+        logger.warning(f"No catalog summary for prompts: {e}")
+        facets = {"total": 0}
+    if not facets["total"]:
+        return "Catalog summary: unavailable; use the tools for all vehicle facts."
+    makes = sorted(f["value"] for f in facets["facets"]["make"] if f["value"])
+    types = sorted(f["value"] for f in facets["facets"]["type"] if f["value"])
+    summary = f"Catalog summary: {facets['total']} vehicles. Makes: {', '.join(makes)}. Body types: {', '.join(types)}."
+    if facets["price"]["min"] is not None:
+        summary += f" Prices from ${facets['price']['min']:,} to ${facets['price']['max']:,}."
+    return summary
+
+
+def file_facets(path: Path = CATALOG_FILE) -> Dict[str, Any]:
+    """The summary's facets read from the catalog JSON (outside the agent server, e.g. `adk web`)."""
+    with open(path, "r") as f:
+        vehicles = json.load(f)
+    prices = [v["price"] for v in vehicles if isinstance(v.get("price"), (int, float))]
+    return {
+        "total": len(vehicles),
+        "facets": {field: [{"value": value} for value in {v.get(field) for v in vehicles}] for field in SUMMARY_FACETS},
+        "price": {"min": min(prices, default=None), "max": max(prices, default=None)},
+    }
+
+
+_catalog_facets: Callable[[], Dict[str, Any]] = file_facets
+
+
+def use_catalog(facets: Callable[[], Dict[str, Any]]):
+    """Summarizes the facets `facets()` returns (from the agent server's open catalog) instead of reading the file."""
+    global _catalog_facets
+    _catalog_facets = facets
+    _catalog_summary.cache_clear()
+    static_instruction.cache_clear()
+
+
+@functools.lru_cache(maxsize=None)
+def static_instruction(agent_name: str) -> str:
+    """The full, byte-stable system instruction of an agent (the catalog is summarized once per process)."""
+    return f"{SHARED_PREFIX}\n\n{_catalog_summary()}\n\n{AGENT_INSTRUCTIONS[agent_name]}"
+
+
+@functools.lru_cache(maxsize=1)
+def _catalog_summary() -> str:
+    return catalog_summary()
+
+
+def _jsonable(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json", exclude_none=True)
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    return value
+
+
+def prefix_hash(llm_request) -> str:
+    """Hash of everything a request sends before the conversation history."""
+    config = llm_request.config
+    prefix = {
+        "model": llm_request.model,
+        "system_instruction": _jsonable(getattr(config, "system_instruction", None)),
+        "tools": _jsonable(getattr(config, "tools", None) or []),
+    }
+    encoded = json.dumps(prefix, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:16]
+
+
+_last_hash: Dict[str, str] = {}
+
+
+def record_prompt_prefix(callback_context, llm_request) -> Optional[Any]:
+    """before_model_callback: logs the prefix hash per call and flags when an agent's prefix changes."""
+    digest = prefix_hash(llm_request)
+    agent = callback_context.agent_name
+    trace.get_current_span().set_attribute("llm.prefix_hash", digest)
+    previous = _last_hash.get(agent)
+    _last_hash[agent] = digest
+    if previous is not None and previous != digest:
+        logger.warning(f"{agent}: prompt prefix changed ({previous} -> {digest}); provider prefix caching starts over")
+    else:
+        logger.info(f"{agent}: prompt prefix {digest}")
+    return None
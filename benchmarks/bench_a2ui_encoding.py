@@ -0,0 +1,79 @@
+"""
+Bytes and CPU per `/chat` response carrying an A2UI table.
+
+Compares the original path (json.dumps into `text`, then FastAPI's
+JSONResponse encoding the wrapper again, escaping the whole string) with the compat and structured
+formats produced by render_chat_response, for each available encoder.
+
+Usage: python -m benchmarks.bench_a2ui_encoding [--rows 10 1000 10000]
+"""
+import argparse
+import json
+import time
+from typing import Callable, List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from servers import json_codec
+from servers.agent_server import render_chat_response
+
+
+def make_a2ui_table(rows: int) -> dict:
+    makes = ["Toyota", "Honda", "Tesla", "Ford", "BMW"]
+    return {
+        "action": "beginRendering",
+        "surfaceId": "bench",
+        "surfaceType": "table",
+        "data": {
+            "columns": ["ID", "Make", "Model", "Year", "Price"],
+            "rows": [
+                {
+                    "id": str(i), "make": makes[i % 5], "model": f"Model {i}", "year": 2020 + i % 5,
+                    "price": f"${20000 + i:,}", "color": "Silver", "type": "Sedan",
+                    "features": ["Reliable", "Fuel Efficient", "Comfortable Ride"],
+                    "image": f"assets/{makes[i % 5].lower()}_model{i}.jpg",
+                }
+                for i in range(rows)
+            ],
+        },
+    }
+
+
+def legacy(a2ui_msg: dict) -> bytes:
+    # What a route returning {"text": json.dumps(msg), "data": None} costs in FastAPI
+    return JSONResponse(jsonable_encoder({"text": json.dumps(a2ui_msg), "data": None})).body
+
+
+def measure(fn: Callable[[], bytes], min_time: float = 0.3):
+    runs, start_cpu = 0, time.process_time()
+    while True:
+        body = fn()
+        runs += 1
+        elapsed = time.process_time() - start_cpu
+        if elapsed >= min_time:
+            return len(body), elapsed / runs
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10, 1000, 10000])
+    args = parser.parse_args(argv)
+
+    print("== A2UI response encoding (bytes, CPU per response) ==")
+    for rows in args.rows:
+        a2ui_msg = make_a2ui_table(rows)
+        response = {"text": "", "data": a2ui_msg}
+        cases = [("legacy json.dumps + JSONResponse", lambda: legacy(a2ui_msg))]
+        for name in json_codec.ENCODERS:
+            cases.append((f"compat     [{name}]", lambda name=name: (json_codec.set_encoder(name), render_chat_response(response, "compat").body)[1]))
+            cases.append((f"structured [{name}]", lambda name=name: (json_codec.set_encoder(name), render_chat_response(response, "structured").body)[1]))
+        print(f"-- {rows} rows --")
+        for label, fn in cases:
+            size, cpu = measure(fn)
+            print(f"  {label:36s} {size:>10,d} bytes {cpu * 1e6:>12,.1f} us")
+    json_codec.set_encoder("auto")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Booking throughput under concurrent submits: one fsync per booking versus
+the booking journal's group commit at increasing concurrency, and /book/batch
+sized requests. Reports bookings per second and records per fsync.
+
+Usage: python -m benchmarks.bench_booking [--bookings 2000] [--threads 1 8 32 64]
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import List
+
+from servers.bookings import BookingJournal, BookingLedger
+
+
+def booking(i: int):
+    return {"vehicle_id": str(i % 1000), "customer_name": "Bench", "date": f"2025-{1 + i // 28000 % 12:02d}-{1 + i // 1000 % 28:02d}",
+            "idempotency_key": f"bench-{i}"}
+
+
+def fsync_each(path: str, count: int) -> float:
+    """Baseline: write and fsync every booking on its own."""
+    start = time.perf_counter()
+    with open(path, "ab") as f:
+        for i in range(count):
+            f.write(json.dumps(booking(i)).encode("utf-8") + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+    return time.perf_counter() - start
+
+
+def concurrent(path: str, count: int, threads: int, batch: int = 1):
+    journal = BookingJournal(path)
+    ledger = BookingLedger(journal)
+    per_thread = count // threads
+
+    def submit(offset: int):
+        for i in range(offset, offset + per_thread, batch):
+            ledger.book_many([booking(j) for j in range(i, min(i + batch, offset + per_thread))])
+
+    workers = [threading.Thread(target=submit, args=(t * per_thread,)) for t in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    journal.close()
+    return elapsed, journal.records, journal.flushes
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bookings", type=int, default=2000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--batch", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    print("== Booking journal ==")
+    with tempfile.TemporaryDirectory() as tmp:
+        elapsed = fsync_each(os.path.join(tmp, "each.jsonl"), args.bookings)
+        print(f"  fsync per booking          {args.bookings / elapsed:>9.0f} bookings/s   1.0 records/fsync")
+        for threads in args.threads:
+            elapsed, records, flushes = concurrent(os.path.join(tmp, f"group-{threads}.jsonl"), args.bookings, threads)
+            print(f"  group commit, {threads:>3} threads  {records / elapsed:>9.0f} bookings/s "
+                  f"{records / flushes:>5.1f} records/fsync")
+        elapsed, records, flushes = concurrent(os.path.join(tmp, "batch.jsonl"), args.bookings, 8, batch=args.batch)
+        print(f"  batches of {args.batch}, 8 threads  {records / elapsed:>9.0f} bookings/s "
+              f"{records / flushes:>5.1f} records/fsync")
+
+
+if __name__ == "__main__":
+    main()
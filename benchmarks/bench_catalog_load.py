@@ -0,0 +1,57 @@
+"""
+Catalog startup time: parsing the JSON file into a Catalog versus mapping
+the compiled columnar file, plus the cost of a first lookup and a filtered
+search on each.
+
+Usage: python -m benchmarks.bench_catalog_load [--count 100000 1000000]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import List
+
+from benchmarks.synthetic import make_vehicles
+from servers.catalog import Catalog
+from servers.catalog_format import ColumnarCatalog, compile_catalog
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, nargs="+", default=[100000, 1000000])
+    args = parser.parse_args(argv)
+
+    print("== Catalog load time ==")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in args.count:
+            json_path = os.path.join(tmp, f"catalog_{count}.json")
+            binary_path = os.path.join(tmp, f"catalog_{count}.vcat")
+            vehicles = make_vehicles(count)
+            with open(json_path, "w") as f:
+                json.dump(vehicles, f)
+            _, compile_time = timed(lambda: compile_catalog(vehicles, binary_path))
+            del vehicles
+
+            print(f"-- {count:,} vehicles (JSON {os.path.getsize(json_path) / 1e6:,.1f} MB, "
+                  f"binary {os.path.getsize(binary_path) / 1e6:,.1f} MB, compiled in {compile_time:.2f} s) --")
+            for label, load in [
+                ("json.load + Catalog", lambda: Catalog.from_file(json_path)),
+                ("mmap ColumnarCatalog", lambda: Catalog(base=ColumnarCatalog(binary_path))),
+            ]:
+                catalog, load_time = timed(load)
+                _, get_time = timed(lambda: catalog.get(str(count // 2)))
+                results, filter_time = timed(lambda: catalog.filter(make="Tesla", type="SUV"))
+                print(f"  {label:24s} load {load_time * 1e3:>9,.1f} ms   get {get_time * 1e6:>8,.1f} us"
+                      f"   filter {filter_time * 1e3:>8,.1f} ms ({len(results):,} rows)")
+                del catalog
+
+
+if __name__ == "__main__":
+    main()
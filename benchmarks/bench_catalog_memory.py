@@ -0,0 +1,48 @@
+"""
+Bytes per vehicle held in memory: the catalog as parsed JSON dicts versus
+the Catalog's CompactVehicle records (slots, interned strings, feature ids).
+
+Measured with tracemalloc as the memory still allocated after building the
+representation and dropping the parsed input.
+
+Usage: python -m benchmarks.bench_catalog_memory [--count 10000 100000]
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+from typing import Callable, List
+
+from benchmarks.synthetic import make_vehicles
+from servers.catalog import Catalog
+
+
+def retained_bytes(build: Callable[[], object]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del obj
+    return current
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args(argv)
+
+    print("== Catalog memory (bytes per vehicle) ==")
+    for count in args.count:
+        payload = json.dumps(make_vehicles(count))
+        as_dicts = retained_bytes(lambda: json.loads(payload))
+        as_records = retained_bytes(lambda: Catalog(json.loads(payload)))
+        print(f"-- {count:,} vehicles --")
+        print(f"  {'list of dicts (json.load)':36s} {as_dicts / count:>10,.0f} B")
+        print(f"  {'Catalog of CompactVehicle':36s} {as_records / count:>10,.0f} B")
+        print(f"  {'reduction':36s} {as_dicts / as_records:>10.1f} x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Negotiation latency: one offer per /negotiate call versus many offers per
+/negotiate/batch call, both through the mock API app (in process), and the
+engine alone. Reports latency per call and per offer.
+
+Usage: python -m benchmarks.bench_negotiation [--vehicles 10000] [--batch 1 100 1000 10000]
+"""
+import argparse
+import random
+import statistics
+from typing import List
+
+from fastapi.testclient import TestClient
+
+from benchmarks.bench_search import latency_ms
+from benchmarks.synthetic import make_vehicles
+from servers.catalog import Catalog
+from servers.negotiation import NegotiationEngine
+from servers.shared_state import MemoryStore
+
+
+def offers(catalog: Catalog, count: int, sessions: int, rng: random.Random):
+    ids = catalog.ids()
+    picked = [catalog.get(rng.choice(ids)) for _ in range(count)]
+    return [
+        {"vehicle_id": v["id"], "offer_price": round(v["price"] * rng.uniform(0.8, 1.0)), "session_id": f"s{rng.randrange(sessions)}"}
+        for v in picked
+    ]
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vehicles", type=int, default=10000)
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 100, 1000, 10000])
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    import servers.mock_api_server as mock_api
+
+    catalog = Catalog(make_vehicles(args.vehicles))
+    mock_api.CATALOG = catalog
+    mock_api.NEGOTIATIONS = NegotiationEngine(catalog.get, MemoryStore())
+    engine = NegotiationEngine(catalog.get, MemoryStore())
+    client = TestClient(mock_api.app)
+    rng = random.Random(0)
+
+    print(f"== Negotiation ({args.vehicles:,} vehicles, {args.sessions} sessions) ==")
+    for size in args.batch:
+        batch = offers(catalog, size, args.sessions, rng)
+        if size == 1:
+            call = lambda: client.post("/negotiate", json=batch[0])
+        else:
+            call = lambda: client.post("/negotiate/batch", json={"offers": batch})
+        http = latency_ms(call, args.runs)
+        direct = latency_ms(lambda: engine.negotiate_many(batch), args.runs)
+        print(f"  {size:>6} offer(s)  http p50 {statistics.median(http):>8.2f} ms ({statistics.median(http) / size * 1e3:>7.1f} us/offer)"
+              f"   engine p50 {statistics.median(direct):>8.2f} ms ({statistics.median(direct) / size * 1e3:>7.1f} us/offer)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Full-text search latency: index build time and per-query latency of
+Catalog.search (BM25 over the inverted index, typo tolerant) on synthetic
+catalogs, compared with the linear make/model/type filter scan, and the
+cost of facet counts over a whole match set (Catalog.facets).
+
+Usage: python -m benchmarks.bench_search [--count 100000 1000000] [--binary]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from typing import List
+
+from benchmarks.synthetic import make_vehicles
+from servers.catalog import Catalog
+from servers.catalog_format import ColumnarCatalog, compile_catalog
+
+QUERIES = [
+    "fuel efficient sedan with advanced tech",
+    "toyota",
+    "toyta rav4",
+    "white tesla with autopilot",
+    "family friendly suv with third row seating and towing capacity",
+    "heated seats",
+]
+
+
+def latency_ms(fn, runs: int) -> List[float]:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e3)
+    return samples
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--binary", action="store_true", help="search a memory-mapped compiled catalog")
+    args = parser.parse_args(argv)
+
+    print("== Full-text search ==")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in args.count:
+            vehicles = make_vehicles(count)
+            if args.binary:
+                path = os.path.join(tmp, f"catalog_{count}.vcat")
+                compile_catalog(vehicles, path)
+                catalog = Catalog(base=ColumnarCatalog(path))
+            else:
+                catalog = Catalog(vehicles)
+            del vehicles
+
+            start = time.perf_counter()
+            catalog.search_index()
+            build = time.perf_counter() - start
+            print(f"-- {count:,} vehicles ({'mapped' if args.binary else 'in memory'}; index built in {build:.2f} s) --")
+            for query in QUERIES:
+                samples = latency_ms(lambda: catalog.search(query, limit=20), args.runs)
+                print(f"  q={query[:44]:46s} p50 {statistics.median(samples):>8.2f} ms   max {max(samples):>8.2f} ms")
+            samples = latency_ms(lambda: catalog.filter(make="Tesla", type="SUV"), max(3, args.runs // 5))
+            print(f"  {'filter make=Tesla type=SUV (scan)':48s} p50 {statistics.median(samples):>8.2f} ms")
+            for query in (None, "suv"):
+                samples = latency_ms(lambda: catalog.facets(query, fields=("make", "type", "color", "year", "features")), args.runs)
+                label = f"facets q={query or '(all)'}"
+                print(f"  {label:48s} p50 {statistics.median(samples):>8.2f} ms   max {max(samples):>8.2f} ms")
+            del catalog
+
+
+if __name__ == "__main__":
+    main()
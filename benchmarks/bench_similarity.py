@@ -0,0 +1,56 @@
+"""
+"Cars like this one" latency: vector index build time and per-query latency
+of exact (one matrix-vector product over the catalog) versus approximate
+(IVF) nearest-neighbour search, with the approximate index's recall@10.
+
+Usage: python -m benchmarks.bench_similarity [--count 100000 1000000]
+"""
+import argparse
+import statistics
+import time
+from typing import List
+
+import numpy as np
+
+from benchmarks.bench_search import latency_ms
+from benchmarks.synthetic import make_vehicles
+from servers.catalog import Catalog, _feature_names
+from servers.similarity import SimilarityIndex
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    print("== Similar vehicles ==")
+    for count in args.count:
+        records = list(Catalog(make_vehicles(count)).records())
+        print(f"-- {count:,} vehicles --")
+        indexes = {}
+        for name, approximate in (("exact", False), ("ivf", True)):
+            start = time.perf_counter()
+            indexes[name] = SimilarityIndex.build(None, records, _feature_names, approximate=approximate)
+            print(f"  {name:6s} index built in {time.perf_counter() - start:.2f} s")
+        del records
+
+        seeds = np.random.default_rng(0).choice(count, size=args.queries, replace=False)
+        found = 0
+        for name, index in indexes.items():
+            samples = []
+            for seed in seeds:
+                vec = index.query_vector([seed])
+                samples += latency_ms(lambda: index.top_k(vec, args.k, [seed]), 1)
+            print(f"  {name:6s} p50 {statistics.median(samples):>8.2f} ms   max {max(samples):>8.2f} ms")
+        for seed in seeds:
+            vec = indexes["exact"].query_vector([seed])
+            expected = set(indexes["exact"].top_k(vec, args.k, [seed])[0])
+            found += len(expected & set(indexes["ivf"].top_k(vec, args.k, [seed])[0]))
+        print(f"  ivf recall@{args.k}: {found / (args.k * len(seeds)):.3f}")
+        del indexes
+
+
+if __name__ == "__main__":
+    main()
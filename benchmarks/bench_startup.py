@@ -0,0 +1,80 @@
+"""
+Cold-start benchmark for the agent server.
+
+Runs `python -X importtime -c "import servers.agent_server"` in fresh
+interpreters and reports the cumulative import time of the server module,
+the heaviest top-level imports, and the time the lazy warm-up (agent tree +
+Runner) takes afterwards.
+
+Usage: python -m benchmarks.bench_startup [--runs 5]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def parse_importtime(stderr: str) -> Dict[str, Tuple[int, int]]:
+    """Maps module -> (self_us, cumulative_us, depth) for every import line."""
+    modules = {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            modules[module] = (int(self_us), int(cumulative_us), (len(indent) - 1) // 2)
+    return modules
+
+
+def run_import(module: str) -> Dict[str, Tuple[int, int]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+    )
+    return parse_importtime(result.stderr)
+
+
+def run_warm_up() -> float:
+    code = (
+        "import time; import servers.agent_server as s; "
+        "t = time.perf_counter(); s.adk_agent.warm_up(); print(time.perf_counter() - t)"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--module", default="servers.agent_server")
+    args = parser.parse_args(argv)
+
+    totals, last = [], {}
+    for _ in range(args.runs):
+        last = run_import(args.module)
+        totals.append(last[args.module][1] / 1000)
+
+    print(f"== Startup: import {args.module} ({args.runs} runs) ==")
+    print(f"import time   median {statistics.median(totals):8.1f} ms   min {min(totals):8.1f} ms   max {max(totals):8.1f} ms")
+
+    direct = sorted(
+        ((name, cum) for name, (_, cum, depth) in last.items() if depth == 1),
+        key=lambda item: item[1], reverse=True,
+    )
+    print("heaviest direct imports (last run):")
+    for name, cum in direct[:8]:
+        print(f"  {name:40s} {cum / 1000:8.1f} ms")
+    heavy = [name for name in ("google.adk", "google.genai", "agent_app.agent", "jsonschema", "numpy") if name in last]
+    print(f"deferred heavy modules imported eagerly: {heavy or 'none'}")
+
+    warm_up = run_warm_up()
+    print(f"lazy warm-up (agent tree + runner) {warm_up * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
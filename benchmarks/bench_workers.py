@@ -0,0 +1,107 @@
+"""
+Throughput-vs-workers benchmark for the agent server's multi-worker mode.
+
+Starts the mock API once, then the agent server with WORKERS=1, 2, 4 ...
+sharing a temporary SHARED_STATE_DB, and drives intercepted `/chat` turns
+(search + compare, no LLM calls) with a fixed number of concurrent clients.
+Each client rotates through several session ids, so consecutive turns of a
+session usually land on different workers.
+
+Usage: python -m benchmarks.bench_workers [--workers 1 2 4] [--requests 400] [--concurrency 32]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+import httpx
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+QUERIES = ["Find Toyota cars", "Compare Camry and Accord", "Search SUVs", "Compare 3 and 4"]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start(module: str, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", module], cwd=PROJECT_ROOT, env={**os.environ, **env},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_for(url: str, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+async def drive(base_url: str, total: int, concurrency: int) -> float:
+    counter = iter(range(total))
+
+    async def client(worker_id: int, http: httpx.AsyncClient):
+        for i in counter:
+            payload = {"query": QUERIES[i % len(QUERIES)], "session_id": f"bench_{worker_id}_{i % 4}"}
+            response = await http.post(f"{base_url}/chat", json=payload)
+            response.raise_for_status()
+
+    async with httpx.AsyncClient(timeout=30.0) as http:
+        start_time = time.perf_counter()
+        await asyncio.gather(*(client(c, http) for c in range(concurrency)))
+        return time.perf_counter() - start_time
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args(argv)
+
+    mock_port = free_port()
+    mock = start("servers.mock_api_server", {"MOCK_API_PORT": str(mock_port)})
+    print(f"== Throughput vs workers ({args.requests} turns, {args.concurrency} concurrent clients) ==")
+    try:
+        wait_for(f"http://127.0.0.1:{mock_port}/search")
+        baseline = None
+        for workers in args.workers:
+            port = free_port()
+            with tempfile.TemporaryDirectory() as tmp:
+                server = start("servers.agent_server", {
+                    "PORT": str(port),
+                    "WORKERS": str(workers),
+                    "SHARED_STATE_DB": os.path.join(tmp, "state.db"),
+                    "MOCK_API_URL": f"http://127.0.0.1:{mock_port}",
+                })
+                try:
+                    base_url = f"http://127.0.0.1:{port}"
+                    wait_for(f"{base_url}/ready")
+                    asyncio.run(drive(base_url, args.concurrency, args.concurrency))  # warm every worker
+                    elapsed = asyncio.run(drive(base_url, args.requests, args.concurrency))
+                finally:
+                    server.terminate()
+                    server.wait()
+            throughput = args.requests / elapsed
+            baseline = baseline or throughput
+            print(f"workers={workers:<3d} {throughput:8.1f} req/s   speedup x{throughput / baseline:4.2f}")
+    finally:
+        mock.terminate()
+        mock.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Synthetic vehicle catalogs for benchmarks, shaped like data/product_search.json."""
+import json
+import random
+from typing import Any, Dict, List
+
+MAKES = {
+    "Toyota": ["Camry", "Corolla", "RAV4", "Highlander", "Prius", "Tacoma"],
+    "Honda": ["Accord", "Civic", "CR-V", "Pilot", "Odyssey"],
+    "Tesla": ["Model 3", "Model Y", "Model S", "Model X"],
+    "Ford": ["Explorer", "F-150", "Escape", "Mustang", "Bronco"],
+    "BMW": ["X5", "X3", "3 Series", "5 Series", "i4"],
+    "Mercedes-Benz": ["C-Class", "E-Class", "GLC", "GLE"],
+    "Hyundai": ["Tucson", "Elantra", "Santa Fe", "Ioniq 5"],
+    "Kia": ["Telluride", "Sorento", "Sportage", "EV6"],
+}
+TYPES = ["Sedan", "SUV", "Truck", "Hatchback", "Coupe", "Minivan"]
+COLORS = ["Silver", "Black", "White", "Blue", "Grey", "Red", "Green"]
+FEATURES = [
+    "Reliable", "Fuel Efficient", "Comfortable Ride", "Safety Sense", "Sporty Handling",
+    "Spacious Interior", "Advanced Tech", "Autopilot", "Long Range", "Supercharging",
+    "Third Row Seating", "Towing Capacity", "Hybrid Option", "All-Wheel Drive", "Compact",
+    "Cargo Space", "Family Friendly", "Luxury Interior", "Panoramic Sunroof", "Heated Seats",
+    "Apple CarPlay", "Adaptive Cruise Control", "Lane Keep Assist", "Premium Audio",
+]
+
+
+def make_vehicles(count: int, seed: int = 7) -> List[Dict[str, Any]]:
+    """
+    Returns `count` vehicles. They are round-tripped through JSON so strings
+    are distinct objects, as they would be after json.load of a real file.
+    """
+    rng = random.Random(seed)
+    makes = list(MAKES)
+    vehicles = []
+    for i in range(count):
+        make = rng.choice(makes)
+        vehicles.append({
+            "id": str(i + 1),
+            "make": make,
+            "model": rng.choice(MAKES[make]),
+            "year": rng.randint(2015, 2025),
+            "price": rng.randrange(15000, 120000, 500),
+            "color": rng.choice(COLORS),
+            "type": rng.choice(TYPES),
+            "features": rng.sample(FEATURES, 4),
+        })
+    return json.loads(json.dumps(vehicles))
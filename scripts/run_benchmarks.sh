@@ -0,0 +1,12 @@
+#!/bin/bash
+# Ensure we are in the project root
+cd "$(dirname "$0")/.."
+
+mkdir -p log
+
+echo "Running benchmarks..."
+for bench in benchmarks/bench_*.py; do
+    module="benchmarks.$(basename "$bench" .py)"
+    .venv/bin/python -m "$module"
+    echo
+done | tee log/benchmarks.log
@@ -1,16 +1,23 @@
 import os
+import asyncio
+import hashlib
 import logging
-from typing import Optional, Dict, Any, List, Union
+import threading
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional, Dict, Any, AsyncIterator, List, NamedTuple, Set, Tuple, Union, Callable, Literal, TYPE_CHECKING
 import json
+import re
+import time
 import uuid
-import jsonschema
-from jsonschema import validate, ValidationError
+from concurrent.futures import Future
 
-import uvicorn
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
+from opentelemetry import trace
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -19,14 +26,47 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Import the root_agent from our agent_app
-from agent_app.agent import root_agent
-from google.adk.runners import Runner
-from google.adk.agents import Agent
-from google.genai.types import Content, Part, Tool
-from google.adk.sessions.in_memory_session_service import InMemorySessionService
+# google.adk, google.genai and the agent tree are imported on first use (see
+# ADKAgent): they account for most of the server's import time.
+if TYPE_CHECKING:
+    from google.adk.agents import Agent
+    from servers.semantic_cache import SemanticCache
 
 APP_NAME = "vehicle_agent"
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+
+from agent_app.prompts import A2UI_INSTRUCTION, SUMMARY_FACETS, use_catalog
+from servers import json_codec
+from servers.http_caching import CompressionMiddleware
+from servers.metrics import Registry, instrument_app
+from servers.tracing import configure_tracing, get_tracer, instrument_app_tracing
+
+configure_tracing("agent_server")
+tracer = get_tracer()
+
+# --- Metrics ---
+METRICS = Registry()
+INTENT_LATENCY = METRICS.histogram("agent_intent_duration_seconds", "Time to handle a chat turn by routed intent.", ["intent"])
+TOOL_LATENCY = METRICS.histogram("agent_tool_duration_seconds", "Tool call latency.", ["tool"])
+TARGET_RESOLUTIONS = METRICS.counter(
+    "agent_target_resolutions_total", "Book/compare targets by where they were found (turn, text, working_set, default).",
+    ["intent", "source"],
+)
+LLM_HOP_LATENCY = METRICS.histogram("agent_llm_hop_duration_seconds", "Latency of each model response in the agent chain.", ["agent"])
+PROMPT_TOKENS = METRICS.histogram(
+    "agent_prompt_tokens", "Prompt tokens of each model call (after history compaction).", ["agent"],
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000),
+)
+PROMPT_TOKENS_TOTAL = METRICS.counter("agent_prompt_tokens_total", "Prompt tokens sent to the model.", ["agent"])
+CACHED_PROMPT_TOKENS_TOTAL = METRICS.counter(
+    "agent_cached_prompt_tokens_total", "Prompt tokens the provider served from its context cache.", ["agent"]
+)
+TURN_PROMPT_TOKENS = METRICS.histogram(
+    "agent_turn_prompt_tokens", "Prompt tokens summed over the model calls of a chat turn.",
+    buckets=(500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000, 256000),
+)
+SESSIONS = METRICS.gauge("agent_sessions", "Sessions held by the session service.")
+CACHE_HIT_RATIO = METRICS.gauge("agent_cache_hit_ratio", "Hit ratio of in-process caches.", ["cache"])
 
 # --- A2UI Schema & Mock Data ---
 
@@ -44,112 +84,213 @@ A2UI_SCHEMA = {
     "required": ["action", "surfaceId", "surfaceType", "data"]
 }
 
+_a2ui_validator = None
+
+def get_a2ui_validator():
+    """Builds the A2UI schema validator once (jsonschema is imported lazily)."""
+    global _a2ui_validator
+    if _a2ui_validator is None:
+        from jsonschema.validators import validator_for
+        validator_cls = validator_for(A2UI_SCHEMA)
+        validator_cls.check_schema(A2UI_SCHEMA)
+        _a2ui_validator = validator_cls(A2UI_SCHEMA)
+    return _a2ui_validator
+
+@tracer.start_as_current_span("a2ui.validate")
 def validate_a2ui_msg(msg: Dict[str, Any]):
     """Validates the A2UI message against the schema."""
+    from jsonschema import ValidationError
     try:
-        validate(instance=msg, schema=A2UI_SCHEMA)
+        get_a2ui_validator().validate(msg)
     except ValidationError as e:
         logger.error(f"A2UI Validation Error: {e.message}")
         # We might want to re-raise or handle gracefully. 
         # For now, re-raising ensures we don't send bad data.
         raise e
 
-import requests
+# "structured": A2UI messages are returned as JSON objects in `data` (one encode pass).
+# "compat": A2UI messages are JSON strings in `text`, as current clients expect.
+A2UI_RESPONSE_FORMAT = os.environ.get("A2UI_RESPONSE_FORMAT", "compat")
+
+def chat_body(response: Dict[str, Any], response_format: str) -> Dict[str, Any]:
+    """A process_message (or stream step) result in the requested format; in compat every A2UI message is a JSON string."""
+    a2ui_msg = response.get("data")
+    if a2ui_msg is None or response_format != "compat":
+        return response
+    body = {"text": json_codec.dumps(a2ui_msg).decode("utf-8"), "data": None}
+    if "surfaces" in response:
+        # Multi-step turns: every surface, in step order
+        body["surfaces"] = [json_codec.dumps(surface).decode("utf-8") for surface in response["surfaces"]]
+    return body
+
+def render_chat_response(response: Dict[str, Any], response_format: Optional[str] = None) -> Response:
+    """Serializes a process_message result once, with the configured JSON encoder."""
+    response_format = response_format or A2UI_RESPONSE_FORMAT
+    a2ui_msg = response.get("data")
+    with tracer.start_as_current_span("a2ui.serialize") as span:
+        content = json_codec.dumps(chat_body(response, response_format))
+        span.set_attribute("a2ui.response_format", response_format)
+        span.set_attribute("a2ui.bytes", len(content))
+        if a2ui_msg is not None:
+            span.set_attribute("a2ui.surface_type", a2ui_msg["surfaceType"])
+    return Response(content=content, media_type="application/json")
+
+from servers.catalog import Catalog, CatalogSubscriber, open_catalog
+from servers.resilience import UpstreamClient
+from servers.search_index import query_terms, text_matches
+from servers.shared_state import make_shared_store
+from servers.working_set import WorkingSet
 
 
 # --- Load Product Data ---
-def load_product_data():
+# Compiled catalog (python -m servers.catalog_format ...) mapped instead of parsing the JSON
+CATALOG_BINARY = os.environ.get("CATALOG_BINARY")
+
+def load_product_data() -> Catalog:
     try:
-        with open("data/product_search.json", "r") as f:
-            return json.load(f)
+        catalog = open_catalog(DATA_DIR / "product_search.json", CATALOG_BINARY, epoch="local")
+        # Mapping the compiled file the mock API maps: the first poll catches up
+        # from its log instead of fetching a whole snapshot
+        catalog.epoch = catalog.base_epoch or catalog.epoch
+        return catalog
     except Exception as e:
         logger.error(f"Failed to load product_search.json: {e}")
-        return []
+        return Catalog(epoch="local")
+
+_catalog: Optional[Catalog] = None
 
-ALL_VEHICLES = load_product_data()
+def get_catalog() -> Catalog:
+    """
+    Local replica of the mock API's catalog, seeded from the data file on first
+    use and kept current by the change-feed subscriber started in `lifespan`.
+    """
+    global _catalog
+    if _catalog is None:
+        _catalog = load_product_data()
+    return _catalog
+
+# Agent prompts summarize this catalog instead of parsing the data file again
+use_catalog(lambda: get_catalog().facets(fields=SUMMARY_FACETS, price_buckets=1))
+
+def get_all_vehicles() -> List[Dict[str, Any]]:
+    """Catalog used for local ID resolution."""
+    return get_catalog().all()
 
 # Helper to find vehicle ID by query text
 def find_vehicles_in_text(text: str, limit: int = 2) -> List[str]:
+    """
+    Vehicle IDs named in the text: explicit IDs first, then vehicles of the
+    models mentioned, then one vehicle per other make mentioned. Makes and
+    models are matched against the catalog's distinct values, so only the
+    matching vehicles are ever decoded.
+    """
     text = text.lower()
-    
-    matched_ids = []
-    
+    catalog = get_catalog()
+
+    matched_ids: List[str] = []
+    seen: Set[str] = set()
+
+    def add(vehicle_id: str):
+        if vehicle_id not in seen:
+            seen.add(vehicle_id)
+            matched_ids.append(vehicle_id)
+
     # 0. Identify explicit IDs (e.g. "1", "3")
-    import re
-    # Match standalone digits
-    ids_in_text = re.findall(r'\b\d+\b', text)
-    for potential_id in ids_in_text:
-        # Verify if this ID exists in our vehicle list
-        if any(v['id'] == potential_id for v in ALL_VEHICLES):
-            if potential_id not in matched_ids:
-                matched_ids.append(potential_id)
-                
+    for potential_id in re.findall(r'\b\d+\b', text):
+        if catalog.get(potential_id) is not None:
+            add(potential_id)
+
     # If we have enough IDs, return them (prioritize explicit IDs)
     if len(matched_ids) >= limit:
         return matched_ids[:limit]
 
+    def mentioned(column: str) -> List[str]:
+        # In the order they appear in the text
+        hits = [(text.find(value.lower()), value) for value in catalog.values(column) if value]
+        return [value for position, value in sorted(hits) if position >= 0]
+
     # 1. Identify explicit Models
-    for v in ALL_VEHICLES:
-        if v['model'].lower() in text:
-            if v['id'] not in matched_ids:
-                matched_ids.append(v['id'])
-    
-    # 2. Identify explicit Makes (if we need more)
+    for model in mentioned("model"):
+        if len(matched_ids) >= limit:
+            break
+        for vehicle in catalog.filter(model=model, limit=limit):
+            add(vehicle["id"])
+
+    # 2. Identify explicit Makes (if we need more), one vehicle per make
     if len(matched_ids) < limit:
-        for v in ALL_VEHICLES:
-            if v['make'].lower() in text:
-                # Check if we already have a vehicle of this make
-                already_has_make = any(v['make'] == next((x['make'] for x in ALL_VEHICLES if x['id'] == mid), "") for mid in matched_ids)
-                if not already_has_make and v['id'] not in matched_ids:
-                    matched_ids.append(v['id'])
-                    
+        matched_makes = {catalog.get(vehicle_id)["make"].lower() for vehicle_id in matched_ids}
+        for make in mentioned("make"):
+            if len(matched_ids) >= limit:
+                break
+            if make.lower() in matched_makes:
+                continue
+            for vehicle in catalog.filter(make=make, limit=len(matched_ids) + 1):
+                if vehicle["id"] not in seen:
+                    add(vehicle["id"])
+                    matched_makes.add(make.lower())
+                    break
+
     return matched_ids[:limit]
 
 # --- Tools for Agent ---
 
 MOCK_API_URL = os.environ.get("MOCK_API_URL", "http://localhost:9999")
 
+# Multi-worker mode: state that must survive a turn landing on a different
+# worker goes to this SQLite file (sessions and shared caches).
+WORKERS = int(os.environ.get("WORKERS", 1))
+SHARED_STATE_DB = os.environ.get("SHARED_STATE_DB") or (
+    str(Path(__file__).resolve().parent.parent / "log" / "agent_state.db") if WORKERS > 1 else None
+)
+shared_store = make_shared_store(SHARED_STATE_DB)
+
+# Shared client for the backing API: per-endpoint circuit breakers, a retry
+# budget and stale results while an endpoint is down.
+upstream = UpstreamClient(
+    max_retries=int(os.environ.get("UPSTREAM_MAX_RETRIES", 2)),
+    timeout=float(os.environ.get("UPSTREAM_TIMEOUT_SECONDS", 5.0)),
+    failure_threshold=int(os.environ.get("UPSTREAM_FAILURE_THRESHOLD", 3)),
+    reset_timeout=float(os.environ.get("UPSTREAM_RESET_TIMEOUT_SECONDS", 30.0)),
+)
+
+def to_ui_vehicle(car: Dict[str, Any]) -> Dict[str, Any]:
+    """UI view of a catalog record (image path, formatted price); the record itself is left untouched."""
+    safe_model = car['model'].lower().replace(' ', '').replace('-', '')
+    safe_make = car['make'].lower()
+    price = car['price']
+    return {
+        **car,
+        "image": f"assets/{safe_make}_{safe_model}.jpg",
+        "price": f"${price:,}" if isinstance(price, (int, float)) else price,
+    }
+
+@tracer.start_as_current_span("tool.search_cars")
+@TOOL_LATENCY.labels("search_cars").time()
 def search_cars(query: str) -> List[Dict[str, Any]]:
     """Searches for cars based on a query."""
     logger.info(f"Tool search_cars called with query: {query}")
-    query = query.lower()
-    
-    # Extract make from query (simple heuristic)
-    make = None
-    if "toyota" in query: make = "Toyota"
-    elif "honda" in query: make = "Honda"
-    elif "tesla" in query: make = "Tesla"
-    elif "ford" in query: make = "Ford"
-    elif "bmw" in query: make = "BMW"
-    elif "mercedes" in query: make = "Mercedes-Benz"
-    elif "hyundai" in query: make = "Hyundai"
-    elif "kia" in query: make = "Kia"
-    
-    params = {}
-    if make:
-        params["make"] = make
-        
+    # Ranked full-text search on the API side (makes, models, types, colors, features; typo tolerant)
+    params = {"q": query}
+
     try:
-        response = requests.get(f"{MOCK_API_URL}/search", params=params)
-        response.raise_for_status()
-        results = response.json()
-        
-        # Transform for UI (Add 'image' and format 'price')
-        for car in results:
-            # Generate mock image path
-            safe_model = car['model'].lower().replace(' ', '').replace('-', '')
-            safe_make = car['make'].lower()
-            car['image'] = f"assets/{safe_make}_{safe_model}.jpg"
-            
-            # Format price if number
-            if isinstance(car['price'], (int, float)):
-                car['price'] = f"${car['price']:,}"
-                
-        return results
+        results = upstream.get(f"{MOCK_API_URL}/search", params=params)
+        return [to_ui_vehicle(car) for car in results]
     except Exception as e:
         logger.error(f"Error calling Mock API search: {e}")
         return []
 
+@tracer.start_as_current_span("tool.search_facets")
+@TOOL_LATENCY.labels("search_facets").time()
+def search_facets(query: str) -> Optional[Dict[str, Any]]:
+    """Make/type/color counts and a price histogram over everything the query matches."""
+    try:
+        return upstream.get(f"{MOCK_API_URL}/facets", params={"q": query, "fields": "make,type,color"})
+    except Exception as e:
+        logger.error(f"Error calling Mock API facets: {e}")
+        return None
+
+@tracer.start_as_current_span("tool.compare_cars")
+@TOOL_LATENCY.labels("compare_cars").time()
 def compare_cars(car_ids: List[str]) -> Dict[str, Any]:
     """Compares specific cars by their IDs."""
     logger.info(f"Tool compare_cars called with car_ids: {car_ids}")
@@ -159,26 +300,14 @@ def compare_cars(car_ids: List[str]) -> Dict[str, Any]:
         
     try:
         # Mock API only supports comparing 2 vehicles
-        response = requests.get(f"{MOCK_API_URL}/compare", params={"vehicle1_id": car_ids[0], "vehicle2_id": car_ids[1]})
-        response.raise_for_status()
-        data = response.json()
+        data = upstream.get(f"{MOCK_API_URL}/compare", params={"vehicle1_id": car_ids[0], "vehicle2_id": car_ids[1]})
         
         # Transform nested comparison to list of cars for UI
         comparison = data.get("comparison", {})
         v1 = comparison.get("vehicle1")
         v2 = comparison.get("vehicle2")
         
-        cars = []
-        if v1: cars.append(v1)
-        if v2: cars.append(v2)
-        
-        # Fix format for UI
-        for car in cars:
-             safe_model = car['model'].lower().replace(' ', '').replace('-', '')
-             safe_make = car['make'].lower()
-             car['image'] = f"assets/{safe_make}_{safe_model}.jpg"
-             if isinstance(car['price'], (int, float)):
-                car['price'] = f"${car['price']:,}"
+        cars = [to_ui_vehicle(car) for car in (v1, v2) if car]
         
         return {
             "cars": cars,
@@ -188,31 +317,410 @@ def compare_cars(car_ids: List[str]) -> Dict[str, Any]:
         logger.error(f"Error calling Mock API compare: {e}")
         return {"cars": []}
 
-def book_appointment(car_id: str, date: str, email: str) -> str:
-    """Book a test drive appointment."""
+@tracer.start_as_current_span("tool.find_similar_cars")
+@TOOL_LATENCY.labels("find_similar_cars").time()
+def find_similar_cars(car_ids: List[str], k: int = 5) -> List[Dict[str, Any]]:
+    """Finds the cars most similar to the given ones (price, year, type, make and features)."""
+    logger.info(f"Tool find_similar_cars called with car_ids: {car_ids}")
+    if not car_ids:
+        return []
+    try:
+        data = upstream.get(f"{MOCK_API_URL}/similar", params={"vehicle_id": car_ids, "k": k})
+        return [to_ui_vehicle(car) for car in data.get("results", [])]
+    except Exception as e:
+        logger.error(f"Error calling Mock API similar: {e}")
+        return []
+
+def open_slots(car_id: str, limit: int = 5) -> List[str]:
+    """The next open test-drive dates for a car (empty if availability cannot be fetched)."""
+    try:
+        return upstream.get(f"{MOCK_API_URL}/availability", params={"vehicle_id": car_id})["open"][:limit]
+    except Exception as e:
+        logger.warning(f"Could not fetch availability for {car_id}: {e}")
+        return []
+
+# Bookings submitted within this window (from any session) go upstream as one /book/batch call
+BOOKING_BATCH_WINDOW = float(os.environ.get("BOOKING_BATCH_WINDOW_MS", 5)) / 1000
+BOOKING_BATCH_MAX = 50
+
+class BookingBatcher:
+    """
+    Coalesces concurrent bookings into /book/batch requests.
+
+    The first booking of a window starts a timer; when it fires, or as soon
+    as the batch is full, the batch is sent from a worker thread and each
+    booking's future gets its own result. `submit` awaits that future, so a
+    booking neither blocks the event loop nor holds a thread while the
+    window is open.
+    """
+
+    def __init__(self, window: float = BOOKING_BATCH_WINDOW, max_batch: int = BOOKING_BATCH_MAX):
+        self.window = window
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[Dict[str, Any], Future]] = []
+        self._timer: Optional[threading.Timer] = None
+        self.batches = 0
+
+    async def submit(self, booking: Dict[str, Any]) -> Dict[str, Any]:
+        return await asyncio.wrap_future(self._enqueue(booking))
+
+    def _enqueue(self, booking: Dict[str, Any]) -> Future:
+        future: Future = Future()
+        with self._lock:
+            self._pending.append((booking, future))
+            full = self._take() if len(self._pending) >= self.max_batch else None
+            if full is None and self._timer is None:
+                self._timer = threading.Timer(self.window, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            threading.Thread(target=self._send, args=(full,), daemon=True).start()
+        return future
+
+    def _take(self) -> List[Tuple[Dict[str, Any], Future]]:
+        batch, self._pending = self._pending, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _flush(self):
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._send(batch)
+
+    def _send(self, batch: List[Tuple[Dict[str, Any], Future]]):
+        bookings = [b for b, _ in batch]
+        # Every booking carries its own key, so the batch is safe to retry as a whole
+        key = hashlib.sha256("|".join(b["idempotency_key"] for b in bookings).encode("utf-8")).hexdigest()[:32]
+        try:
+            results = upstream.post(
+                f"{MOCK_API_URL}/book/batch", json={"bookings": bookings}, headers={"Idempotency-Key": key}
+            )["results"]
+            # Results are positional: with any missing, none can be matched to its booking
+            if len(results) != len(batch):
+                raise ValueError(f"/book/batch returned {len(results)} results for {len(batch)} bookings")
+        except Exception as e:
+            results, error = None, e
+        else:
+            error = None
+        with self._lock:
+            self.batches += 1
+        for i, (_, future) in enumerate(batch):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results[i])
+
+booking_batcher = BookingBatcher()
+
+def booking_idempotency_key(car_id: str, date: str, email: str) -> str:
+    """Same form contents, same key: a double-submitted form books once."""
+    return hashlib.sha256(f"{car_id}|{date}|{(email or '').strip().lower()}".encode("utf-8")).hexdigest()[:32]
+
+def _booking_request(car_id: str, date: str, email: str) -> Dict[str, Any]:
+    return {
+        "vehicle_id": car_id,
+        "customer_name": "Demo User", # details not captured in simple form
+        "date": date,
+        "idempotency_key": booking_idempotency_key(car_id, date, email),
+    }
+
+def _booking_reply(data: Dict[str, Any], date: str) -> str:
+    if data.get("status") == "Conflict":
+        return f"Sorry, that vehicle is already booked on {date}. Please pick another date."
+    return data.get('message', f"Your appointment is confirmed. Status: {data.get('status', 'Confirmed')}.")
+
+@tracer.start_as_current_span("tool.book_appointment")
+@TOOL_LATENCY.labels("book_appointment").time()
+async def book_appointment(car_id: str, date: str, email: str) -> str:
+    """Book a test drive appointment (waits for its batch without holding a thread)."""
     logger.info(f"Tool book_appointment called for car_id={car_id}, date={date}, email={email}")
-    
+
     try:
-        payload = {
-            "vehicle_id": car_id,
-            "customer_name": "Demo User", # details not captured in simple form
-            "date": date
-        }
-        response = requests.post(f"{MOCK_API_URL}/book", json=payload)
-        response.raise_for_status()
-        data = response.json()
-        
-        return data.get('message', f"Your appointment is confirmed. Status: {data.get('status', 'Confirmed')}.")
+        return _booking_reply(await booking_batcher.submit(_booking_request(car_id, date, email)), date)
     except Exception as e:
         logger.error(f"Error calling Mock API book: {e}")
         return "Sorry, failed to book appointment due to server error."
 
-def handle_client_event(event_type: str, payload: Dict[str, Any]) -> str:
-    """Handles events sent from the client UI."""
+def route_intent(input_text: str) -> str:
+    """Keyword routing used by the tool simulation middleware in process_message."""
+    text = input_text.lower()
+    # Before search: "find cars similar to the Camry" is a similarity request
+    if "similar" in text or "cars like" in text or "alternatives to" in text:
+        return "similar"
+    if "search" in text or "find" in text:
+        return "search"
+    if "compare" in text:
+        return "compare"
+    if "book" in text and "form" not in text:
+        return "book"
+    if "EVENT:" in input_text:
+        return "event"
+    return "llm"
+
+# Intents handled by calling tools directly (no model call)
+TOOL_INTENTS = ("search", "similar", "compare", "book")
+
+# Independent tool steps of one turn run concurrently, at most this many at a time
+TOOL_CONCURRENCY = int(os.environ.get("TOOL_CONCURRENCY", 4))
+
+# "..., and book the cheaper one": a new clause starts at a tool verb after a conjunction
+CLAUSE_BREAK = re.compile(r"\s*(?:,|;|\band then\b|\bthen\b|\band\b)\s+(?=(?:compare|book|find|search|show|list)\b)", re.IGNORECASE)
+# Words by which a clause refers to the vehicles of the previous one
+BACK_REFERENCE = re.compile(r"\b(?:cheaper|cheapest|more expensive|priciest|newer|newest|it|them|those|that one|the one|both)\b", re.IGNORECASE)
+
+class TurnStep(NamedTuple):
+    index: int
+    intent: str
+    text: str
+    depends_on: Optional[int] = None
+
+def plan_turn(input_text: str, intent: Optional[str] = None) -> List[TurnStep]:
+    """
+    Splits a request into one tool step per clause ("compare the Camry and
+    Accord and book the cheaper one" -> compare, book). A clause that refers
+    back to earlier results without naming a vehicle depends on the step
+    before it; the others are independent. Clauses that route to no tool stay
+    with the clause before them.
+    """
+    clauses: List[Tuple[str, str]] = []
+    for clause in CLAUSE_BREAK.split(input_text):
+        clause_intent = route_intent(clause)
+        if clause_intent in TOOL_INTENTS or not clauses:
+            clauses.append((clause, clause_intent))
+        else:
+            clauses[-1] = (f"{clauses[-1][0]} and {clause}", clauses[-1][1])
+    if len(clauses) == 1 or any(i not in TOOL_INTENTS for _, i in clauses):
+        return [TurnStep(0, intent or route_intent(input_text), input_text)]
+    steps = []
+    for index, (clause, clause_intent) in enumerate(clauses):
+        refers_back = index > 0 and BACK_REFERENCE.search(clause) and not find_vehicles_in_text(clause, limit=1)
+        steps.append(TurnStep(index, clause_intent, clause, index - 1 if refers_back else None))
+    return steps
+
+def result_cars(result: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Vehicles shown by a step's surface (table rows or comparison cards)."""
+    data = (result or {}).get("data") or {}
+    surface = data.get("data", {})
+    return surface.get("rows") or surface.get("cars") or []
+
+def pick_car(cars: List[Dict[str, Any]], text: str) -> Dict[str, Any]:
+    """The vehicle a back-reference like "the cheaper one" points at."""
+    def price(car):
+        value = re.sub(r"[^\d.]", "", str(car.get("price", "")))
+        return float(value) if value else float("inf")
+    text = text.lower()
+    if "cheap" in text:
+        return min(cars, key=price)
+    if "expensive" in text or "priciest" in text:
+        return max(cars, key=price)
+    if "newer" in text or "newest" in text:
+        return max(cars, key=lambda car: car.get("year") or 0)
+    return cars[0]
+
+# Words that pick among several vehicles rather than name one
+RANKING = re.compile(r"\b(?:cheap\w*|more expensive|priciest|newer|newest)\b", re.IGNORECASE)
+
+PLURAL_REFERENCE = re.compile(r"\b(?:them|those|both)\b", re.IGNORECASE)
+
+def working_set_pool(working_set: WorkingSet, text: str) -> List[Dict[str, Any]]:
+    """The vehicles of the working set a request can mean, most likely first."""
+    pool = working_set.candidates()
+    if RANKING.search(text) and pool:
+        return [pick_car(pool, text)]
+    if working_set.selected:
+        selected = working_set.selection()
+        pool = [selected] + [car for car in pool if car["id"] != selected["id"]]
+    return pool
+
+def resolve_cars(
+    intent: str, text: str, referenced: List[Dict[str, Any]], working_set: Optional[WorkingSet], limit: int
+) -> List[Dict[str, Any]]:
+    """
+    Up to `limit` vehicles a book/compare request is about, without a model
+    call: the previous step's vehicles, else the session's working set for a
+    back-reference ("it", "the cheaper one", "them"), then those named in
+    the text, topped up from the working set (the selected row, then the
+    vehicles shown last; a ranking word like "cheaper" picks among those).
+    """
+    if referenced:
+        cars, source = ([pick_car(referenced, text)] if limit == 1 else referenced[:limit]), "turn"
+        TARGET_RESOLUTIONS.labels(intent, source).inc()
+        return cars
+
+    pool = working_set_pool(working_set, text) if working_set else []
+    cars: List[Dict[str, Any]] = []
+    source = "default"
+    if pool and BACK_REFERENCE.search(text):
+        # Resolved before the text is scanned: "book it" needs no catalog lookup
+        cars, source = pool[:limit if PLURAL_REFERENCE.search(text) else 1], "working_set"
+    if len(cars) < limit:
+        known = {car["id"] for car in cars}
+        catalog = get_catalog()
+        named = [car for car in map(catalog.get, find_vehicles_in_text(text, limit)) if car is not None]
+        named = [car for car in named if car["id"] not in known][:limit - len(cars)]
+        if named:
+            cars += named
+            source = "working_set" if source == "working_set" else "text"
+    if len(cars) < limit and pool:
+        known = {car["id"] for car in cars}
+        extra = [car for car in pool if car["id"] not in known]
+        if extra:
+            cars += extra[:limit - len(cars)]
+            source = "working_set"
+    TARGET_RESOLUTIONS.labels(intent, source).inc()
+    return cars
+
+def run_tool_step(
+    step: TurnStep, prior: Optional[Dict[str, Any]] = None, working_set: Optional[WorkingSet] = None
+) -> Dict[str, Any]:
+    """
+    Runs the tools for one step and builds its A2UI surface. `prior` is the
+    result of the step this one depends on; `working_set` is the session's
+    (read only here). Returns {"text", "data"}.
+    """
+    input_text = step.text
+    intent = step.intent
+    response_text = ""
+    a2ui_msg = None
+    referenced = result_cars(prior)
+
+    if intent == "search":
+        cars = search_cars(input_text)
+        surface_id = str(uuid.uuid4())
+        a2ui_msg = {
+            "action": "beginRendering",
+            "surfaceId": surface_id,
+            "surfaceType": "table",
+            "data": {
+                "columns": ["ID", "Make", "Model", "Year", "Price"],
+                "rows": cars
+            }
+        }
+        if cars:
+            # Refinement counts for the whole match set, so the UI needn't fetch every row
+            facets = search_facets(input_text)
+            if facets is not None:
+                a2ui_msg["data"]["facets"] = facets
+        validate_a2ui_msg(a2ui_msg)
+
+    elif intent == "similar":
+        found_ids = [pick_car(referenced, input_text)["id"]] if referenced else find_vehicles_in_text(input_text, limit=1)
+        cars = find_similar_cars(found_ids)
+        if cars:
+            a2ui_msg = {
+                "action": "beginRendering",
+                "surfaceId": str(uuid.uuid4()),
+                "surfaceType": "table",
+                "data": {
+                    "columns": ["ID", "Make", "Model", "Year", "Price", "Similarity"],
+                    "rows": cars
+                }
+            }
+            validate_a2ui_msg(a2ui_msg)
+        elif not found_ids:
+            response_text = "Which car should I find similar ones to? Mention its make, model or ID."
+        else:
+            response_text = "Sorry, I couldn't find similar cars right now."
+
+    elif intent == "compare":
+        # Dynamic ID Resolution
+        found_ids = [car["id"] for car in resolve_cars(intent, input_text, referenced, working_set, 2)]
+
+        # Fallback if no specific makes found (or only 1)
+        if len(found_ids) < 2:
+            # If lookup failed, maybe default to Camry vs Accord as a safe fallback
+            if "1" not in found_ids: found_ids.append("1")
+            if "2" not in found_ids and len(found_ids) < 2: found_ids.append("2")
+
+        cars = compare_cars(found_ids)
+        surface_id = str(uuid.uuid4())
+        a2ui_msg = {
+            "action": "beginRendering",
+            "surfaceId": surface_id,
+            "surfaceType": "card-comparison",
+            "data": cars
+        }
+        validate_a2ui_msg(a2ui_msg)
+
+    elif intent == "book":
+        # Trigger form
+        targets = resolve_cars(intent, input_text, referenced, working_set, 1)
+        if targets:
+            car = targets[0]
+            form = {"carId": car["id"], "make": car["make"], "model": car["model"]}
+            slots = open_slots(car["id"])
+            if slots:
+                form["slots"] = slots
+        else:
+            form = {"carId": "c1", "make": "Tesla", "model": "Model 3"} # Mock context
+        surface_id = str(uuid.uuid4())
+        a2ui_msg = {
+            "action": "beginRendering",
+            "surfaceId": surface_id,
+            "surfaceType": "booking-form",
+            "data": form
+        }
+        validate_a2ui_msg(a2ui_msg)
+
+    return {"text": response_text, "data": a2ui_msg}
+
+async def execute_steps(
+    steps: List[TurnStep], working_set: Optional[WorkingSet] = None
+) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Runs the steps of a turn, yielding (step index, result) as each finishes.
+    Independent steps run concurrently in worker threads, at most
+    TOOL_CONCURRENCY at a time; a dependent step starts once the step it
+    refers to has finished.
+    """
+    slots = asyncio.Semaphore(TOOL_CONCURRENCY)
+    tasks: Dict[int, "asyncio.Task[Tuple[int, Dict[str, Any]]]"] = {}
+
+    async def run(step: TurnStep) -> Tuple[int, Dict[str, Any]]:
+        prior = None
+        if step.depends_on is not None:
+            _, prior = await tasks[step.depends_on]
+        async with slots:
+            try:
+                return step.index, await asyncio.to_thread(run_tool_step, step, prior, working_set)
+            except Exception as e:
+                logger.error(f"Step {step.index} ({step.intent}) failed: {e}")
+                return step.index, {"text": f"Sorry, I couldn't {step.intent} that right now.", "data": None}
+
+    for step in steps:
+        tasks[step.index] = asyncio.create_task(run(step))
+    try:
+        for finished in asyncio.as_completed(list(tasks.values())):
+            yield await finished
+    finally:
+        for task in tasks.values():
+            task.cancel()
+
+def merge_step_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """One chat response from step results in step order; every surface is listed in `surfaces`."""
+    if len(results) == 1:
+        return results[0]
+    surfaces = [r["data"] for r in results if r.get("data") is not None]
+    return {
+        "text": "\n".join(r["text"] for r in results if r.get("text")),
+        "data": surfaces[0] if surfaces else None,
+        "surfaces": surfaces,
+    }
+
+async def handle_client_event(event_type: str, payload: Dict[str, Any], working_set: Optional[WorkingSet] = None) -> str:
+    """Handles events sent from the client UI; a selected row becomes the session's selection."""
     logger.info(f"Tool handle_client_event called: type={event_type}, payload={payload}")
+    if event_type == "rowSelect" and working_set is not None:
+        car = get_catalog().get(str(payload.get("carId")))
+        if car is not None:
+            working_set.select(car)
     if event_type == "formSubmit":
         # Example: payload={"carId": "c1", "date": "2023-10-10", "email": "bmw@test.com"}
-        return book_appointment(payload.get("carId"), payload.get("date"), payload.get("email"))
+        return await book_appointment(payload.get("carId"), payload.get("date"), payload.get("email"))
     elif event_type == "rowSelect":
         return f"User selected car {payload.get('carId')}. Ask if they want to compare or book it."
     return f"Event {event_type} received."
@@ -224,28 +732,29 @@ class ADKAgent:
     """
     def __init__(
         self,
-        adk_agent: Agent,
-        app_name: str,
+        adk_agent: Optional["Agent"] = None,
+        app_name: str = APP_NAME,
         user_id: str = "demo_user",
         execution_timeout_seconds: int = 600,
         tool_timeout_seconds: int = 300,
+        response_cache: Optional["SemanticCache"] = None,
+        agent_factory: Optional[Callable[[], "Agent"]] = None,
+        response_cache_factory: Optional[Callable[[], "SemanticCache"]] = None,
     ):
-        self.adk_agent = adk_agent
         self.app_name = app_name
         self.user_id = user_id
-        
-        # Initialize standard ADK Runner
-        self.session_service = InMemorySessionService()
-        self.session_service.create_session_sync(
-            app_name=self.app_name,
-            user_id=self.user_id,
-            session_id="default_session"
-        )
-        self.runner = Runner(
-            agent=self.adk_agent,
-            app_name=self.app_name,
-            session_service=self.session_service,
-        )
+
+        # The agent tree, session service and Runner are built on first use
+        # (or by warm_up() from the FastAPI lifespan) to keep imports cheap.
+        self._adk_agent = adk_agent
+        self._agent_factory = agent_factory
+        self._session_service = None
+        self._runner = None
+        self._init_lock = threading.Lock()
+
+        # Answers to free-text questions that went through the LLM chain
+        self._response_cache = response_cache
+        self._response_cache_factory = response_cache_factory
         
         # Add tools to the agent's context (simplification: updating the prompt or tool definitions dynamically)
         # For this demo, we assume the root_agent or a new agent instance is configured with these.
@@ -255,45 +764,142 @@ class ADKAgent:
         # NOTE: Real A2UI would have the model emit A2UI commands directly. Here we might need a processing layer
         # to convert tool outputs into A2UI commands if the model doesn't do it natively.
         
-        # Injecting instructions for A2UI
-        self.system_instruction = """
-        You are a helpful vehicle agent. You can search for cars, compare them, and book test drives.
-        
-        CRITICAL: You communicate with the UI using specific JSON commands. 
-        When you want to show a UI component, output a VALID JSON block (and nothing else for that part) with this schema:
-        {
-          "action": "beginRendering" | "surfaceUpdate",
-          "surfaceId": "unique-id",
-          "surfaceType": "table" | "card-comparison" | "booking-form" | "markdown",
-          "data": { ... component specific data ... }
-        }
-        
-        MAPPINGS:
-        1. If user asks to search cars -> Call search_cars() -> Then output A2UI JSON with surfaceType="table" and data={"columns": ["Make", "Model", "Year", "Price"], "rows": [ ...from tool result... ]}.
-        2. If user asks to compare cars -> Call compare_cars() -> Then output A2UI JSON with surfaceType="card-comparison" and data={"cards": [ ...from tool result... ]}.
-        3. If user wants to book -> Output A2UI JSON with surfaceType="booking-form" and data={"carId": "..."}.
-        4. If you receive a 'formSubmit' event -> Call book_appointment() -> Output confirmation text or markdown.
-        """
+        # Injecting instructions for A2UI (kept with the other prompts)
+        self.system_instruction = A2UI_INSTRUCTION
         # In a real app, we'd append this to the agent's instructions.
-        
+
+    @property
+    def adk_agent(self) -> "Agent":
+        if self._adk_agent is None:
+            with self._init_lock:
+                if self._adk_agent is None:
+                    self._adk_agent = self._agent_factory()
+        return self._adk_agent
+
+    @property
+    def session_service(self):
+        if self._session_service is None:
+            with self._init_lock:
+                if self._session_service is None:
+                    self._session_service = make_session_service()
+        return self._session_service
+
+    @session_service.setter
+    def session_service(self, value):
+        self._session_service = value
+
+    @property
+    def runner(self):
+        if self._runner is None:
+            agent = self.adk_agent
+            session_service = self.session_service
+            with self._init_lock:
+                if self._runner is None:
+                    from google.adk.runners import Runner
+                    self._runner = Runner(
+                        agent=agent,
+                        app_name=self.app_name,
+                        session_service=session_service,
+                    )
+        return self._runner
+
+    @runner.setter
+    def runner(self, value):
+        self._runner = value
+
+    @property
+    def response_cache(self) -> Optional["SemanticCache"]:
+        if self._response_cache is None and self._response_cache_factory is not None:
+            with self._init_lock:
+                if self._response_cache is None:
+                    self._response_cache = self._response_cache_factory()
+        return self._response_cache
+
+    @property
+    def ready(self) -> bool:
+        """True once the runner (and with it the agent tree) has been built."""
+        return self._runner is not None
+
+    def warm_up(self):
+        """Builds everything needed to serve a turn: catalog, schema validator, runner."""
+        start = time.perf_counter()
+        get_catalog()
+        get_a2ui_validator()
+        _ = self.response_cache
+        _ = self.runner
+        logger.info(f"Agent warm-up finished in {time.perf_counter() - start:.2f}s")
+
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Semantic cache stats, without building the cache just to report on it."""
+        if self._response_cache is None:
+            return None
+        return self._response_cache.stats()
+
+    def session_count(self) -> int:
+        """Sessions held in process memory (0 when sessions live in the shared store)."""
+        sessions = getattr(self._session_service, "sessions", None)
+        if not sessions:
+            return 0
+        return sum(
+            len(user_sessions)
+            for users in sessions.values()
+            for user_sessions in users.values()
+        )
+
+    async def ensure_session(self, session_id: str):
+        """Creates the session if no worker has created it yet."""
+        session = await self.session_service.get_session(
+             app_name=self.app_name,
+             user_id=self.user_id,
+             session_id=session_id
+        )
+        if session:
+            return session
+        from google.adk.errors.already_exists_error import AlreadyExistsError
+        try:
+            return await self.session_service.create_session(
+                app_name=self.app_name,
+                user_id=self.user_id,
+                session_id=session_id
+            )
+        except AlreadyExistsError:
+            # Another worker created it between our get and create
+            return await self.session_service.get_session(
+                app_name=self.app_name,
+                user_id=self.user_id,
+                session_id=session_id
+            )
+
+    async def record_turn(self, session, user_text: str, answer: str):
+        """Appends a turn answered without the runner to the session history, as the runner would."""
+        from google.adk.events import Event
+        from google.genai.types import Content, Part
+        invocation_id = Event.new_id()
+        for author, role, text in (("user", "user", user_text), (self.adk_agent.name, "model", answer)):
+            await self.session_service.append_event(
+                session, Event(invocation_id=invocation_id, author=author, content=Content(role=role, parts=[Part(text=text)]))
+            )
+
     async def process_message(self, query: str, session_id: str = "default_session", event_payload: Optional[Dict] = None) -> Dict[str, Any]:
         """
         Process a message using the ADK Runner.
         """
+        results: Dict[int, Dict[str, Any]] = {}
+        async for index, result in self.process_message_stream(query, session_id, event_payload):
+            results[index] = result
+        return merge_step_results([results[i] for i in sorted(results)])
+
+    async def process_message_stream(self, query: str, session_id: str = "default_session", event_payload: Optional[Dict] = None) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Like process_message, but yields (step index, {"text", "data"}) for
+        each step of the turn as soon as it finishes. Requests naming several
+        tool actions run them concurrently (see plan_turn); everything else
+        is a single step.
+        """
         logger.info(f"Processing message: {query} for session: {session_id}")
         
         # Ensure session exists
-        session = self.session_service.get_session_sync(
-             app_name=self.app_name,
-             user_id=self.user_id,
-             session_id=session_id
-        )
-        if not session:
-             self.session_service.create_session_sync(
-                 app_name=self.app_name,
-                 user_id=self.user_id,
-                 session_id=session_id
-             )
+        session = await self.ensure_session(session_id)
         
         # Prepare content
         # If it's an event, we format it as a system message or specific tool result
@@ -309,92 +915,103 @@ class ADKAgent:
         # REAL IMPLEMENTATION: The agent would have these tools registered.
         
         response_text = ""
+        a2ui_msg = None
+        turn_start = time.perf_counter()
+        with tracer.start_as_current_span("route_intent") as span:
+            intent = route_intent(input_text)
+            span.set_attribute("agent.intent", intent)
+        trace.get_current_span().set_attribute("agent.intent", intent)
         
         # --- SIMPLE TOOL SIMULATION (Middleware) ---
-        if "search" in input_text.lower() or "find" in input_text.lower():
-            cars = search_cars(input_text)
-            surface_id = str(uuid.uuid4())
-            a2ui_msg = {
-                "action": "beginRendering",
-                "surfaceId": surface_id,
-                "surfaceType": "table",
-                "data": {
-                    "columns": ["ID", "Make", "Model", "Year", "Price"],
-                    "rows": cars
-                }
-            }
-            validate_a2ui_msg(a2ui_msg)
-            response_text = json.dumps(a2ui_msg)
-
-        elif "compare" in input_text.lower():
-            # Dynamic ID Resolution
-            found_ids = find_vehicles_in_text(input_text)
+        if intent in TOOL_INTENTS:
+            steps = plan_turn(input_text, intent) if not event_payload else [TurnStep(0, intent, input_text)]
+            trace.get_current_span().set_attribute("agent.steps", len(steps))
+            # Steps read the working set as it was at the start of the turn
+            working_set = WorkingSet.load(shared_store, session_id)
+            results = {}
+            async for index, result in execute_steps(steps, working_set):
+                results[index] = result
+                yield index, result
+            for index in sorted(results):
+                working_set.observe(results[index].get("data"))
+            working_set.save(shared_store, session_id)
+            INTENT_LATENCY.labels(intent if len(steps) == 1 else "multi").observe(time.perf_counter() - turn_start)
+            return
             
-            # Fallback if no specific makes found (or only 1)
-            if len(found_ids) < 2:
-                # If lookup failed, maybe default to Camry vs Accord as a safe fallback
-                if "1" not in found_ids: found_ids.append("1")
-                if "2" not in found_ids and len(found_ids) < 2: found_ids.append("2")
-                
-            cars = compare_cars(found_ids)
-            surface_id = str(uuid.uuid4())
-            a2ui_msg = {
-                "action": "beginRendering",
-                "surfaceId": surface_id,
-                "surfaceType": "card-comparison",
-                "data": cars
-            }
-            validate_a2ui_msg(a2ui_msg)
-            response_text = json.dumps(a2ui_msg)
-            
-        elif "book" in input_text.lower() and "form" not in input_text.lower():
-            # Trigger form
-            surface_id = str(uuid.uuid4())
-            a2ui_msg = {
-                "action": "beginRendering",
-                "surfaceId": surface_id,
-                "surfaceType": "booking-form",
-                "data": {"carId": "c1", "make": "Tesla", "model": "Model 3"} # Mock context
-            }
-            validate_a2ui_msg(a2ui_msg)
-            response_text = json.dumps(a2ui_msg)
-            
-        elif "EVENT:" in input_text:
+        if intent == "event":
              # Handle event
              try:
                  event_data = json.loads(input_text.replace("EVENT: ", ""))
                  client_event = event_data.get("type")
                  payload = event_data.get("payload", {})
                  
-                 result = handle_client_event(client_event, payload)
+                 working_set = WorkingSet.load(shared_store, session_id)
+                 result = await handle_client_event(client_event, payload, working_set)
+                 working_set.save(shared_store, session_id)
                  response_text = result
              except Exception as e:
                  response_text = f"Error handling event: {e}"
         
         else:
+            # Only a session's first turn is context-free: a later "tell me more"
+            # depends on what came before, so it is neither looked up nor stored
+            context_free = not session.events and not WorkingSet.load(shared_store, session_id)
+            cached = None
+            if self.response_cache is not None and context_free:
+                cached = self.response_cache.lookup(input_text)
+            if cached is not None:
+                await self.record_turn(session, input_text, cached)
+                INTENT_LATENCY.labels("llm_cached").observe(time.perf_counter() - turn_start)
+                yield 0, {"text": cached, "data": None}
+                return
+
             # Fallback to actual agent for chat
+            model_calls = 0
+            prompt_tokens = 0
             try:
+                from google.genai.types import Content, Part
                 content = Content(parts=[Part(text=input_text)])
+                hop_start = time.perf_counter()
                 async for event in self.runner.run_async(
                     user_id=self.user_id,
                     session_id=session_id,
                     new_message=content
                 ):
+                    usage = event.usage_metadata
+                    if usage is not None and usage.prompt_token_count:
+                        author = event.author or "unknown"
+                        prompt_tokens += usage.prompt_token_count
+                        PROMPT_TOKENS.labels(author).observe(usage.prompt_token_count)
+                        PROMPT_TOKENS_TOTAL.labels(author).inc(usage.prompt_token_count)
+                        CACHED_PROMPT_TOKENS_TOTAL.labels(author).inc(usage.cached_content_token_count or 0)
                     if event.content and event.content.parts:
+                        if event.content.role == "model":
+                            model_calls += 1
+                            LLM_HOP_LATENCY.labels(event.author or "unknown").observe(time.perf_counter() - hop_start)
                         for part in event.content.parts:
                             if part.text:
                                 response_text += part.text
+                    hop_start = time.perf_counter()
+                trace.get_current_span().set_attribute("agent.model_calls", model_calls)
+                trace.get_current_span().set_attribute("agent.prompt_tokens", prompt_tokens)
+                if prompt_tokens:
+                    TURN_PROMPT_TOKENS.observe(prompt_tokens)
+                if self.response_cache is not None and model_calls and context_free:
+                    self.response_cache.store(input_text, response_text, model_calls=model_calls)
             except Exception as e:
                 logger.error(f"Error calling agent: {e}")
                 response_text = "I'm having trouble connecting to my brain right now."
 
-        # Return formatted response
-        return {"text": response_text, "data": None}
+        INTENT_LATENCY.labels(intent).observe(time.perf_counter() - turn_start)
+
+        # Return formatted response; A2UI messages are serialized once, by the endpoint
+        yield 0, {"text": response_text, "data": a2ui_msg}
 
 class ChatRequest(BaseModel):
     query: str
     session_id: Optional[str] = "default_session"
     event: Optional[Dict[str, Any]] = None # Support for client events
+    response_format: Optional[Literal["compat", "structured"]] = None # Defaults to A2UI_RESPONSE_FORMAT
 
 def add_adk_fastapi_endpoint(
     app: FastAPI,
@@ -410,29 +1027,141 @@ def add_adk_fastapi_endpoint(
         """
         Send a message to the agent and get a response.
         """
-        if request.event:
-             # Process client event
-             response = await adk_agent.process_message("", request.session_id, event_payload=request.event)
-        else:
-             response = await adk_agent.process_message(request.query, request.session_id)
-        return response
+        with tracer.start_as_current_span("chat_turn", attributes={"session.id": request.session_id}):
+            if request.event:
+                 # Process client event
+                 response = await adk_agent.process_message("", request.session_id, event_payload=request.event)
+            else:
+                 response = await adk_agent.process_message(request.query, request.session_id)
+            return render_chat_response(response, request.response_format)
+
+    @app.post(f"{path}chat/stream", tags=["Agent"], summary="Chat with the agent, streaming each surface as it is ready")
+    async def chat_stream_endpoint(request: ChatRequest):
+        """
+        Newline-delimited JSON: one {"index", "text", "data"} line per step of
+        the turn, in completion order (`index` is the step's position in the
+        request), then {"done": true, "steps": n}. Each line has the shape
+        `response_format` gives a /chat response.
+        """
+        response_format = request.response_format or A2UI_RESPONSE_FORMAT
+
+        async def lines():
+            with tracer.start_as_current_span("chat_turn", attributes={"session.id": request.session_id}):
+                steps = 0
+                async for index, result in adk_agent.process_message_stream(
+                    request.query, request.session_id, event_payload=request.event
+                ):
+                    steps += 1
+                    yield json_codec.dumps({"index": index, **chat_body(result, response_format)}) + b"\n"
+                yield json_codec.dumps({"done": True, "steps": steps}) + b"\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
 
     logger.info(f"Added ADK endpoints at {path}chat")
 
 # --- End Polyfill ---
 
+def make_session_service():
+    """
+    Sessions live in the SQLite file named by SHARED_STATE_DB when set, so any
+    worker process can serve any turn; otherwise they stay in process memory.
+    """
+    if SHARED_STATE_DB:
+        from google.adk.sessions.sqlite_session_service import SqliteSessionService
+        return SqliteSessionService(SHARED_STATE_DB)
+    from google.adk.sessions.in_memory_session_service import InMemorySessionService
+    return InMemorySessionService()
+
+def load_root_agent() -> "Agent":
+    """Imports the agent tree (and with it google.adk) on first use."""
+    from agent_app.agent import root_agent
+    return root_agent
+
+def make_response_cache() -> Optional["SemanticCache"]:
+    if os.environ.get("SEMANTIC_CACHE_ENABLED", "true").lower() != "true":
+        return None
+    from servers.semantic_cache import SemanticCache
+    return SemanticCache(
+        threshold=float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.9)),
+        ttl_seconds=float(os.environ.get("SEMANTIC_CACHE_TTL_SECONDS", 3600)),
+        shared_store=shared_store if SHARED_STATE_DB else None,
+    )
+
+def fetch_catalog_changes(since: int, epoch: str) -> Dict[str, Any]:
+    # Every `since` is a new URL, and an old feed must never be replayed while the upstream is down
+    return upstream.get(f"{MOCK_API_URL}/changes", params={"since": since, "epoch": epoch}, cacheable=False)
+
+def _record_matches(vehicle: Dict[str, Any], params: Dict[str, Any]) -> bool:
+    """Whether a /search with these filters would include `vehicle`."""
+    return all(
+        str(vehicle.get(field, "")).lower() == str(params[field]).lower()
+        for field in ("make", "model", "type")
+        if params.get(field)
+    )
+
+def invalidate_vehicles(affected: List[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]):
+    """Drops only the cached results that could mention a changed vehicle."""
+    records = [v for pair in affected for v in pair if v is not None]
+    ids = {v["id"] for v in records}
+
+    def upstream_affected(url: str, params: Dict[str, Any]) -> bool:
+        if url.endswith("/search") or url.endswith("/facets"):
+            # A query without searchable words ("find cars") behaves like the filters alone
+            if params.get("q") and query_terms(params["q"]):
+                texts = lambda v: [v["make"], v["model"], v.get("type", ""), v.get("color", ""), *v.get("features", [])]
+                return any(text_matches(params["q"], texts(v)) for v in records)
+            return any(_record_matches(v, params) for v in records)
+        if url.endswith("/compare"):
+            return params.get("vehicle1_id") in ids or params.get("vehicle2_id") in ids
+        # Any edit can change neighbours (and the price/year scaling) of every vehicle
+        return url.endswith("/similar")
+
+    dropped = upstream.invalidate(upstream_affected)
+
+    cache = adk_agent.response_cache
+    if cache is not None:
+        names = {name.lower() for v in records for name in (v["make"], v["model"])}
+
+        def answer_affected(entry: Dict[str, Any]) -> bool:
+            text = f"{entry['query']} {entry['answer']}".lower()
+            return any(name in text for name in names)
+
+        dropped += cache.invalidate(answer_affected)
+    logger.info(f"Catalog change touched {len(ids)} vehicle(s); dropped {dropped} cached result(s)")
+
 # Create AG-UI wrapper around the existing ADK agent
 adk_agent = ADKAgent(
-    adk_agent=root_agent,
     app_name=APP_NAME,
     user_id="demo_user",
+    agent_factory=load_root_agent,
+    response_cache_factory=make_response_cache,
 )
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Warms the agent up in the background so the port opens immediately (/ready
+    reports completion) and follows the mock API's catalog change feed.
+    """
+    warm_up_task = None
+    if os.environ.get("WARM_UP_ON_STARTUP", "true").lower() == "true":
+        warm_up_task = asyncio.create_task(asyncio.to_thread(adk_agent.warm_up))
+    catalog_task = None
+    poll_seconds = float(os.environ.get("CATALOG_POLL_SECONDS", 5))
+    if poll_seconds > 0:
+        subscriber = CatalogSubscriber(get_catalog(), fetch_catalog_changes, invalidate_vehicles, interval=poll_seconds)
+        catalog_task = asyncio.create_task(subscriber.run())
+    yield
+    for task in (warm_up_task, catalog_task):
+        if task is not None and not task.done():
+            task.cancel()
+
 # Create FastAPI app
 app = FastAPI(
     title="Vehicle Agent API",
     description="AG-UI compatible API for the Vehicle Agent",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS configuration for frontend
@@ -450,12 +1179,49 @@ app.add_middleware(
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy", "agent": APP_NAME}
+    return {
+        "status": "healthy",
+        "agent": APP_NAME,
+        "upstream": upstream.snapshot(),
+        "semantic_cache": adk_agent.cache_stats(),
+        "catalog": {"epoch": get_catalog().epoch, "version": get_catalog().version, "vehicles": len(get_catalog())},
+    }
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness endpoint: 503 until the agent runner has been built."""
+    if not adk_agent.ready:
+        return JSONResponse(status_code=503, content={"status": "starting", "agent": APP_NAME})
+    return {"status": "ready", "agent": APP_NAME}
+
+SESSIONS.set_function(adk_agent.session_count)
+CACHE_HIT_RATIO.set_function(
+    lambda: (adk_agent.cache_stats() or {}).get("hit_rate", 0.0),
+    "semantic",
+)
+CACHE_HIT_RATIO.set_function(
+    lambda: CACHED_PROMPT_TOKENS_TOTAL.total() / PROMPT_TOKENS_TOTAL.total() if PROMPT_TOKENS_TOTAL.total() else 0.0,
+    "llm_prompt_prefix",
+)
+CACHE_HIT_RATIO.set_function(
+    lambda: upstream.not_modified / upstream.conditional_requests if upstream.conditional_requests else 0.0,
+    "upstream_etag",
+)
+instrument_app(app, METRICS)
+instrument_app_tracing(app, "agent_server")
+# Outermost, so metrics and traces see the uncompressed response
+app.add_middleware(CompressionMiddleware)
 
 # Add AG-UI endpoint at root path
 add_adk_fastapi_endpoint(app, adk_agent, path="/")
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
-    logger.info(f"Starting AG-UI server at http://0.0.0.0:{port}")
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    logger.info(f"Starting AG-UI server at http://0.0.0.0:{port} with {WORKERS} worker(s)")
+    import uvicorn
+    if WORKERS > 1:
+        # Workers re-import this module; they find each other's state through SHARED_STATE_DB
+        os.environ["SHARED_STATE_DB"] = SHARED_STATE_DB
+        uvicorn.run("servers.agent_server:app", host="0.0.0.0", port=port, workers=WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
@@ -0,0 +1,167 @@
+"""
+Test-drive availability: one bit per vehicle per day.
+
+The calendar covers `days` days from `start`. Each vehicle has a row of
+64-bit words in one numpy array (a 180-day calendar is three words, 24
+bytes, per vehicle); a set bit means the day is taken. Checking or taking a
+slot touches one word, and listing open days over a range unpacks only the
+words it spans, so neither scans bookings.
+
+Every vehicle row also has a version that changes with each reservation or
+release, and each day records the row version at which it last changed. A
+caller that read the calendar can reserve with the version it saw
+(`expected_version`) and is refused if that day changed in between
+(optimistic concurrency): no lock is held between reading and reserving,
+and changes to the vehicle's other days do not get in the way.
+
+With a `today` clock the window moves with the date: when the day changes,
+past days are shifted out and the calendar starts today again. Reservations
+take a date rather than a day index, resolved under the same lock as the
+shift, so a booking made around midnight cannot land on the wrong day.
+"""
+import datetime
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+WORD_BITS = 64
+
+
+class AvailabilityCalendar:
+    def __init__(
+        self,
+        start: datetime.date,
+        days: int = 180,
+        capacity: int = 1024,
+        today: Optional[Callable[[], datetime.date]] = None,
+    ):
+        self.start = start
+        self.days = days
+        self.words = (days + WORD_BITS - 1) // WORD_BITS
+        self._rows: Dict[str, int] = {}
+        self._bits = np.zeros((capacity, self.words), dtype=np.uint64)
+        self._versions = np.zeros(capacity, dtype=np.int64)
+        # Row version at which each day last changed (0: never)
+        self._changed = np.zeros((capacity, days), dtype=np.int64)
+        self._lock = threading.Lock()
+        self._today = today
+
+    def roll(self):
+        """Moves the window to start today (with a `today` clock), dropping the days before."""
+        if self._today is None or self._today() <= self.start:
+            return
+        with self._lock:
+            self._roll()
+
+    def _roll(self):
+        # Called with the lock held
+        if self._today is None:
+            return
+        today = self._today()
+        shift = (today - self.start).days
+        if shift <= 0:
+            return
+        taken = np.unpackbits(self._bits.astype("<u8").view(np.uint8), axis=1, bitorder="little")
+        kept = np.zeros_like(taken)
+        changed = np.zeros_like(self._changed)
+        if shift < self.days:
+            kept[:, :self.days - shift] = taken[:, shift:self.days]
+            changed[:, :self.days - shift] = self._changed[:, shift:]
+        self._bits = np.packbits(kept, axis=1, bitorder="little").view("<u8").astype(np.uint64)
+        self._changed = changed
+        self.start = today
+
+    @property
+    def end(self) -> datetime.date:
+        """The last day of the calendar."""
+        return self.start + datetime.timedelta(days=self.days - 1)
+
+    def day(self, date: str) -> Optional[int]:
+        """Day index of an ISO date, or None when it is not a date in the calendar."""
+        self.roll()
+        return self._offset(date)
+
+    def _offset(self, date: str) -> Optional[int]:
+        try:
+            offset = (datetime.date.fromisoformat(date) - self.start).days
+        except (TypeError, ValueError):
+            return None
+        return offset if 0 <= offset < self.days else None
+
+    def _row(self, vehicle_id: str, create: bool = False) -> Optional[int]:
+        row = self._rows.get(vehicle_id)
+        if row is None and create:
+            with self._lock:
+                row = self._rows.get(vehicle_id)
+                if row is None:
+                    row = len(self._rows)
+                    if row == len(self._bits):
+                        self._bits = np.concatenate([self._bits, np.zeros_like(self._bits)])
+                        self._versions = np.concatenate([self._versions, np.zeros_like(self._versions)])
+                        self._changed = np.concatenate([self._changed, np.zeros_like(self._changed)])
+                    self._rows[vehicle_id] = row
+        return row
+
+    def version(self, vehicle_id: str) -> int:
+        row = self._row(vehicle_id)
+        return int(self._versions[row]) if row is not None else 0
+
+    def is_free(self, vehicle_id: str, day: int) -> bool:
+        row = self._row(vehicle_id)
+        if row is None:
+            return True
+        word, bit = divmod(day, WORD_BITS)
+        return not int(self._bits[row, word]) >> bit & 1
+
+    def _flip(
+        self, vehicle_id: str, date: str, take: bool, expected_version: Optional[int]
+    ) -> Optional[Tuple[bool, int]]:
+        row = self._row(vehicle_id, create=True)
+        with self._lock:
+            self._roll()
+            day = self._offset(date)
+            if day is None:
+                return None
+            version = int(self._versions[row])
+            if expected_version is not None and self._changed[row, day] > expected_version:
+                return False, version
+            word, bit = divmod(day, WORD_BITS)
+            mask = np.uint64(1 << bit)
+            taken = bool(self._bits[row, word] & mask)
+            if taken == take:
+                return False, version
+            self._bits[row, word] ^= mask
+            self._versions[row] = self._changed[row, day] = version + 1
+            return True, version + 1
+
+    def reserve(self, vehicle_id: str, date: str, expected_version: Optional[int] = None) -> Optional[Tuple[bool, int]]:
+        """
+        Takes the ISO date if it is free (and has not changed since the row
+        was at `expected_version`); returns (done, version), or None when
+        the date is not in the calendar.
+        """
+        return self._flip(vehicle_id, date, True, expected_version)
+
+    def release(self, vehicle_id: str, date: str) -> Optional[Tuple[bool, int]]:
+        return self._flip(vehicle_id, date, False, None)
+
+    def open_days(self, vehicle_id: str, first: int, last: int) -> List[int]:
+        """Free day indexes in [first, last], in order."""
+        row = self._row(vehicle_id)
+        if row is None:
+            return list(range(first, last + 1))
+        lo, hi = first // WORD_BITS, last // WORD_BITS + 1
+        words = self._bits[row, lo:hi].astype("<u8")
+        taken = np.unpackbits(words.view(np.uint8), bitorder="little")
+        offset = lo * WORD_BITS
+        free = np.flatnonzero(taken[first - offset:last - offset + 1] == 0) + first
+        return free.tolist()
+
+    def today(self) -> int:
+        """Day index of today (0 once the window has rolled), or of the first day without a clock."""
+        self.roll()
+        return 0 if self._today is None else max((self._today() - self.start).days, 0)
+
+    def date(self, day: int) -> str:
+        return (self.start + datetime.timedelta(days=day)).isoformat()
@@ -0,0 +1,263 @@
+"""
+Booking ledger for the mock API: an in-memory index over an append-only
+journal.
+
+The index answers the two questions a booking needs, without scanning:
+is the vehicle free on that date (slots by (vehicle_id, date)), and has
+this idempotency key been seen (the original booking is returned again
+instead of a duplicate being made).
+
+The journal is a JSON-lines file that is only ever appended to. Writers do
+not fsync individually: they queue their records and wait, and one flusher
+thread writes everything queued, fsyncs once and wakes the whole group
+(group commit). While one fsync is in flight the next group builds up, so
+the number of fsyncs per second stays roughly constant as concurrency grows.
+On startup the journal is replayed to rebuild the index.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from servers.availability import AvailabilityCalendar
+
+logger = logging.getLogger(__name__)
+
+Booking = Dict[str, Any]
+
+BOOKED = "booked"
+REPLAYED = "replayed"
+CONFLICT = "conflict"
+KEY_REUSED = "key_reused"
+STALE = "stale"
+
+
+class JournalError(RuntimeError):
+    """The journal could not make a group of records durable."""
+
+
+class BookingJournal:
+    """
+    Append-only JSON-lines journal with group commit.
+
+    `append` returns once its records are on disk (written and fsynced).
+    Without a path, records are only counted; nothing survives a restart.
+    `commit_delay` (seconds) holds each flush back a little so more writers
+    join the group, trading latency for fewer fsyncs.
+    """
+
+    def __init__(self, path: Optional[str] = None, commit_delay: float = 0.0):
+        self.path = path
+        self.commit_delay = commit_delay
+        self.records = 0
+        self.flushes = 0
+        self._cond = threading.Condition()
+        self._queue: List[bytes] = []
+        self._enqueued = 0
+        self._durable = 0
+        self._failed: Dict[int, Exception] = {}
+        self._closed = False
+        self._file = None
+        self._thread: Optional[threading.Thread] = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(path, "ab")
+
+    def replay(self) -> List[Booking]:
+        """Every record in the journal, oldest first. A torn last line (crash mid-write) is skipped."""
+        if not self.path or not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, "rb") as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    logger.warning(f"Skipping unreadable booking journal line {number} in {self.path}")
+        return records
+
+    def append(self, records: List[Booking]):
+        """Blocks until `records` are durable; raises JournalError if the write failed."""
+        if not records:
+            return
+        lines = b"".join(json.dumps(r, separators=(",", ":")).encode("utf-8") + b"\n" for r in records)
+        if self._file is None:
+            with self._cond:
+                self.records += len(records)
+                self.flushes += 1
+            return
+        with self._cond:
+            if self._closed:
+                raise JournalError("journal is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._flush_loop, name="booking-journal", daemon=True)
+                self._thread.start()
+            self._queue.append(lines)
+            self._enqueued += 1
+            ticket = self._enqueued
+            self.records += len(records)
+            self._cond.notify_all()
+            while self._durable < ticket:
+                self._cond.wait()
+            error = self._failed.pop(ticket, None)
+        if error is not None:
+            raise JournalError(f"booking journal write failed: {error}") from error
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+            if self.commit_delay:
+                time.sleep(self.commit_delay)
+            with self._cond:
+                batch, self._queue = self._queue, []
+                first, last = self._durable + 1, self._enqueued
+            error = None
+            try:
+                self._file.write(b"".join(batch))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            except OSError as e:
+                logger.error(f"Booking journal flush failed: {e}")
+                error = e
+            with self._cond:
+                if error is not None:
+                    for ticket in range(first, last + 1):
+                        self._failed[ticket] = error
+                self._durable = last
+                self.flushes += 1
+                self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class BookingOutcome(NamedTuple):
+    status: str
+    booking: Optional[Booking]
+
+
+class BookingLedger:
+    """
+    Bookings by id, with slot and idempotency-key indexes kept in memory.
+
+    `book_many` decides every request under one lock (so two submits cannot
+    take the same slot), then writes the new bookings to the journal in one
+    append outside it. If the journal write fails, the slots and keys are
+    released again and the error propagates.
+
+    With an `availability` calendar, booked dates inside it are marked taken
+    there as well, so open slots can be listed without scanning bookings. A
+    request carrying the `availability_version` it read is only booked while
+    its day has not changed since that version.
+    """
+
+    def __init__(self, journal: Optional[BookingJournal] = None, availability: Optional[AvailabilityCalendar] = None):
+        self.journal = journal or BookingJournal()
+        self.availability = availability
+        self._lock = threading.Lock()
+        self._bookings: Dict[str, Booking] = {}
+        self._slots: Dict[Tuple[str, str], str] = {}
+        self._keys: Dict[str, str] = {}
+        self._seq = 0
+        for booking in self.journal.replay():
+            self._index(booking)
+        if self._bookings:
+            logger.info(f"Replayed {len(self._bookings)} booking(s) from {self.journal.path}")
+
+    def _index(self, booking: Booking, expected_version: Optional[int] = None) -> bool:
+        """Indexes the booking; False (and nothing indexed) if its calendar day changed since `expected_version`."""
+        if self.availability is not None:
+            reserved = self.availability.reserve(booking["vehicle_id"], booking["date"], expected_version)
+            if reserved is not None and not reserved[0] and expected_version is not None:
+                return False
+        self._bookings[booking["booking_id"]] = booking
+        self._slots[(booking["vehicle_id"], booking["date"])] = booking["booking_id"]
+        if booking.get("idempotency_key"):
+            self._keys[booking["idempotency_key"]] = booking["booking_id"]
+        self._seq = max(self._seq, int(booking["booking_id"].rsplit("-", 1)[-1]))
+        return True
+
+    def _unindex(self, booking: Booking):
+        self._bookings.pop(booking["booking_id"], None)
+        self._slots.pop((booking["vehicle_id"], booking["date"]), None)
+        if booking.get("idempotency_key"):
+            self._keys.pop(booking["idempotency_key"], None)
+        if self.availability is not None:
+            self.availability.release(booking["vehicle_id"], booking["date"])
+
+    def __len__(self) -> int:
+        return len(self._bookings)
+
+    def get(self, booking_id: str) -> Optional[Booking]:
+        booking = self._bookings.get(booking_id)
+        return dict(booking) if booking is not None else None
+
+    def slot(self, vehicle_id: str, date: str) -> Optional[str]:
+        """The id of the booking holding the vehicle on that date, if any."""
+        return self._slots.get((vehicle_id, date))
+
+    def book_many(self, requests: List[Dict[str, Any]]) -> List[BookingOutcome]:
+        """
+        One outcome per request (with vehicle_id, customer_name, date and an
+        optional idempotency_key), in order:
+
+        - BOOKED: a new booking.
+        - REPLAYED: the key was used before for the same vehicle, customer
+          and date; the original booking.
+        - KEY_REUSED: the key was used before for a different booking; that booking.
+        - CONFLICT: the vehicle is already booked on that date; the holding booking.
+        - STALE: the requested day changed after the request's
+          `availability_version`; the request details with the current version.
+        """
+        outcomes: List[BookingOutcome] = []
+        fresh: List[Booking] = []
+        with self._lock:
+            for request in requests:
+                key = request.get("idempotency_key") or None
+                if key is not None and key in self._keys:
+                    booking = self._bookings[self._keys[key]]
+                    same = all(booking[f] == request[f] for f in ("vehicle_id", "customer_name", "date"))
+                    outcomes.append(BookingOutcome(REPLAYED if same else KEY_REUSED, dict(booking)))
+                    continue
+                holder = self._slots.get((request["vehicle_id"], request["date"]))
+                if holder is not None:
+                    outcomes.append(BookingOutcome(CONFLICT, dict(self._bookings[holder])))
+                    continue
+                booking = {
+                    "booking_id": f"BK-{self._seq + 1:05d}",
+                    "vehicle_id": request["vehicle_id"],
+                    "customer_name": request["customer_name"],
+                    "date": request["date"],
+                    "idempotency_key": key,
+                    "created_at": time.time(),
+                }
+                if not self._index(booking, request.get("availability_version")):
+                    stale = {f: request[f] for f in ("vehicle_id", "customer_name", "date")}
+                    stale["availability_version"] = self.availability.version(request["vehicle_id"])
+                    outcomes.append(BookingOutcome(STALE, stale))
+                    continue
+                fresh.append(booking)
+                outcomes.append(BookingOutcome(BOOKED, dict(booking)))
+        try:
+            self.journal.append(fresh)
+        except JournalError:
+            with self._lock:
+                for booking in fresh:
+                    self._unindex(booking)
+            raise
+        return outcomes
@@ -0,0 +1,588 @@
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+
+from servers.catalog_format import ColumnarCatalog
+from servers.search_index import SearchIndex, histogram
+from servers.similarity import SimilarityIndex
+
+logger = logging.getLogger(__name__)
+
+Vehicle = Dict[str, Any]
+# (record before, record after) for every vehicle a change touched; None for "absent"
+Change = Tuple[Optional[Vehicle], Optional[Vehicle]]
+
+# Facets computed when the caller does not name any
+DEFAULT_FACETS = ("make", "type", "color", "year")
+
+
+# Feature strings are stored once per process; records keep small integer ids
+_feature_ids: Dict[str, int] = {}
+_feature_names: List[str] = []
+_feature_lock = threading.Lock()
+
+
+def feature_id(name: str) -> int:
+    fid = _feature_ids.get(name)
+    if fid is None:
+        with _feature_lock:
+            fid = _feature_ids.get(name)
+            if fid is None:
+                fid = len(_feature_names)
+                _feature_names.append(sys.intern(name))
+                _feature_ids[name] = fid
+    return fid
+
+
+def feature_name(fid: int) -> str:
+    return _feature_names[fid]
+
+
+class CompactVehicle:
+    """
+    Slotted, read-only-by-convention vehicle record.
+
+    Make, model, type and color are interned so all records share one string
+    object per distinct value; features are a tuple of ids into the process
+    feature table. Fields outside the catalog schema are kept in `extra`.
+    """
+
+    __slots__ = ("id", "make", "model", "year", "price", "color", "type", "feature_ids", "extra")
+
+    FIELDS = ("id", "make", "model", "year", "price", "color", "type")
+
+    def __init__(self, id, make, model, year, price, color, type, feature_ids=(), extra=None):
+        self.id = id
+        self.make = sys.intern(make)
+        self.model = sys.intern(model)
+        self.year = year
+        self.price = price
+        self.color = sys.intern(color)
+        self.type = sys.intern(type)
+        self.feature_ids = tuple(feature_ids)
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, vehicle: Vehicle) -> "CompactVehicle":
+        extra = {k: v for k, v in vehicle.items() if k not in cls.FIELDS and k != "features"}
+        return cls(
+            str(vehicle["id"]),
+            vehicle.get("make", ""),
+            vehicle.get("model", ""),
+            vehicle.get("year"),
+            vehicle.get("price"),
+            vehicle.get("color", ""),
+            vehicle.get("type", ""),
+            (feature_id(f) for f in vehicle.get("features", ())),
+            extra or None,
+        )
+
+    @property
+    def features(self) -> List[str]:
+        return [_feature_names[fid] for fid in self.feature_ids]
+
+    def to_dict(self) -> Vehicle:
+        """A fresh dict in the catalog JSON shape; callers may modify it freely."""
+        vehicle = {
+            "id": self.id,
+            "make": self.make,
+            "model": self.model,
+            "year": self.year,
+            "price": self.price,
+            "color": self.color,
+            "type": self.type,
+            "features": self.features,
+        }
+        if self.extra:
+            vehicle.update(self.extra)
+        return vehicle
+
+
+class Catalog:
+    """
+    Vehicle catalog with a monotonically increasing version and an append-only
+    change log.
+
+    Every upsert or delete bumps `version` and appends a change record, so a
+    replica can catch up with `changes_since(version)` instead of reloading.
+    `epoch` names one lifetime of the log; a replica holding a version from
+    another epoch (e.g. after the source restarted) gets a full snapshot.
+    The exception is `base_epoch`, which names version 0 of a mapped base:
+    a replica mapping the same compiled file starts there and catches up
+    from the log.
+
+    Vehicles are held as CompactVehicle records. `get` and `all` hand out
+    fresh dicts, so callers cannot corrupt the catalog by editing results;
+    `records` iterates the records themselves for scans.
+
+    With a `base` (a memory-mapped ColumnarCatalog), the base rows are read
+    from the mapping on demand and only edits are held as records: upserts
+    shadow the base row with the same id, deletes hide it.
+    """
+
+    def __init__(
+        self,
+        vehicles: List[Vehicle] = (),
+        epoch: Optional[str] = None,
+        max_log: int = 10000,
+        base: Optional[ColumnarCatalog] = None,
+    ):
+        self._lock = threading.RLock()
+        self._base = base
+        self._hidden: Set[str] = set()  # base ids shadowed by an edit or deleted
+        self._vehicles: Dict[str, CompactVehicle] = {}
+        # Full-text index, built on first search; ids edited since then are scored separately
+        self._index: Optional[SearchIndex] = None
+        self._index_ids: List[str] = []
+        self._index_dirty: Set[str] = set()
+        self._generation = 0  # bumped by every edit
+        # Vector index for "similar vehicles", rebuilt on first use after any edit
+        self._similarity: Optional[SimilarityIndex] = None
+        self._similarity_records: List[CompactVehicle] = []
+        self._similarity_build = threading.Lock()  # one build at a time, outside _lock
+        for v in vehicles:
+            self._put(CompactVehicle.from_dict(v))
+        self._log: List[Dict[str, Any]] = []
+        self.max_log = max_log
+        self.epoch = epoch or uuid.uuid4().hex[:12]
+        self.version = 0
+
+    @classmethod
+    def from_file(cls, path: Union[str, Path], **kwargs) -> "Catalog":
+        with open(path, "r") as f:
+            return cls(json.load(f), **kwargs)
+
+    @property
+    def base_epoch(self) -> Optional[str]:
+        """The epoch of version 0 when it is just the mapped base, or None."""
+        if self._base is None or self._base.digest is None:
+            return None
+        return f"base.{self._base.digest[:16]}"
+
+    @property
+    def etag_version(self) -> str:
+        """Identifies the catalog contents for ETags across restarts and edits."""
+        return f"{self.epoch}.{self.version}"
+
+    def _base_row(self, vehicle_id: str) -> Optional[int]:
+        if self._base is None or vehicle_id in self._hidden:
+            return None
+        return self._base.find(vehicle_id)
+
+    def _put(self, record: CompactVehicle):
+        if self._index is not None:
+            self._index_dirty.add(record.id)
+        self._similarity = None
+        self._generation += 1
+        if self._base is not None and record.id not in self._hidden and self._base.find(record.id) is not None:
+            self._hidden.add(record.id)
+        self._vehicles[record.id] = record
+
+    def _remove(self, vehicle_id: str) -> bool:
+        if self._index is not None:
+            self._index_dirty.add(vehicle_id)
+        self._similarity = None
+        self._generation += 1
+        removed = self._vehicles.pop(vehicle_id, None) is not None
+        if self._base_row(vehicle_id) is not None:
+            self._hidden.add(vehicle_id)
+            removed = True
+        return removed
+
+    def _visible_base_rows(self) -> Iterator[int]:
+        if self._base is None:
+            return iter(())
+        if not self._hidden:
+            return iter(range(len(self._base)))
+        hidden = set(self._hidden)
+        return (row for row in range(len(self._base)) if self._base.id_at(row) not in hidden)
+
+    def records(self) -> Iterator[CompactVehicle]:
+        with self._lock:
+            records = list(self._vehicles.values())
+            base_rows = self._visible_base_rows()
+        base = self._base
+        yield from (CompactVehicle.from_dict(base.row(row)) for row in base_rows)
+        yield from records
+
+    def all(self) -> List[Vehicle]:
+        return [record.to_dict() for record in self.records()]
+
+    def get(self, vehicle_id: str) -> Optional[Vehicle]:
+        record = self._vehicles.get(vehicle_id)
+        if record is not None:
+            return record.to_dict()
+        row = self._base_row(vehicle_id)
+        return self._base.row(row) if row is not None else None
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            base_ids = [] if self._base is None else [i for i in self._base.ids() if i not in self._hidden]
+            return base_ids + list(self._vehicles)
+
+    def filter(
+        self,
+        make: Optional[str] = None,
+        model: Optional[str] = None,
+        type: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Vehicle]:
+        """
+        Vehicles whose make, model and type equal the given values
+        (case-insensitive). With a `limit`, only the first `limit` are decoded.
+        """
+        filters = {column: value.lower() for column, value in (("make", make), ("model", model), ("type", type)) if value}
+        results: List[Vehicle] = []
+        with self._lock:
+            records = list(self._vehicles.values())
+            hidden = set(self._hidden)
+        if self._base is not None:
+            mask = np.ones(len(self._base), dtype=bool)
+            for column, value in filters.items():
+                mask &= self._base.match(column, value)
+            for row in np.flatnonzero(mask):
+                if limit is not None and len(results) >= limit:
+                    return results
+                if hidden and self._base.id_at(int(row)) in hidden:
+                    continue
+                results.append(self._base.row(int(row)))
+        for record in records:
+            if limit is not None and len(results) >= limit:
+                break
+            if all(getattr(record, column).lower() == value for column, value in filters.items()):
+                results.append(record.to_dict())
+        return results
+
+    def values(self, column: str) -> List[str]:
+        """
+        Distinct values of a dictionary column (make, model, color, type),
+        from the mapped dictionaries and the edits. A value may no longer be
+        held by any visible vehicle once its base rows are edited or deleted.
+        """
+        with self._lock:
+            edited = [getattr(record, column) for record in self._vehicles.values()]
+        base = [] if self._base is None else self._base.dictionaries[column]
+        return list(dict.fromkeys(base + edited))
+
+    def search_index(self) -> SearchIndex:
+        """
+        The full-text index, built on first use. Without a mapped base it is
+        rebuilt once edits since the last build exceed 5% of the catalog.
+        """
+        with self._lock:
+            stale = self._base is None and len(self._index_dirty) > max(100, len(self) // 20)
+            if self._index is None or stale:
+                if self._base is not None:
+                    # Index the immutable mapped rows; edits on top of them stay "dirty"
+                    self._index = SearchIndex.from_columnar(self._base)
+                    self._index_ids = []
+                    self._index_dirty = set(self._hidden) | set(self._vehicles)
+                else:
+                    records = list(self._vehicles.values())
+                    self._index = SearchIndex.from_records(records, _feature_names)
+                    self._index_ids = [r.id for r in records]
+                    self._index_dirty = set()
+            return self._index
+
+    def search(
+        self,
+        query: str,
+        limit: int = 50,
+        make: Optional[str] = None,
+        model: Optional[str] = None,
+        type: Optional[str] = None,
+    ) -> Optional[List[Vehicle]]:
+        """
+        Best `limit` vehicles for a free-text query, ranked by BM25, with
+        optional exact make/model/type filters. Returns None when the query
+        has no searchable words (the caller should not filter by text).
+        """
+        index = self.search_index()
+        expansion = index.expand(query)
+        if expansion is None:
+            return None
+        filters = {"make": make, "model": model, "type": type}
+        edited, dirty_docs = self._dirty()
+
+        docs, scores = index.top(expansion, limit, index.filter_mask(**filters), dirty_docs)
+        hits: List[Tuple[float, Vehicle]] = [
+            (float(score), self._base.row(int(doc)) if self._base is not None else self.get(self._index_ids[doc]))
+            for doc, score in zip(docs, scores)
+        ]
+        for record, score in self._score_edited(index, edited, filters, expansion):
+            hits.append((score, record.to_dict()))
+        hits.sort(key=lambda hit: -hit[0])
+        return [vehicle for _, vehicle in hits[:limit]]
+
+    def _dirty(self) -> Tuple[List[CompactVehicle], List[int]]:
+        """Records edited since the index build, and the index docs they make stale."""
+        with self._lock:
+            dirty = set(self._index_dirty)
+            edited = [self._vehicles[i] for i in dirty if i in self._vehicles]
+            if self._base is not None:
+                dirty_docs = [row for row in (self._base.find(i) for i in dirty) if row is not None]
+            else:
+                dirty_docs = [doc for doc, i in enumerate(self._index_ids) if i in dirty] if dirty else []
+        return edited, dirty_docs
+
+    @staticmethod
+    def _score_edited(index: SearchIndex, edited: List[CompactVehicle], filters: Dict[str, Optional[str]], expansion) -> Iterator[Tuple[CompactVehicle, float]]:
+        """Edited records passing the filters, with their query score (1.0 without a query)."""
+        wanted = {field: value.lower() for field, value in filters.items() if value}
+        for record in edited:
+            if all(getattr(record, field).lower() == value for field, value in wanted.items()):
+                if expansion is None:
+                    yield record, 1.0
+                    continue
+                fields = {f: [getattr(record, f)] for f in ("make", "model", "type", "color")}
+                fields["features"] = record.features
+                score = index.score_fields(fields, expansion)
+                if score > 0:
+                    yield record, score
+
+    def facets(
+        self,
+        query: Optional[str] = None,
+        make: Optional[str] = None,
+        model: Optional[str] = None,
+        type: Optional[str] = None,
+        fields: Sequence[str] = DEFAULT_FACETS,
+        price_buckets: int = 8,
+    ) -> Dict[str, Any]:
+        """
+        Value counts per field and a price histogram over every vehicle a
+        search with these arguments matches (not just the top `limit`), for
+        refinement UIs. Counts come from bincounts over the index columns;
+        only records edited since the index build are counted one by one.
+        """
+        index = self.search_index()
+        filters = {"make": make, "model": model, "type": type}
+        expansion = index.expand(query) if query else None
+        mask = index.filter_mask(**filters)
+        if mask is None:
+            mask = np.ones(index.count, dtype=bool)
+        if expansion is not None:
+            mask &= index.match_mask(expansion)
+        edited, dirty_docs = self._dirty()
+        mask[dirty_docs] = False
+
+        counts = {field: index.facet_counts(field, mask) for field in fields}
+        prices = [index.numbers("price", mask)]
+        total = int(np.count_nonzero(mask))
+        for record, _ in self._score_edited(index, edited, filters, expansion):
+            total += 1
+            for field in fields:
+                values = record.features if field == "features" else [getattr(record, field)]
+                counts[field].update(v for v in values if v is not None)
+            if record.price is not None:
+                prices.append(np.array([record.price], dtype=np.float64))
+
+        return {
+            "total": total,
+            "facets": {
+                field: [{"value": value, "count": n} for value, n in sorted(counter.items(), key=lambda item: (-item[1], str(item[0])))]
+                for field, counter in counts.items()
+            },
+            "price": histogram(np.concatenate(prices), price_buckets),
+        }
+
+    def similarity_index(self) -> SimilarityIndex:
+        """
+        The vector index behind `similar`, built on first use. Row numbers
+        are the mapped base rows followed by `_similarity_records`.
+        """
+        return self._similarity_state()[0]
+
+    def _similarity_state(self) -> Tuple[SimilarityIndex, List[CompactVehicle]]:
+        """
+        The index and the edited records it was built from. The build runs
+        outside `_lock` on a snapshot, so searches and edits go on meanwhile;
+        it is only kept if no edit came in during the build.
+        """
+        with self._similarity_build:
+            with self._lock:
+                if self._similarity is not None:
+                    return self._similarity, self._similarity_records
+                generation = self._generation
+                records = list(self._vehicles.values())
+                hidden_rows = [] if self._base is None else [
+                    row for row in (self._base.find(i) for i in self._hidden) if row is not None
+                ]
+            index = SimilarityIndex.build(self._base, records, _feature_names, hidden_rows)
+            with self._lock:
+                if generation == self._generation:
+                    self._similarity, self._similarity_records = index, records
+            return index, records
+
+    def similar(self, vehicle_ids: List[str], k: int = 5) -> Optional[List[Tuple[float, Vehicle]]]:
+        """
+        The `k` vehicles most similar to the given ones (to their centroid if
+        several), as (cosine similarity, vehicle) pairs, most similar first.
+        The given vehicles are never returned. None when none of them exist.
+        """
+        index, records = self._similarity_state()
+        with self._lock:
+            base_count = 0 if self._base is None else len(self._base)
+            positions = {record.id: base_count + i for i, record in enumerate(records)}
+            seeds = []
+            for vehicle_id in vehicle_ids:
+                row = positions.get(vehicle_id)
+                if row is None:
+                    row = self._base_row(vehicle_id)
+                if row is not None:
+                    seeds.append(row)
+        if not seeds:
+            return None
+        rows, scores = index.top_k(index.query_vector(seeds), k, seeds)
+        return [
+            (float(score), self._base.row(int(row)) if row < base_count else records[row - base_count].to_dict())
+            for row, score in zip(rows, scores)
+        ]
+
+    def __len__(self) -> int:
+        base_count = 0 if self._base is None else len(self._base) - len(self._hidden)
+        return base_count + len(self._vehicles)
+
+    def _append(self, op: str, vehicle_id: str, vehicle: Optional[Vehicle]) -> int:
+        self.version += 1
+        self._log.append({"version": self.version, "op": op, "id": vehicle_id, "vehicle": vehicle})
+        if len(self._log) > self.max_log:
+            # Replicas further behind than the retained log resync from a snapshot
+            del self._log[: len(self._log) - self.max_log]
+        return self.version
+
+    def upsert(self, vehicle: Vehicle) -> int:
+        """Inserts or replaces a vehicle; returns the new version."""
+        record = CompactVehicle.from_dict(vehicle)
+        with self._lock:
+            self._put(record)
+            return self._append("upsert", record.id, record.to_dict())
+
+    def delete(self, vehicle_id: str) -> Optional[int]:
+        """Removes a vehicle; returns the new version, or None if it did not exist."""
+        with self._lock:
+            if not self._remove(vehicle_id):
+                return None
+            return self._append("delete", vehicle_id, None)
+
+    def changes_since(self, since: int, epoch: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Change feed for a replica at `since`. Contains either the log entries
+        after `since` or, when those are no longer retained (or the epoch
+        differs), a `snapshot` of the whole catalog.
+        """
+        with self._lock:
+            first_logged = self._log[0]["version"] if self._log else self.version + 1
+            in_log = epoch == self.epoch and first_logged - 1 <= since <= self.version
+            if epoch is not None and epoch == self.base_epoch and since == 0 and first_logged == 1:
+                in_log = True  # the replica is at our version 0: the same mapped file, no edits
+            feed = {"epoch": self.epoch, "version": self.version, "changes": [], "snapshot": None}
+            if in_log:
+                feed["changes"] = [c for c in self._log if c["version"] > since]
+            else:
+                feed["snapshot"] = self.all()
+            return feed
+
+    def apply(self, feed: Dict[str, Any]) -> List[Change]:
+        """Applies a feed from `changes_since` to this replica; returns what changed."""
+        if feed.get("snapshot") is None:
+            with self._lock:
+                affected: List[Change] = []
+                for change in feed["changes"]:
+                    old = self.get(change["id"])
+                    if change["op"] == "delete":
+                        self._remove(change["id"])
+                    else:
+                        self._put(CompactVehicle.from_dict(change["vehicle"]))
+                    affected.append((old, change["vehicle"]))
+                self.epoch = feed["epoch"]
+                self.version = feed["version"]
+                return affected
+
+        # Diff against the snapshot so unchanged (e.g. mapped base) rows stay as
+        # they are. Decoding and diffing run outside `_lock`, so readers go on
+        # meanwhile; the result is swapped in only if no edit came in between.
+        incoming = {str(v["id"]): v for v in feed["snapshot"]}
+        while True:
+            with self._lock:
+                generation = self._generation
+            current = {v["id"]: v for v in self.all()}
+            affected = [(old, None) for vehicle_id, old in current.items() if vehicle_id not in incoming]
+            affected += [(current.get(vehicle_id), new) for vehicle_id, new in incoming.items() if current.get(vehicle_id) != new]
+            records = [CompactVehicle.from_dict(new) if new is not None else None for _, new in affected]
+            with self._lock:
+                if generation != self._generation:
+                    continue
+                for (old, _), record in zip(affected, records):
+                    if record is None:
+                        self._remove(old["id"])
+                    else:
+                        self._put(record)
+                self.epoch = feed["epoch"]
+                self.version = feed["version"]
+                return affected
+
+
+def open_catalog(json_path: Union[str, Path], binary_path: Optional[Union[str, Path]] = None, **kwargs) -> Catalog:
+    """
+    Opens the catalog from its compiled binary file when one is given and is
+    at least as new as the JSON source, otherwise parses the JSON.
+    """
+    if binary_path and os.path.exists(binary_path):
+        if not os.path.exists(json_path) or os.path.getmtime(binary_path) >= os.path.getmtime(json_path):
+            logger.info(f"Mapping compiled catalog {binary_path}")
+            return Catalog(base=ColumnarCatalog(str(binary_path)), **kwargs)
+        logger.warning(f"{binary_path} is older than {json_path}; loading the JSON catalog instead")
+    return Catalog.from_file(json_path, **kwargs)
+
+
+class CatalogSubscriber:
+    """
+    Keeps a replica Catalog current by polling a change feed.
+
+    `fetch(since, epoch)` returns a feed (it runs in a worker thread, so it may
+    block); `on_change` receives the affected records whenever a poll changed
+    something.
+    """
+
+    def __init__(
+        self,
+        catalog: Catalog,
+        fetch: Callable[[int, str], Dict[str, Any]],
+        on_change: Callable[[List[Change]], None],
+        interval: float = 5.0,
+    ):
+        self.catalog = catalog
+        self.fetch = fetch
+        self.on_change = on_change
+        self.interval = interval
+        self.polls = 0
+        self.errors = 0
+
+    async def poll_once(self) -> List[Change]:
+        self.polls += 1
+        feed = await asyncio.to_thread(self.fetch, self.catalog.version, self.catalog.epoch)
+        affected = self.catalog.apply(feed)
+        if affected:
+            logger.info(f"Catalog now at version {feed['version']}: {len(affected)} vehicle(s) changed")
+            self.on_change(affected)
+        return affected
+
+    async def run(self):
+        while True:
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Catalog poll failed: {e}")
+            await asyncio.sleep(self.interval)
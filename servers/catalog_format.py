@@ -0,0 +1,244 @@
+"""
+Binary columnar catalog file.
+
+Layout (little endian):
+
+    b"VCATALOG"                 magic
+    u64                         length of the metadata JSON
+    metadata JSON               {"format": 1, "count": n, "digest": hex, "arrays": {name: {offset, length, dtype}}}
+    padding to 8 bytes
+    arrays, each 8-byte aligned, offsets relative to the end of the padding
+
+Fixed-width columns (year, price) are plain arrays. make, model, color and
+type are dictionary-encoded: a codes array plus a string table. Strings
+tables are an offsets array (n + 1 entries) over a UTF-8 blob. Features are
+a ragged array of codes into their own dictionary. `id.order` is the row
+permutation that sorts ids, for lookups by binary search. `digest` is a
+SHA-256 of the arrays: processes mapping files with the same digest hold the
+same catalog.
+
+Usage: python -m servers.catalog_format data/product_search.json data/product_search.vcat
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+MAGIC = b"VCATALOG"
+FORMAT_VERSION = 1
+ALIGN = 8
+DICT_COLUMNS = ("make", "model", "color", "type")
+KNOWN_FIELDS = ("id", "year", "price", "features") + DICT_COLUMNS
+NO_YEAR = np.iinfo(np.int32).min
+
+
+def _string_table(strings: Iterable[str]):
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, b"".join(encoded)
+
+
+def _codes_dtype(size: int) -> str:
+    return "<u2" if size <= np.iinfo(np.uint16).max else "<u4"
+
+
+def _dictionary_encode(values: List[str]):
+    dictionary = sorted(set(values))
+    index = {value: i for i, value in enumerate(dictionary)}
+    codes = np.fromiter((index[v] for v in values), dtype=_codes_dtype(len(dictionary)), count=len(values))
+    return codes, dictionary
+
+
+def compile_catalog(vehicles: List[Dict[str, Any]], path: str):
+    """Writes `vehicles` (catalog JSON records) to `path` in the columnar format."""
+    count = len(vehicles)
+    arrays: Dict[str, Any] = {}
+
+    ids = [str(v["id"]) for v in vehicles]
+    arrays["id.offsets"], arrays["id.data"] = _string_table(ids)
+    arrays["id.order"] = np.argsort(np.array(ids, dtype=object), kind="stable").astype("<u8")
+
+    for column in DICT_COLUMNS:
+        codes, dictionary = _dictionary_encode([v.get(column, "") for v in vehicles])
+        arrays[f"{column}.codes"] = codes
+        arrays[f"{column}.dict.offsets"], arrays[f"{column}.dict.data"] = _string_table(dictionary)
+
+    arrays["year"] = np.array([NO_YEAR if v.get("year") is None else v["year"] for v in vehicles], dtype="<i4")
+    prices = [v.get("price") for v in vehicles]
+    if all(isinstance(p, int) for p in prices):
+        arrays["price"] = np.array(prices, dtype="<i8")
+    else:
+        arrays["price"] = np.array([np.nan if p is None else p for p in prices], dtype="<f8")
+
+    feature_lists = [v.get("features", []) for v in vehicles]
+    flat = [f for features in feature_lists for f in features]
+    codes, dictionary = _dictionary_encode(flat)
+    arrays["features.codes"] = codes
+    arrays["features.offsets"] = np.zeros(count + 1, dtype="<u8")
+    np.cumsum([len(features) for features in feature_lists], out=arrays["features.offsets"][1:])
+    arrays["features.dict.offsets"], arrays["features.dict.data"] = _string_table(dictionary)
+
+    extras = [{k: val for k, val in v.items() if k not in KNOWN_FIELDS} for v in vehicles]
+    if any(extras):
+        arrays["extra.offsets"], arrays["extra.data"] = _string_table(json.dumps(e) if e else "" for e in extras)
+
+    layout: Dict[str, Dict[str, Any]] = {}
+    digest = hashlib.sha256()
+    position = 0
+    for name, array in arrays.items():
+        data = array if isinstance(array, bytes) else array.tobytes()
+        digest.update(data)
+        layout[name] = {
+            "offset": position,
+            "length": len(data),
+            "dtype": "bytes" if isinstance(array, bytes) else array.dtype.str,
+        }
+        position += len(data) + (-len(data) % ALIGN)
+
+    meta = json.dumps(
+        {"format": FORMAT_VERSION, "count": count, "digest": digest.hexdigest(), "arrays": layout}
+    ).encode("utf-8")
+    header = MAGIC + struct.pack("<Q", len(meta)) + meta
+    header += b"\0" * (-len(header) % ALIGN)
+
+    # Write to a temp file first so readers never map a half-written catalog
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        for name, array in arrays.items():
+            data = array if isinstance(array, bytes) else array.tobytes()
+            f.write(data)
+            f.write(b"\0" * (-len(data) % ALIGN))
+    os.replace(tmp_path, path)
+
+
+class ColumnarCatalog:
+    """
+    Read-only view of a compiled catalog file.
+
+    The file is memory-mapped and columns are numpy views into the mapping,
+    so opening is O(1) in the number of vehicles and worker processes that
+    map the same file share its pages. Only the small dictionaries are
+    decoded up front.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a compiled catalog")
+        (meta_len,) = struct.unpack_from("<Q", self._mm, len(MAGIC))
+        meta_start = len(MAGIC) + 8
+        meta = json.loads(self._mm[meta_start: meta_start + meta_len])
+        if meta["format"] != FORMAT_VERSION:
+            raise ValueError(f"{path} has catalog format {meta['format']}, expected {FORMAT_VERSION}")
+        data_start = meta_start + meta_len
+        data_start += -data_start % ALIGN
+
+        self.count: int = meta["count"]
+        self.digest: Optional[str] = meta.get("digest")  # None for files compiled before it was recorded
+        self._arrays: Dict[str, Any] = {}
+        for name, spec in meta["arrays"].items():
+            offset = data_start + spec["offset"]
+            if spec["dtype"] == "bytes":
+                self._arrays[name] = memoryview(self._mm)[offset: offset + spec["length"]]
+            else:
+                dtype = np.dtype(spec["dtype"])
+                self._arrays[name] = np.frombuffer(self._mm, dtype=dtype, count=spec["length"] // dtype.itemsize, offset=offset)
+
+        self.dictionaries: Dict[str, List[str]] = {
+            column: self._strings(f"{column}.dict") for column in DICT_COLUMNS + ("features",)
+        }
+        self.year = self._arrays["year"]
+        self.price = self._arrays["price"]
+        self._feature_offsets = self._arrays["features.offsets"]
+        self._feature_codes = self._arrays["features.codes"]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _strings(self, name: str) -> List[str]:
+        offsets, data = self._arrays[f"{name}.offsets"], self._arrays[f"{name}.data"]
+        blob = bytes(data)
+        return [blob[offsets[i]: offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+    def _string_at(self, name: str, i: int) -> str:
+        offsets = self._arrays[f"{name}.offsets"]
+        return bytes(self._arrays[f"{name}.data"][offsets[i]: offsets[i + 1]]).decode("utf-8")
+
+    def feature_columns(self):
+        """(offsets, codes) of the ragged features column; codes index dictionaries["features"]."""
+        return self._feature_offsets, self._feature_codes
+
+    def codes(self, column: str) -> np.ndarray:
+        return self._arrays[f"{column}.codes"]
+
+    def id_at(self, row: int) -> str:
+        return self._string_at("id", row)
+
+    def ids(self) -> List[str]:
+        return self._strings("id")
+
+    def find(self, vehicle_id: str) -> Optional[int]:
+        """Row holding `vehicle_id`, by binary search over the sorted id permutation."""
+        order = self._arrays["id.order"]
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.id_at(int(order[mid])) < vehicle_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self.id_at(int(order[lo])) == vehicle_id:
+            return int(order[lo])
+        return None
+
+    def row(self, row: int) -> Dict[str, Any]:
+        """The vehicle at `row` as a catalog JSON record."""
+        year = int(self.year[row])
+        price = self.price[row]
+        start, end = self._feature_offsets[row], self._feature_offsets[row + 1]
+        features = self.dictionaries["features"]
+        vehicle = {
+            "id": self.id_at(row),
+            "make": self.dictionaries["make"][self.codes("make")[row]],
+            "model": self.dictionaries["model"][self.codes("model")[row]],
+            "year": None if year == NO_YEAR else year,
+            "price": None if price != price else price.item(),
+            "color": self.dictionaries["color"][self.codes("color")[row]],
+            "type": self.dictionaries["type"][self.codes("type")[row]],
+            "features": [features[code] for code in self._feature_codes[start:end]],
+        }
+        if "extra.offsets" in self._arrays:
+            extra = self._string_at("extra", row)
+            if extra:
+                vehicle.update(json.loads(extra))
+        return vehicle
+
+    def match(self, column: str, value: str) -> np.ndarray:
+        """Boolean mask of rows whose dictionary column equals `value` (case-insensitive)."""
+        value = value.lower()
+        wanted = [code for code, s in enumerate(self.dictionaries[column]) if s.lower() == value]
+        return np.isin(self.codes(column), wanted)
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Compiles a JSON vehicle catalog into the binary columnar format.")
+    parser.add_argument("source", help="catalog JSON file (list of vehicles)")
+    parser.add_argument("target", help="output file, e.g. data/product_search.vcat")
+    args = parser.parse_args(argv)
+    with open(args.source, "r") as f:
+        vehicles = json.load(f)
+    compile_catalog(vehicles, args.target)
+    print(f"Compiled {len(vehicles)} vehicles into {args.target} ({os.path.getsize(args.target):,} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+Encoder = Callable[[Any], bytes]
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+ENCODERS: Dict[str, Encoder] = {"json": _stdlib_dumps}
+
+try:
+    import orjson
+
+    ENCODERS["orjson"] = orjson.dumps
+except ImportError:  # optional speed-up
+    pass
+
+
+def register_encoder(name: str, encoder: Encoder):
+    """Makes `encoder` (object -> UTF-8 JSON bytes) selectable via JSON_ENCODER."""
+    ENCODERS[name] = encoder
+
+
+def get_encoder(name: Optional[str] = None) -> Encoder:
+    """
+    Returns the named encoder. "auto" (the default) picks orjson when it is
+    installed and falls back to the standard library.
+    """
+    name = (name or os.environ.get("JSON_ENCODER", "auto")).lower()
+    if name == "auto":
+        return ENCODERS.get("orjson", _stdlib_dumps)
+    if name not in ENCODERS:
+        logger.warning(f"JSON encoder '{name}' is not available, using the standard library")
+        return _stdlib_dumps
+    return ENCODERS[name]
+
+
+_dumps = get_encoder()
+
+
+def dumps(obj: Any) -> bytes:
+    """Encodes with the configured encoder."""
+    return _dumps(obj)
+
+
+def set_encoder(name: str):
+    global _dumps
+    _dumps = get_encoder(name)
@@ -1,37 +1,102 @@
+import datetime
 import json
 import os
+from pathlib import Path
 from dotenv import load_dotenv
-from fastapi import FastAPI
-from pydantic import BaseModel
-from typing import Optional
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional, Union
+
+from servers.availability import AvailabilityCalendar
+from servers.bookings import BOOKED, CONFLICT, KEY_REUSED, REPLAYED, STALE, BookingJournal, BookingLedger
+from servers.catalog import DEFAULT_FACETS, open_catalog
+from servers.search_index import FACET_FIELDS
+from servers.http_caching import CompressionMiddleware, etag_matches, make_etag
+from servers.metrics import Registry, instrument_app
+from servers.negotiation import NegotiationEngine
+from servers.shared_state import make_shared_store
+from servers.tracing import configure_tracing, instrument_app_tracing
 
 # Load environment variables
 load_dotenv()
 
 app = FastAPI()
 
+METRICS = Registry()
+instrument_app(app, METRICS)
+
+configure_tracing("mock_api_server")
+instrument_app_tracing(app, "mock_api_server")
+app.add_middleware(CompressionMiddleware)
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+
 # Load data
 def load_json(filename):
-    with open(f"data/{filename}", 'r') as f:
+    with open(DATA_DIR / filename, 'r') as f:
         return json.load(f)
 
+# Source of truth for vehicles; edits go through the change log below
+# (mapped from CATALOG_BINARY when a compiled catalog is provided)
+CATALOG = open_catalog(DATA_DIR / 'product_search.json', os.environ.get("CATALOG_BINARY"))
+
+def conditional_response(request: Request, response: Response):
+    """
+    Sets a strong ETag derived from the catalog version and the query. Returns a
+    304 response when the client already holds that representation.
+    """
+    etag = make_etag(CATALOG.etag_version, request.url.path, request.query_params.multi_items())
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return None
+
+def parse_facet_fields(facets: Optional[str]):
+    """Comma-separated facet fields; "true" (or empty) means the default set."""
+    if facets is None or facets.strip().lower() in ("", "true", "1"):
+        return DEFAULT_FACETS
+    fields = tuple(f.strip().lower() for f in facets.split(",") if f.strip())
+    unknown = [f for f in fields if f not in FACET_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown facet field(s): {', '.join(unknown)}. Allowed: {', '.join(FACET_FIELDS)}")
+    return fields
+
 @app.get("/search")
-async def search_vehicles(make: Optional[str] = None, model: Optional[str] = None, type: Optional[str] = None):
-    data = load_json('product_search.json')
-    results = data
-    if make:
-        results = [v for v in results if v['make'].lower() == make.lower()]
-    if model:
-        results = [v for v in results if v['model'].lower() == model.lower()]
-    if type:
-        results = [v for v in results if v.get('type', '').lower() == type.lower()]
-    return results
+async def search_vehicles(request: Request, response: Response, make: Optional[str] = None, model: Optional[str] = None, type: Optional[str] = None, q: Optional[str] = None, limit: int = Query(50, ge=1), facets: Optional[str] = None):
+    not_modified = conditional_response(request, response)
+    if not_modified is not None:
+        return not_modified
+    if q:
+        # Free-text query: the best `limit` matches, most relevant first
+        results = CATALOG.search(q, limit=limit, make=make, model=model, type=type)
+        if results is None:
+            results = CATALOG.filter(make=make, model=model, type=type, limit=limit)
+    else:
+        results = CATALOG.filter(make=make, model=model, type=type)
+    if facets is None:
+        return results
+    # Refinement counts over the whole match set, next to the (limited) rows
+    return {
+        "results": results,
+        **CATALOG.facets(q, make=make, model=model, type=type, fields=parse_facet_fields(facets)),
+    }
+
+@app.get("/facets")
+async def search_facets(request: Request, response: Response, make: Optional[str] = None, model: Optional[str] = None, type: Optional[str] = None, q: Optional[str] = None, fields: Optional[str] = None, price_buckets: int = Query(8, ge=1, le=100)):
+    not_modified = conditional_response(request, response)
+    if not_modified is not None:
+        return not_modified
+    return CATALOG.facets(q, make=make, model=model, type=type, fields=parse_facet_fields(fields), price_buckets=price_buckets)
 
 @app.get("/compare")
-async def compare_vehicles(vehicle1_id: str, vehicle2_id: str):
-    data = load_json('product_search.json')
-    v1 = next((v for v in data if v['id'] == vehicle1_id), None)
-    v2 = next((v for v in data if v['id'] == vehicle2_id), None)
+async def compare_vehicles(request: Request, response: Response, vehicle1_id: str, vehicle2_id: str):
+    not_modified = conditional_response(request, response)
+    if not_modified is not None:
+        return not_modified
+    v1 = CATALOG.get(vehicle1_id)
+    v2 = CATALOG.get(vehicle2_id)
     
     comparison = {}
     if v1:
@@ -51,28 +116,176 @@ async def compare_vehicles(vehicle1_id: str, vehicle2_id: str):
         }
     }
 
+@app.get("/similar")
+async def similar_vehicles(request: Request, response: Response, vehicle_id: List[str] = Query(...), k: int = Query(5, ge=1, le=100)):
+    not_modified = conditional_response(request, response)
+    if not_modified is not None:
+        return not_modified
+    results = CATALOG.similar(vehicle_id, k)
+    if results is None:
+        raise HTTPException(status_code=404, detail="Vehicle not found")
+    return {
+        "vehicles": [v for v in (CATALOG.get(i) for i in vehicle_id) if v],
+        "results": [{**vehicle, "similarity": round(score, 4)} for score, vehicle in results],
+    }
+
+@app.get("/changes")
+async def catalog_changes(since: int = 0, epoch: Optional[str] = None):
+    """Change feed: log entries after `since`, or a snapshot if the caller is too far behind."""
+    return CATALOG.changes_since(since, epoch)
+
+class VehicleRecord(BaseModel):
+    make: str
+    model: str
+    year: int
+    price: Union[int, float]
+    color: str
+    type: str
+    features: List[str] = []
+
+@app.put("/vehicles/{vehicle_id}")
+async def upsert_vehicle(vehicle_id: str, vehicle: VehicleRecord):
+    record = {"id": vehicle_id, **vehicle.model_dump()}
+    return {"version": CATALOG.upsert(record), "vehicle": record}
+
+@app.delete("/vehicles/{vehicle_id}")
+async def delete_vehicle(vehicle_id: str):
+    version = CATALOG.delete(vehicle_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail=f"Vehicle {vehicle_id} not found")
+    return {"version": version}
+
+# Test-drive calendar: AVAILABILITY_DAYS days from today (moving with the date), kept current by the bookings
+AVAILABILITY = AvailabilityCalendar(
+    datetime.date.today(), days=int(os.environ.get("AVAILABILITY_DAYS", 180)), today=datetime.date.today
+)
+
+# Bookings are journaled (group-committed) when BOOKING_JOURNAL names a file
+BOOKINGS = BookingLedger(BookingJournal(
+    os.environ.get("BOOKING_JOURNAL") or None,
+    commit_delay=float(os.environ.get("BOOKING_COMMIT_DELAY_MS", 0)) / 1000,
+), availability=AVAILABILITY)
+BOOKING_OUTCOMES = METRICS.counter("mock_bookings_total", "Booking requests by outcome.", ["outcome"])
+BOOKING_FSYNC_RATIO = METRICS.gauge("mock_booking_records_per_flush", "Booking journal records written per fsync.")
+BOOKING_FSYNC_RATIO.set_function(lambda: BOOKINGS.journal.records / BOOKINGS.journal.flushes if BOOKINGS.journal.flushes else 0.0)
+
+@app.get("/availability")
+async def vehicle_availability(
+    vehicle_id: str,
+    from_date: Optional[str] = Query(None, alias="from"),
+    to_date: Optional[str] = Query(None, alias="to"),
+):
+    """Open test-drive days for a vehicle between `from` and `to` (ISO dates, inclusive; default: the next two weeks)."""
+    if CATALOG.get(vehicle_id) is None:
+        raise HTTPException(status_code=404, detail=f"Vehicle {vehicle_id} not found")
+    first = AVAILABILITY.day(from_date) if from_date else AVAILABILITY.today()
+    last = AVAILABILITY.day(to_date) if to_date else min(first + 13, AVAILABILITY.days - 1) if first is not None else None
+    if first is None or last is None or last < first:
+        raise HTTPException(
+            status_code=422,
+            detail=f"from/to must be dates between {AVAILABILITY.start} and {AVAILABILITY.end}, from <= to",
+        )
+    return {
+        "vehicle_id": vehicle_id,
+        "from": AVAILABILITY.date(first),
+        "to": AVAILABILITY.date(last),
+        "version": AVAILABILITY.version(vehicle_id),
+        "open": [AVAILABILITY.date(day) for day in AVAILABILITY.open_days(vehicle_id, first, last)],
+    }
+
 class BookingRequest(BaseModel):
     vehicle_id: str
     customer_name: str
     date: str
+    idempotency_key: Optional[str] = None
+    # The `version` from /availability: the booking is refused if the calendar changed since
+    availability_version: Optional[int] = None
+
+class BookingBatch(BaseModel):
+    bookings: List[BookingRequest]
+
+def booking_result(status: str, booking: Dict[str, Any]) -> Dict[str, Any]:
+    """Response body for one booking outcome (the product_book.json shape for successes)."""
+    details = {f: booking[f] for f in ("vehicle_id", "customer_name", "date")}
+    if status in (BOOKED, REPLAYED):
+        data = load_json('product_book.json')
+        data.update(booking_id=booking["booking_id"], date=booking["date"], booking_details=details)
+        if status == REPLAYED:
+            data["replayed"] = True
+        return data
+    if status == CONFLICT:
+        detail = f"Vehicle {booking['vehicle_id']} is already booked on {booking['date']}"
+    elif status == STALE:
+        detail = (f"Availability of vehicle {booking['vehicle_id']} on {booking['date']} changed "
+                  f"(now version {booking['availability_version']}); check it again")
+    else:
+        detail = f"Idempotency key was already used for booking {booking['booking_id']} with different details"
+    status_text = "Conflict" if status in (CONFLICT, STALE) else "Rejected"
+    return {"status": status_text, "detail": detail, "booking_details": details}
+
+async def book_all(requests: List[BookingRequest]):
+    # The journal append blocks until its group is fsynced: off the event loop
+    outcomes = await run_in_threadpool(BOOKINGS.book_many, [r.model_dump() for r in requests])
+    for outcome in outcomes:
+        BOOKING_OUTCOMES.labels(outcome.status).inc()
+    return outcomes
 
 @app.post("/book")
-async def book_vehicle(booking: BookingRequest):
-    data = load_json('product_book.json')
-    # Mocking a successful booking for any request
-    data['booking_details'] = booking.dict()
-    return data
+async def book_vehicle(booking: BookingRequest, response: Response, idempotency_key: Optional[str] = Header(None)):
+    """One booking. A repeated Idempotency-Key returns the original booking instead of a new one."""
+    if idempotency_key:
+        booking.idempotency_key = idempotency_key
+    status, record = (await book_all([booking]))[0]
+    body = booking_result(status, record)
+    if status in (CONFLICT, STALE):
+        raise HTTPException(status_code=409, detail=body["detail"])
+    if status == KEY_REUSED:
+        raise HTTPException(status_code=422, detail=body["detail"])
+    if status == REPLAYED:
+        response.headers["Idempotent-Replayed"] = "true"
+    return body
+
+@app.post("/book/batch")
+async def book_vehicles(batch: BookingBatch, idempotency_key: Optional[str] = Header(None)):
+    """
+    Several bookings in one request and one journal flush; one result per
+    booking, in order. With an Idempotency-Key, bookings without their own
+    key get one derived from it, so a repeated batch books nothing twice.
+    """
+    if idempotency_key:
+        for i, booking in enumerate(batch.bookings):
+            booking.idempotency_key = booking.idempotency_key or f"{idempotency_key}:{i}"
+    outcomes = await book_all(batch.bookings)
+    return {"results": [booking_result(status, record) for status, record in outcomes]}
+
+# Negotiation state per session, in SHARED_STATE_DB (or NEGOTIATION_STATE_DB) when set
+NEGOTIATIONS = NegotiationEngine(CATALOG.get, make_shared_store(os.environ.get("NEGOTIATION_STATE_DB")))
+NEGOTIATION_OUTCOMES = METRICS.counter("mock_negotiation_offers_total", "Negotiation offers by outcome.", ["outcome"])
 
 class NegotiationRequest(BaseModel):
     vehicle_id: str
-    offer_price: float
+    offer_price: float = Field(gt=0)
+    session_id: Optional[str] = None
+
+class NegotiationBatch(BaseModel):
+    offers: List[NegotiationRequest] = Field(max_length=10000)
+
+async def negotiate_all(offers: List[NegotiationRequest]) -> List[Dict[str, Any]]:
+    # A shared store may wait on another worker's write lock: off the event loop
+    results = await run_in_threadpool(NEGOTIATIONS.negotiate_many, [o.model_dump() for o in offers])
+    for result in results:
+        NEGOTIATION_OUTCOMES.labels(result["status"]).inc()
+    return results
 
 @app.post("/negotiate")
 async def negotiate_price(negotiation: NegotiationRequest):
-    data = load_json('product_negotiate.json')
-    # Mock logic: if offer is > 90% of price, accept (simplified for mock)
-    # For now, just return the static success response
-    return data
+    """Evaluates one offer; with a session_id, successive offers are rounds of one negotiation."""
+    return (await negotiate_all([negotiation]))[0]
+
+@app.post("/negotiate/batch")
+async def negotiate_prices(batch: NegotiationBatch):
+    """Evaluates many offers at once; one result per offer, in order."""
+    return {"results": await negotiate_all(batch.offers)}
 
 if __name__ == "__main__":
     import uvicorn
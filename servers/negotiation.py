@@ -0,0 +1,175 @@
+"""
+Price negotiation for the mock API.
+
+Every vehicle has a list price (from the catalog) and a floor the dealer will
+not go below: 4-12% under list, fixed per vehicle by a hash of its id, so the
+same offers always get the same answers.
+
+Within a session the dealer starts asking the list price and moves toward
+the floor as offers come in. Each round it concedes a share of the gap
+between its ask and the offer; the share shrinks each round:
+
+    concession = (ask - max(offer, floor)) * CONCESSION * DECAY ** round
+
+An offer within ACCEPT_TOLERANCE of the ask is accepted. An offer under
+LOWBALL of the floor is rejected without a concession. After MAX_ROUNDS the
+dealer accepts anything at or above the floor and otherwise stands at it.
+
+Offers are evaluated as numpy arrays, so a batch of offers costs about as
+much as one. Several offers in one batch for the same session and vehicle
+are played as consecutive rounds.
+"""
+import zlib
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+MIN_DISCOUNT = 0.04
+MAX_DISCOUNT = 0.12
+CONCESSION = 0.5
+DECAY = 0.7
+ACCEPT_TOLERANCE = 0.005
+LOWBALL = 0.85
+MAX_ROUNDS = 6
+PRICE_STEP = 50
+SESSION_TTL_SECONDS = 24 * 3600
+
+ACCEPTED = "accepted"
+COUNTERED = "countered"
+REJECTED = "rejected"
+NOT_FOUND = "not_found"
+
+Offer = Dict[str, Any]
+
+
+def floor_price(vehicle_id: str, list_price: float) -> float:
+    """The lowest price the dealer accepts for the vehicle (deterministic per id)."""
+    share = (zlib.crc32(vehicle_id.encode("utf-8")) & 0xFFFF) / 0xFFFF
+    discount = MIN_DISCOUNT + (MAX_DISCOUNT - MIN_DISCOUNT) * share
+    return float(np.ceil(list_price * (1 - discount) / PRICE_STEP) * PRICE_STEP)
+
+
+def evaluate(
+    floor: np.ndarray,
+    ask: np.ndarray,
+    rounds: np.ndarray,
+    offer: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    One negotiation round for every row. Returns (status, price): the agreed
+    price for ACCEPTED rows, otherwise the dealer's new ask.
+    """
+    last = rounds + 1 >= MAX_ROUNDS
+    concession = (ask - np.maximum(offer, floor)) * CONCESSION * DECAY ** rounds
+    counter = np.maximum(floor, np.ceil((ask - concession) / PRICE_STEP) * PRICE_STEP)
+
+    accepted = (offer >= ask * (1 - ACCEPT_TOLERANCE)) | (offer >= counter) | (last & (offer >= floor))
+    lowball = ~accepted & (offer < floor * LOWBALL)
+    status = np.where(accepted, ACCEPTED, np.where(lowball, REJECTED, COUNTERED)).astype(object)
+    price = np.where(accepted, np.minimum(offer, ask), np.where(lowball, ask, np.where(last, floor, counter)))
+    return status, price
+
+
+class NegotiationEngine:
+    """
+    Evaluates offers against catalog prices and keeps each session's state
+    (per vehicle: round, current ask, and the deal once accepted) in a
+    key/value store (servers.shared_state), one value per session. Sessions
+    are read and written back in one store transaction, so workers sharing a
+    SQLite store never lose each other's rounds.
+
+    `lookup(vehicle_id)` returns the vehicle dict or None.
+    """
+
+    NAMESPACE = "negotiation"
+
+    def __init__(self, lookup: Callable[[str], Optional[Dict[str, Any]]], store):
+        self.lookup = lookup
+        self.store = store
+
+    def negotiate(self, vehicle_id: str, offer_price: float, session_id: Optional[str] = None) -> Dict[str, Any]:
+        return self.negotiate_many([{"vehicle_id": vehicle_id, "offer_price": offer_price, "session_id": session_id}])[0]
+
+    def negotiate_many(self, offers: List[Offer]) -> List[Dict[str, Any]]:
+        """One result per offer, in order. Offers without a session_id are one-off first rounds."""
+        results: List[Optional[Dict[str, Any]]] = [None] * len(offers)
+        vehicles: Dict[str, Optional[Tuple[float, float]]] = {}
+        for offer in offers:
+            vid = offer["vehicle_id"]
+            if vid not in vehicles:
+                vehicle = self.lookup(vid)
+                price = vehicle.get("price") if vehicle else None
+                vehicles[vid] = (float(price), floor_price(vid, float(price))) if price else None
+
+        with self.store.transaction():
+            sessions = {
+                sid: self.store.get(self.NAMESPACE, sid) or {}
+                for sid in {o.get("session_id") for o in offers if o.get("session_id")}
+            }
+            # Wave k holds the k-th offer of every (session, vehicle): earlier rounds are settled first
+            waves: Dict[int, List[int]] = defaultdict(list)
+            seen: Dict[Tuple[str, str], int] = defaultdict(int)
+            for i, offer in enumerate(offers):
+                if vehicles[offer["vehicle_id"]] is None:
+                    results[i] = {"status": NOT_FOUND, "vehicle_id": offer["vehicle_id"],
+                                  "message": f"Vehicle {offer['vehicle_id']} is not in the catalog."}
+                    continue
+                key = (offer.get("session_id") or "", offer["vehicle_id"])
+                waves[seen[key] if key[0] else 0].append(i)
+                seen[key] += 1
+            for wave in (waves[k] for k in sorted(waves)):
+                self._play(wave, offers, vehicles, sessions, results)
+            for sid, state in sessions.items():
+                self.store.set(self.NAMESPACE, sid, state, ttl=SESSION_TTL_SECONDS)
+        return results
+
+    def _play(self, rows: List[int], offers: List[Offer], vehicles, sessions, results):
+        states = []
+        for i in rows:
+            offer = offers[i]
+            session = sessions.get(offer.get("session_id"))
+            state = session.get(offer["vehicle_id"]) if session is not None else None
+            states.append(state or {"round": 0, "ask": vehicles[offer["vehicle_id"]][0]})
+
+        outcomes = [ACCEPTED if s.get("status") == ACCEPTED else None for s in states]
+        repeated = [o is not None for o in outcomes]
+        live = [j for j, o in enumerate(outcomes) if o is None]
+        if live:
+            floor = np.array([vehicles[offers[rows[j]]["vehicle_id"]][1] for j in live])
+            ask = np.array([states[j]["ask"] for j in live], dtype=np.float64)
+            rounds = np.array([states[j]["round"] for j in live])
+            offer = np.array([float(offers[rows[j]]["offer_price"]) for j in live])
+            status, price = evaluate(floor, ask, rounds, offer)
+            for n, j in enumerate(live):
+                state = states[j]
+                state["round"] += 1
+                outcomes[j] = str(status[n])
+                if status[n] == ACCEPTED:
+                    state.update(status=ACCEPTED, final_price=float(price[n]))
+                else:
+                    state["ask"] = float(price[n])
+
+        for j, i in enumerate(rows):
+            offer, state = offers[i], states[j]
+            session = sessions.get(offer.get("session_id"))
+            if session is not None:
+                session[offer["vehicle_id"]] = state
+            results[i] = self._result(offer, vehicles[offer["vehicle_id"]][0], state, outcomes[j], repeated[j])
+
+    @staticmethod
+    def _result(offer: Offer, list_price: float, state: Dict[str, Any], status: str, repeated: bool) -> Dict[str, Any]:
+        result = {"status": status, "vehicle_id": offer["vehicle_id"], "offer_price": offer["offer_price"],
+                  "list_price": list_price, "round": state["round"]}
+        if status == ACCEPTED:
+            final = state["final_price"]
+            message = "This vehicle's price was already agreed." if repeated else "Dealership accepted the offer."
+            result.update(final_price=final, savings=list_price - final, message=message)
+        elif status == REJECTED:
+            result.update(counter_price=state["ask"],
+                          message=f"The offer is too low; the dealership is asking ${state['ask']:,.0f}.")
+        elif state["round"] >= MAX_ROUNDS:
+            result.update(counter_price=state["ask"], message=f"Final offer: ${state['ask']:,.0f}.")
+        else:
+            result.update(counter_price=state["ask"], message=f"The dealership counters at ${state['ask']:,.0f}.")
+        return result
@@ -0,0 +1,348 @@
+import copy
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import requests
+from cachetools import LRUCache
+from opentelemetry import trace
+
+from servers.tracing import get_tracer, inject_headers
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamUnavailable(Exception):
+    """Raised when an upstream call fails and no stale result can be served."""
+
+
+# --- Circuit Breaker ---
+
+class CircuitBreaker:
+    """
+    Classic closed/open/half-open breaker for a single upstream endpoint.
+
+    - CLOSED: requests flow; consecutive failures are counted.
+    - OPEN: requests are rejected until `reset_timeout` seconds have passed.
+    - HALF_OPEN: a single probe request is let through; success closes the
+      breaker, failure re-opens it.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 3,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.total_failures = 0
+        self.total_rejections = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+
+    def allow_request(self) -> bool:
+        """Returns True if a request may be sent to the upstream right now."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.total_rejections += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit '{self.name}' closed after successful probe")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.total_failures += 1
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(f"Circuit '{self.name}' opened after {self._failures} consecutive failures")
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+                self._probe_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            retry_in = 0.0
+            if state == self.OPEN:
+                retry_in = max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "total_failures": self.total_failures,
+                "total_rejections": self.total_rejections,
+                "retry_in_seconds": round(retry_in, 3),
+            }
+
+
+# --- Retry Budget ---
+
+class RetryBudget:
+    """
+    Token bucket that bounds retries to a fraction of regular traffic.
+
+    Every first attempt deposits `ratio` tokens (capped at `max_tokens`); every
+    retry withdraws one. This keeps retries from multiplying load on an upstream
+    that is already struggling.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_tokens: float = 10.0, max_tokens: float = 100.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = min_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            return self._tokens
+
+
+# --- Resilient HTTP client ---
+
+class UpstreamClient:
+    """
+    Wraps `requests` calls to the backing API with a circuit breaker per
+    endpoint, jittered exponential backoff bounded by a shared retry budget,
+    and a stale-result cache that is served while an endpoint is unavailable.
+
+    Cached GET results are revalidated with If-None-Match, so a 304 from the
+    upstream reuses the cached body instead of transferring it again. At most
+    `max_cached` results (and their ETags) are kept, least recently used
+    dropped first.
+
+    A POST sent with an Idempotency-Key header is retried like a GET: the
+    upstream deduplicates the repeats.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 2,
+        backoff_base: float = 0.05,
+        backoff_cap: float = 1.0,
+        timeout: float = 5.0,
+        failure_threshold: int = 3,
+        reset_timeout: float = 30.0,
+        retry_budget: Optional[RetryBudget] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        max_cached: int = 1024,
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.retry_budget = retry_budget or RetryBudget()
+        self._clock = clock
+        self._sleep = sleep
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._stale: LRUCache = LRUCache(maxsize=max_cached)
+        self._etags: LRUCache = LRUCache(maxsize=max_cached)
+        self._lock = threading.Lock()
+        self.stale_served = 0
+        self.conditional_requests = 0
+        self.not_modified = 0
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    endpoint,
+                    failure_threshold=self.failure_threshold,
+                    reset_timeout=self.reset_timeout,
+                    clock=self._clock,
+                )
+                self._breakers[endpoint] = breaker
+            return breaker
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": uniform in [0, min(cap, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    @staticmethod
+    def _cache_key(method: str, url: str, params: Optional[Dict[str, Any]]) -> Tuple:
+        # Repeated query parameters arrive as lists, which are not hashable
+        items = ((k, tuple(v) if isinstance(v, list) else v) for k, v in (params or {}).items())
+        return (method, url, tuple(sorted(items)))
+
+    def _cached(self, key: Tuple) -> Tuple[Any, Optional[str]]:
+        """(body, ETag) of the last result for `key`, (None, None) if there is none."""
+        # LRUCache reorders on reads, so every access holds the lock
+        with self._lock:
+            if key not in self._stale:
+                return None, None
+            return self._stale[key], self._etags.get(key)
+
+    def _serve_stale(self, key: Tuple, endpoint: str, reason: str) -> Any:
+        with self._lock:
+            data = self._stale.get(key)
+            if data is not None:
+                self.stale_served += 1
+        if data is not None:
+            logger.warning(f"Serving stale result for {endpoint} ({reason})")
+            return copy.deepcopy(data)
+        raise UpstreamUnavailable(f"{endpoint} unavailable: {reason}")
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        cacheable: Optional[bool] = None,
+    ) -> Any:
+        """
+        Performs the request and returns the decoded JSON body.
+
+        GETs are retried and cached. Other methods get a single attempt guarded
+        by the breaker, unless they carry an Idempotency-Key (then they are
+        retried, but not cached). `cacheable=False` keeps a GET out of the
+        cache: it is retried, but never served stale or revalidated.
+        """
+        endpoint = f"{method} {url}"
+        breaker = self.breaker(endpoint)
+        if cacheable is None:
+            cacheable = method == "GET"
+        key = self._cache_key(method, url, params)
+
+        if not breaker.allow_request():
+            if cacheable:
+                return self._serve_stale(key, endpoint, "circuit open")
+            raise UpstreamUnavailable(f"{endpoint} unavailable: circuit open")
+
+        self.retry_budget.deposit()
+        idempotent = method == "GET" or "Idempotency-Key" in (headers or {})
+        attempts = 1 + (self.max_retries if idempotent else 0)
+        last_error: Optional[Exception] = None
+        for attempt in range(attempts):
+            if attempt > 0:
+                if breaker.state == CircuitBreaker.OPEN or not self.retry_budget.try_withdraw():
+                    break
+                self._sleep(self._backoff(attempt - 1))
+            cached, etag = self._cached(key) if cacheable else (None, None)
+            if etag is not None:
+                with self._lock:
+                    self.conditional_requests += 1
+            try:
+                with get_tracer().start_as_current_span(
+                    f"HTTP {method}",
+                    kind=trace.SpanKind.CLIENT,
+                    attributes={"http.method": method, "http.url": url, "retry.attempt": attempt},
+                ) as span:
+                    sent = dict(headers or {})
+                    if etag is not None:
+                        sent["If-None-Match"] = etag
+                    response = requests.request(
+                        method, url, params=params, json=json, timeout=self.timeout, headers=inject_headers(sent)
+                    )
+                    span.set_attribute("http.status_code", response.status_code)
+                if response.status_code >= 500:
+                    response.raise_for_status()
+                breaker.record_success()
+                if response.status_code == 304 and cached is not None:
+                    with self._lock:
+                        self.not_modified += 1
+                    return copy.deepcopy(cached)
+                response.raise_for_status()
+                data = response.json()
+                if cacheable:
+                    etag = response.headers.get("ETag")
+                    with self._lock:
+                        self._stale[key] = copy.deepcopy(data)
+                        if etag:
+                            self._etags[key] = etag
+                        else:
+                            self._etags.pop(key, None)
+                return data
+            except requests.HTTPError as e:
+                if e.response is not None and e.response.status_code < 500:
+                    # Client errors are the caller's problem, not the upstream's health
+                    raise
+                last_error = e
+                breaker.record_failure()
+            except requests.RequestException as e:
+                last_error = e
+                breaker.record_failure()
+
+        if cacheable:
+            return self._serve_stale(key, endpoint, str(last_error))
+        raise UpstreamUnavailable(f"{endpoint} failed: {last_error}")
+
+    def invalidate(self, predicate: Callable[[str, Dict[str, Any]], bool]) -> int:
+        """Forgets cached GET results (and their ETags) for which `predicate(url, params)` is true."""
+        with self._lock:
+            doomed = [key for key in list(self._stale.keys()) if predicate(key[1], dict(key[2]))]
+            for key in doomed:
+                self._stale.pop(key, None)
+                self._etags.pop(key, None)
+        return len(doomed)
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None, cacheable: bool = True) -> Any:
+        return self.request("GET", url, params=params, cacheable=cacheable)
+
+    def post(self, url: str, json: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None) -> Any:
+        return self.request("POST", url, json=json, headers=headers)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Breaker state for every endpoint seen so far (for `/health`)."""
+        with self._lock:
+            breakers = list(self._breakers.values())
+            counters = {
+                "stale_served": self.stale_served,
+                "conditional_requests": self.conditional_requests,
+                "not_modified": self.not_modified,
+            }
+        return {
+            "circuits": {b.name: b.snapshot() for b in breakers},
+            "retry_budget_tokens": round(self.retry_budget.tokens, 2),
+            **counters,
+        }
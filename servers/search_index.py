@@ -0,0 +1,359 @@
+import logging
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from servers.catalog_format import NO_YEAR
+
+logger = logging.getLogger(__name__)
+
+# Term frequency multipliers: a make or model hit says more than a feature hit
+FIELD_BOOSTS = {"make": 3.0, "model": 3.0, "type": 2.0, "color": 1.0, "features": 1.0}
+DICT_FIELDS = ("make", "model", "type", "color")
+FILTER_FIELDS = ("make", "model", "type")
+NUMERIC_FIELDS = ("year", "price")
+FACET_FIELDS = DICT_FIELDS + ("features", "year")
+
+# Words that describe the request rather than the vehicle (kept apart from the
+# semantic cache's STOPWORDS: its normalization must not change the ranking)
+SEARCH_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "right", "now", "currently",
+    "please", "can", "could", "you", "tell", "me", "about", "what", "whats", "which",
+    "of", "in", "on", "for", "to", "do", "does", "some", "any", "i", "my", "there",
+    "find", "show", "search", "searching", "look", "looking", "want", "need", "get", "give",
+    "car", "cars", "vehicle", "vehicles", "with", "and", "or", "that", "has", "have", "like",
+    "list", "all", "options", "something", "one", "ones",
+}
+
+# Score multiplier per edit for typo-tolerant matches
+FUZZY_WEIGHT = 0.6
+
+# (term, weight) pairs a query expands to. Terms outside the index vocabulary
+# are kept: they can still match documents edited since the index was built.
+Expansion = List[Tuple[str, float]]
+
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def query_terms(query: str) -> List[str]:
+    return [t for t in tokenize(query) if t not in SEARCH_STOPWORDS]
+
+
+def max_edits(term: str) -> int:
+    """Typos tolerated for a query term: none for short terms, where they would match everything."""
+    if len(term) <= 3:
+        return 0
+    return 1 if len(term) <= 7 else 2
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Edit distance counting adjacent transpositions as one edit ("telsa" ->
+    "tesla"), or limit + 1 as soon as it is known to exceed `limit`.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before_previous = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, before_previous[j - 2] + 1)
+            current.append(cost)
+        # The next row can still reach back to `previous` through a transposition
+        if min(current) > limit and min(previous) > limit:
+            return limit + 1
+        before_previous, previous = previous, current
+    return previous[-1]
+
+
+def _trigrams(term: str) -> List[str]:
+    padded = f"${term}$"
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def _rows_by_code(codes: np.ndarray, size: int) -> List[np.ndarray]:
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(size + 1))
+    return [order[bounds[j]:bounds[j + 1]] for j in range(size)]
+
+
+class SearchIndex:
+    """
+    Inverted index over make, model, type, color and features with BM25
+    ranking and typo-tolerant term matching.
+
+    Built column-wise: each distinct field value is tokenized once and its
+    postings are the rows carrying that value, so construction cost is
+    dominated by numpy sorts rather than per-vehicle Python work. Postings
+    are (doc, tf) numpy arrays; a query accumulates BM25 contributions into a
+    dense score vector and takes the top k with argpartition.
+
+    Query terms missing from the vocabulary are matched to vocabulary terms
+    within `max_edits` edits, found through a trigram index over the
+    vocabulary, and weighted down by FUZZY_WEIGHT per edit.
+    """
+
+    def __init__(
+        self,
+        count: int,
+        columns: Dict[str, Tuple[np.ndarray, Sequence[str]]],
+        features: Tuple[np.ndarray, np.ndarray, Sequence[str]],
+        numbers: Dict[str, np.ndarray],
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self.count = count
+        self.k1 = k1
+        self.b = b
+
+        parts: Dict[str, List[Tuple[np.ndarray, float]]] = defaultdict(list)
+        for field in DICT_FIELDS:
+            codes, dictionary = columns[field]
+            for value, rows in zip(dictionary, _rows_by_code(codes, len(dictionary))):
+                if len(rows):
+                    for term, n in Counter(tokenize(value)).items():
+                        parts[term].append((rows, FIELD_BOOSTS[field] * n))
+
+        offsets, feature_codes, feature_names = features
+        row_of = np.repeat(np.arange(count), np.diff(offsets).astype(np.int64))
+        for name, positions in zip(feature_names, _rows_by_code(feature_codes, len(feature_names))):
+            if len(positions):
+                for term, n in Counter(tokenize(name)).items():
+                    parts[term].append((row_of[positions], FIELD_BOOSTS["features"] * n))
+        # Columns are kept for facet counts over a filtered result set
+        self._columns = {field: (codes, list(dictionary)) for field, (codes, dictionary) in columns.items()}
+        self._columns["features"] = (feature_codes, list(feature_names))
+        self._feature_rows = row_of
+        self._numbers = numbers
+        self._integral = {
+            field: bool(np.all(np.isnan(values) | (values == np.floor(values)))) for field, values in numbers.items()
+        }
+
+        self.terms: List[str] = sorted(parts)
+        self.vocab: Dict[str, int] = {term: tid for tid, term in enumerate(self.terms)}
+        self.docs: List[np.ndarray] = []
+        self.tfs: List[np.ndarray] = []
+        self.doc_len = np.zeros(count, dtype=np.float32)
+        for term in self.terms:
+            rows = np.concatenate([r for r, _ in parts[term]])
+            weights = np.concatenate([np.full(len(r), w, dtype=np.float32) for r, w in parts[term]])
+            docs, inverse = np.unique(rows, return_inverse=True)
+            tf = np.bincount(inverse, weights=weights).astype(np.float32)
+            self.docs.append(docs.astype(np.int32))
+            self.tfs.append(tf)
+            self.doc_len[docs] += tf
+        self.avg_len = float(self.doc_len.mean()) if count else 0.0
+        self.idf = np.array([self._idf(len(d)) for d in self.docs], dtype=np.float32)
+
+        self._trigram_index: Dict[str, List[int]] = defaultdict(list)
+        for tid, term in enumerate(self.terms):
+            for gram in set(_trigrams(term)):
+                self._trigram_index[gram].append(tid)
+
+        # Lowercased filter columns, for make/model/type filters alongside a query
+        self._filters = {
+            field: (columns[field][0], [v.lower() for v in columns[field][1]]) for field in FILTER_FIELDS
+        }
+
+    @classmethod
+    def from_columnar(cls, base) -> "SearchIndex":
+        """Index over the rows of a ColumnarCatalog; doc numbers are its row numbers."""
+        columns = {field: (base.codes(field), base.dictionaries[field]) for field in DICT_FIELDS}
+        offsets, feature_codes = base.feature_columns()
+        numbers = {
+            "year": np.where(base.year == NO_YEAR, np.nan, base.year),
+            "price": base.price.astype(np.float64),
+        }
+        return cls(len(base), columns, (offsets, feature_codes, base.dictionaries["features"]), numbers)
+
+    @classmethod
+    def from_records(cls, records: Sequence, feature_names: Sequence[str]) -> "SearchIndex":
+        """
+        Index over CompactVehicle records; doc numbers are positions in
+        `records`, `feature_names` maps their feature ids to names.
+        """
+        columns = {}
+        for field in DICT_FIELDS:
+            index: Dict[str, int] = {}
+            codes = np.fromiter(
+                (index.setdefault(getattr(r, field), len(index)) for r in records), dtype=np.int32, count=len(records)
+            )
+            columns[field] = (codes, list(index))
+        offsets = np.zeros(len(records) + 1, dtype=np.int64)
+        np.cumsum([len(r.feature_ids) for r in records], out=offsets[1:])
+        feature_codes = np.fromiter((f for r in records for f in r.feature_ids), dtype=np.int32, count=int(offsets[-1]))
+        numbers = {
+            field: np.array([np.nan if getattr(r, field) is None else getattr(r, field) for r in records], dtype=np.float64)
+            for field in NUMERIC_FIELDS
+        }
+        return cls(len(records), columns, (offsets, feature_codes, list(feature_names)), numbers)
+
+    def _idf(self, df: int) -> float:
+        return math.log(1 + (self.count - df + 0.5) / (df + 0.5))
+
+    def fuzzy_terms(self, term: str) -> List[Tuple[int, int]]:
+        """(term id, edits) of vocabulary terms within max_edits(term) of `term`."""
+        limit = max_edits(term)
+        if limit == 0:
+            return []
+        candidates = {tid for gram in _trigrams(term) for tid in self._trigram_index.get(gram, ())}
+        matches = []
+        for tid in candidates:
+            distance = edit_distance(term, self.terms[tid], limit)
+            if distance <= limit:
+                matches.append((tid, distance))
+        return matches
+
+    def expand(self, query: str) -> Optional[Expansion]:
+        """
+        Vocabulary terms the query matches, with weights. None when the query
+        has no searchable words at all (e.g. "find cars").
+        """
+        terms = query_terms(query)
+        if not terms:
+            return None
+        expansion: Dict[str, float] = {}
+        for term in terms:
+            expansion[term] = 1.0
+            if term not in self.vocab:
+                for tid, distance in self.fuzzy_terms(term):
+                    match = self.terms[tid]
+                    expansion[match] = max(expansion.get(match, 0.0), FUZZY_WEIGHT ** distance)
+        return list(expansion.items())
+
+    def filter_mask(self, **filters: Optional[str]) -> Optional[np.ndarray]:
+        mask = None
+        for field, value in filters.items():
+            if value:
+                codes, dictionary = self._filters[field]
+                wanted = [code for code, v in enumerate(dictionary) if v == value.lower()]
+                field_mask = np.isin(codes, wanted)
+                mask = field_mask if mask is None else mask & field_mask
+        return mask
+
+    def match_mask(self, expansion: Expansion) -> np.ndarray:
+        """Docs containing any term of the expansion, i.e. every doc `top` could return."""
+        mask = np.zeros(self.count, dtype=bool)
+        for term, _ in expansion:
+            tid = self.vocab.get(term)
+            if tid is not None:
+                mask[self.docs[tid]] = True
+        return mask
+
+    def facet_counts(self, field: str, mask: np.ndarray) -> Counter:
+        """Value -> number of docs in `mask` carrying it, by bincount over the column codes."""
+        everything = bool(mask.all())
+        if field in NUMERIC_FIELDS:
+            values = self.numbers(field, mask)
+            if len(values) and self._integral[field]:
+                # Whole numbers (years): bincount from the smallest instead of sorting
+                low = int(values.min())
+                counts = np.bincount((values - low).astype(np.int64))
+                return Counter({low + int(i): int(counts[i]) for i in np.flatnonzero(counts)})
+            values, counts = np.unique(values, return_counts=True)
+            return Counter({v.item(): int(n) for v, n in zip(values, counts)})
+        codes, dictionary = self._columns[field]
+        if not everything:
+            codes = codes[mask[self._feature_rows]] if field == "features" else codes[mask]
+        counts = np.bincount(codes, minlength=len(dictionary))
+        return Counter({dictionary[code]: int(counts[code]) for code in np.flatnonzero(counts)})
+
+    def numbers(self, field: str, mask: np.ndarray) -> np.ndarray:
+        """Non-missing values of a numeric column for the docs in `mask`."""
+        values = self._numbers[field][mask]
+        return values[~np.isnan(values)]
+
+    def _bm25(self, tf, doc_len, idf: float, weight: float):
+        norm = self.k1 * (1 - self.b + self.b * doc_len / (self.avg_len or 1.0))
+        return weight * idf * tf * (self.k1 + 1) / (tf + norm)
+
+    def top(
+        self,
+        expansion: Expansion,
+        limit: int,
+        mask: Optional[np.ndarray] = None,
+        exclude: Iterable[int] = (),
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Doc numbers and scores of the `limit` best matches, best first."""
+        scores = np.zeros(self.count, dtype=np.float32)
+        for term, weight in expansion:
+            tid = self.vocab.get(term)
+            if tid is not None:
+                docs = self.docs[tid]
+                scores[docs] += self._bm25(self.tfs[tid], self.doc_len[docs], self.idf[tid], weight)
+        if mask is not None:
+            scores[~mask] = 0
+        exclude = list(exclude)
+        if exclude:
+            scores[exclude] = 0
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) > limit:
+            hits = hits[np.argpartition(-scores[hits], limit - 1)[:limit]]
+        # Ties broken by doc number so results are stable
+        hits = hits[np.lexsort((hits, -scores[hits]))]
+        return hits, scores[hits]
+
+    def score_fields(self, fields: Dict[str, Iterable[str]], expansion: Expansion) -> float:
+        """BM25 score of a document that is not in the index (e.g. edited since the build)."""
+        tf: Dict[str, float] = defaultdict(float)
+        for field, values in fields.items():
+            for value in values:
+                for term in tokenize(value):
+                    tf[term] += FIELD_BOOSTS[field]
+        doc_len = sum(tf.values())
+        score = 0.0
+        for term, weight in expansion:
+            tid = self.vocab.get(term)
+            idf = self.idf[tid] if tid is not None else self._idf(1)
+            if tf.get(term):
+                score += self._bm25(tf[term], doc_len, idf, weight)
+            elif tid is None:
+                # A word the index has never seen: allow typos against this document's own words
+                limit = max_edits(term)
+                for word, count in tf.items():
+                    distance = edit_distance(term, word, limit) if limit else limit + 1
+                    if distance <= limit:
+                        score += self._bm25(count, doc_len, idf, weight * FUZZY_WEIGHT ** distance)
+        return float(score)
+
+
+def histogram(values: np.ndarray, buckets: int) -> Dict[str, Any]:
+    """
+    Up to about `buckets` equal-width buckets over `values`, with the width
+    rounded to 1, 2, 2.5 or 5 times a power of ten so bounds read naturally.
+    """
+    if not len(values):
+        return {"min": None, "max": None, "buckets": []}
+    low, high = float(values.min()), float(values.max())
+    raw = (high - low) / max(buckets, 1) or 1.0
+    magnitude = 10 ** math.floor(math.log10(raw))
+    width = next(step * magnitude for step in (1, 2, 2.5, 5, 10) if step * magnitude >= raw)
+    start = math.floor(low / width) * width
+    plain = lambda x: int(x) if float(x).is_integer() else float(x)
+    counts = np.bincount(((values - start) / width).astype(np.int64))
+    return {
+        "min": plain(low),
+        "max": plain(high),
+        "buckets": [
+            {"min": plain(start + i * width), "max": plain(start + (i + 1) * width), "count": int(n)}
+            for i, n in enumerate(counts)
+        ],
+    }
+
+
+def text_matches(query: str, texts: Iterable[str]) -> bool:
+    """Whether any query term equals or is within typo distance of a word in `texts`."""
+    words = {w for text in texts for w in tokenize(text)}
+    for term in query_terms(query):
+        limit = max_edits(term)
+        if term in words or any(edit_distance(term, w, limit) <= limit for w in words if limit):
+            return True
+    return False
@@ -0,0 +1,195 @@
+import logging
+import re
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Filler words that change the phrasing but not the meaning of a question
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "right", "now", "currently",
+    "please", "can", "could", "you", "tell", "me", "about", "what", "whats", "which",
+    "of", "in", "on", "for", "to", "do", "does", "some", "any", "i", "my", "there",
+}
+
+
+def normalize_query(text: str) -> str:
+    """Lowercases the query and strips punctuation and filler words."""
+    tokens = re.findall(r"[a-z0-9]+", text.lower())
+    return " ".join(t for t in tokens if t not in STOPWORDS)
+
+
+class HashedNgramEmbedder:
+    """
+    Embeds text as a signed feature-hashed bag of word unigrams, word bigrams
+    and character trigrams, L2-normalised so a dot product is cosine similarity.
+
+    Fully local and deterministic (crc32), so it needs no model download.
+    """
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        words = text.split()
+        features = [f"w:{w}" for w in words]
+        features += [f"b:{a}_{b}" for a, b in zip(words, words[1:])]
+        for w in words:
+            padded = f"#{w}#"
+            features += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+        return features
+
+    def embed(self, text: str) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            # Word-level features carry more meaning than character trigrams
+            weight = 1.0 if feature[0] == "c" else 2.0
+            vec[h % self.dim] += weight if (h >> 31) & 1 else -weight
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec /= norm
+        return vec
+
+
+class SemanticCache:
+    """
+    Cache of free-text answers looked up by embedding similarity.
+
+    Entries are stored as rows of a single matrix so a lookup is one
+    matrix-vector product. Entries expire after `ttl_seconds`; when full, the
+    oldest entry is replaced.
+
+    With a `shared_store` (see servers.shared_state), stored answers are also
+    written there and entries written by other worker processes are pulled in
+    before each lookup.
+    """
+
+    SHARED_NAMESPACE = "semantic_cache"
+
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        ttl_seconds: float = 3600.0,
+        max_entries: int = 512,
+        embedder: Optional[HashedNgramEmbedder] = None,
+        clock: Callable[[], float] = time.monotonic,
+        shared_store=None,
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.embedder = embedder or HashedNgramEmbedder()
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((max_entries, self.embedder.dim), dtype=np.float32)
+        self._expires = np.full(max_entries, -np.inf)
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * max_entries
+        self._next = 0
+        self._slots: Dict[str, int] = {}
+        self.shared_store = shared_store
+        self._shared_seq = 0
+        self.hits = 0
+        self.misses = 0
+        self.saved_model_calls = 0
+
+    def lookup(self, query: str) -> Optional[str]:
+        """Returns a cached answer for a semantically equivalent query, if fresh."""
+        normalized = normalize_query(query)
+        if not normalized:
+            return None
+        self._sync_shared()
+        vec = self.embedder.embed(normalized)
+        with self._lock:
+            scores = self._vectors @ vec
+            scores[self._expires <= self._clock()] = -1.0
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                entry = self._entries[best]
+                self.hits += 1
+                self.saved_model_calls += entry["model_calls"]
+                logger.info(f"Semantic cache hit ({scores[best]:.3f}) for '{query}' -> '{entry['query']}'")
+                return entry["answer"]
+            self.misses += 1
+            return None
+
+    def store(self, query: str, answer: str, model_calls: int = 1):
+        """Caches `answer`; `model_calls` is how many LLM calls a hit will save."""
+        normalized = normalize_query(query)
+        if not normalized or not answer:
+            return
+        entry = {"query": query, "answer": answer, "model_calls": model_calls}
+        self._insert(normalized, entry, self.ttl_seconds)
+        if self.shared_store is not None:
+            shared_entry = dict(entry, expires_at=time.time() + self.ttl_seconds)
+            self.shared_store.set(self.SHARED_NAMESPACE, normalized, shared_entry, ttl=self.ttl_seconds)
+
+    def _insert(self, normalized: str, entry: Dict[str, Any], ttl: float):
+        vec = self.embedder.embed(normalized)
+        with self._lock:
+            # Re-storing the same normalized query reuses its slot
+            slot = self._slots.get(normalized)
+            if slot is None:
+                slot = self._next
+                self._next = (self._next + 1) % self.max_entries
+                old = self._entries[slot]
+                if old is not None:
+                    self._slots.pop(old["normalized"], None)
+            self._vectors[slot] = vec
+            self._expires[slot] = self._clock() + ttl
+            self._entries[slot] = dict(entry, normalized=normalized)
+            self._slots[normalized] = slot
+
+    def _sync_shared(self):
+        """Pulls entries other workers have written to the shared store since the last sync."""
+        if self.shared_store is None:
+            return
+        for seq, normalized, entry in self.shared_store.items_since(self.SHARED_NAMESPACE, self._shared_seq):
+            self._shared_seq = seq
+            ttl = entry.pop("expires_at", time.time() + self.ttl_seconds) - time.time()
+            if ttl > 0:
+                self._insert(normalized, entry, ttl)
+
+    def invalidate(self, predicate: Callable[[Dict[str, Any]], bool]) -> int:
+        """
+        Drops every entry (a dict with "query" and "answer") for which
+        `predicate` is true, here and in the shared store. Returns the count.
+        """
+        self._sync_shared()
+        with self._lock:
+            doomed = [entry["normalized"] for entry in self._entries if entry is not None and predicate(entry)]
+            for normalized in doomed:
+                slot = self._slots.pop(normalized)
+                self._entries[slot] = None
+                self._vectors[slot] = 0
+                self._expires[slot] = -np.inf
+        if self.shared_store is not None:
+            for normalized in doomed:
+                self.shared_store.delete(self.SHARED_NAMESPACE, normalized)
+        return len(doomed)
+
+    def clear(self):
+        with self._lock:
+            self._vectors[:] = 0
+            self._expires[:] = -np.inf
+            self._entries = [None] * self.max_entries
+            self._slots.clear()
+            self._next = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return int(np.count_nonzero(self._expires > self._clock()))
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "saved_model_calls": self.saved_model_calls,
+        }
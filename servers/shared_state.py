@@ -0,0 +1,188 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryStore:
+    """
+    Process-local key/value store with TTLs.
+
+    Default for single-process deployments. Every write gets a sequence number
+    so readers can pull changes incrementally with `items_since`. Expired
+    entries are purged on write, at most once per `purge_interval` seconds.
+    """
+
+    def __init__(self, purge_interval: float = 60.0):
+        self._lock = threading.Lock()
+        self._data: Dict[Tuple[str, str], Tuple[int, Any, Optional[float]]] = {}
+        self._seq = 0
+        self._transaction_lock = threading.RLock()
+        self.purge_interval = purge_interval
+        self._next_purge = time.time() + purge_interval
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Makes a read-modify-write atomic against other transactions (the store is process-local)."""
+        with self._transaction_lock:
+            yield
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get((namespace, key))
+            if item is None:
+                return None
+            _, value, expires_at = item
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[(namespace, key)]
+                return None
+            return value
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        with self._lock:
+            self._seq += 1
+            expires_at = time.time() + ttl if ttl else None
+            self._data[(namespace, key)] = (self._seq, value, expires_at)
+        if time.time() >= self._next_purge:
+            self.purge_expired()
+
+    def delete(self, namespace: str, key: str):
+        with self._lock:
+            self._data.pop((namespace, key), None)
+
+    def items_since(self, namespace: str, seq: int) -> List[Tuple[int, str, Any]]:
+        """Live (seq, key, value) entries written after `seq`, oldest first."""
+        now = time.time()
+        with self._lock:
+            items = [
+                (item_seq, key, value)
+                for (ns, key), (item_seq, value, expires_at) in self._data.items()
+                if ns == namespace and item_seq > seq and (expires_at is None or expires_at > now)
+            ]
+        return sorted(items, key=lambda item: item[0])
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            self._next_purge = now + self.purge_interval
+            expired = [k for k, (_, _, expires_at) in self._data.items() if expires_at is not None and expires_at <= now]
+            for k in expired:
+                del self._data[k]
+        return len(expired)
+
+
+class SQLiteStore:
+    """
+    Key/value store in a SQLite file shared by all worker processes on a host.
+
+    WAL mode lets readers proceed while another worker writes; values are
+    stored as JSON. The same file can also hold the ADK session tables.
+    Expired rows are purged on write, at most once per `purge_interval`
+    seconds per instance.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS shared_kv (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        namespace TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value TEXT NOT NULL,
+        expires_at REAL,
+        UNIQUE (namespace, key)
+    );
+    """
+
+    def __init__(self, path: str, purge_interval: float = 60.0):
+        self.path = path
+        self.purge_interval = purge_interval
+        self._next_purge = time.time() + purge_interval
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Runs the gets and sets inside it as one SQLite transaction holding the
+        write lock (BEGIN IMMEDIATE), so a read-modify-write is atomic across
+        worker processes. Nested use joins the outer transaction.
+        """
+        conn = self._connect()
+        if conn.in_transaction:
+            yield
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        row = self._connect().execute(
+            "SELECT value, expires_at FROM shared_kv WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            self.delete(namespace, key)
+            return None
+        return json.loads(value)
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.time() + ttl if ttl else None
+        # REPLACE deletes and re-inserts, so the row gets a fresh, larger seq
+        self._connect().execute(
+            "INSERT OR REPLACE INTO shared_kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value), expires_at),
+        )
+        if time.time() >= self._next_purge:
+            self.purge_expired()
+
+    def delete(self, namespace: str, key: str):
+        self._connect().execute("DELETE FROM shared_kv WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def items_since(self, namespace: str, seq: int) -> List[Tuple[int, str, Any]]:
+        rows = self._connect().execute(
+            "SELECT seq, key, value FROM shared_kv WHERE namespace = ? AND seq > ? "
+            "AND (expires_at IS NULL OR expires_at > ?) ORDER BY seq",
+            (namespace, seq, time.time()),
+        ).fetchall()
+        return [(row_seq, key, json.loads(value)) for row_seq, key, value in rows]
+
+    def purge_expired(self) -> int:
+        self._next_purge = time.time() + self.purge_interval
+        cursor = self._connect().execute(
+            "DELETE FROM shared_kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+        )
+        return cursor.rowcount
+
+
+def make_shared_store(path: Optional[str] = None):
+    """SQLiteStore at `path` (or SHARED_STATE_DB) when set, otherwise a MemoryStore."""
+    path = path or os.environ.get("SHARED_STATE_DB")
+    if path:
+        logger.info(f"Using shared state store at {path}")
+        return SQLiteStore(path)
+    return MemoryStore()
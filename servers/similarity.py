@@ -0,0 +1,170 @@
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from servers.catalog_format import NO_YEAR
+
+logger = logging.getLogger(__name__)
+
+# Relative weight of each block of the vehicle vector
+PRICE_WEIGHT = 1.0
+YEAR_WEIGHT = 0.5
+TYPE_WEIGHT = 1.0
+MAKE_WEIGHT = 0.5
+FEATURES_WEIGHT = 1.0
+
+# Catalogs at least this large get an approximate (IVF) index by default
+APPROXIMATE_THRESHOLD = 50000
+
+
+def _standardize(values: np.ndarray, weight: float) -> np.ndarray:
+    """z-scores scaled by `weight`; missing values (NaN) land on the mean."""
+    present = values[~np.isnan(values)]
+    mean = present.mean() if len(present) else 0.0
+    std = present.std() if len(present) else 0.0
+    z = (values - mean) / (std or 1.0) * weight
+    z[np.isnan(z)] = 0.0
+    return z
+
+
+class _Vocabulary:
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+
+    def lookup(self, values: Sequence[str]) -> np.ndarray:
+        """Vocabulary index of each value (added if new)."""
+        return np.fromiter((self.index.setdefault(v, len(self.index)) for v in values), dtype=np.int64, count=len(values))
+
+
+class SimilarityIndex:
+    """
+    Nearest-neighbour search over vehicle vectors.
+
+    Each vehicle is encoded as standardized log price and year, one-hot type
+    and make, and its bag of features, with the row L2-normalised so a dot
+    product is cosine similarity. Exact search is one matrix-vector product
+    over the whole catalog plus argpartition; large catalogs additionally get
+    an inverted-file (IVF) index: rows are clustered with k-means and a query
+    only scores the rows of its `nprobe` closest clusters.
+    """
+
+    def __init__(self, matrix: np.ndarray, excluded: np.ndarray, approximate: Optional[bool] = None, nprobe: int = 16, seed: int = 0):
+        self.matrix = matrix
+        # Rows that must never be returned (e.g. base rows hidden by an edit)
+        self.excluded = excluded
+        self.nprobe = nprobe
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: List[np.ndarray] = []
+        if approximate if approximate is not None else len(matrix) >= APPROXIMATE_THRESHOLD:
+            self._build_ivf(seed)
+
+    @classmethod
+    def build(cls, base, records: Sequence, feature_names: Sequence[str], excluded_rows: Sequence[int] = (), **kwargs) -> "SimilarityIndex":
+        """
+        Encodes the rows of a mapped ColumnarCatalog `base` (may be None)
+        followed by CompactVehicle `records`; row numbers follow that order.
+        """
+        base_count = len(base) if base is not None else 0
+        count = base_count + len(records)
+        types, makes, features = _Vocabulary(), _Vocabulary(), _Vocabulary()
+
+        type_idx, make_idx, feature_idx, feature_rows, prices, years = [], [], [], [], [], []
+        if base is not None:
+            type_idx.append(types.lookup(base.dictionaries["type"])[base.codes("type")])
+            make_idx.append(makes.lookup(base.dictionaries["make"])[base.codes("make")])
+            offsets, codes = base.feature_columns()
+            feature_idx.append(features.lookup(base.dictionaries["features"])[codes])
+            feature_rows.append(np.repeat(np.arange(base_count), np.diff(offsets).astype(np.int64)))
+            prices.append(base.price.astype(np.float64))
+            years.append(np.where(base.year == NO_YEAR, np.nan, base.year).astype(np.float64))
+        if records:
+            type_idx.append(types.lookup([r.type for r in records]))
+            make_idx.append(makes.lookup([r.make for r in records]))
+            names = [feature_names[f] for r in records for f in r.feature_ids]
+            feature_idx.append(features.lookup(names))
+            feature_rows.append(np.repeat(np.arange(base_count, count), [len(r.feature_ids) for r in records]))
+            prices.append(np.array([np.nan if r.price is None else r.price for r in records], dtype=np.float64))
+            years.append(np.array([np.nan if r.year is None else r.year for r in records], dtype=np.float64))
+
+        def joined(parts, dtype):
+            return np.concatenate(parts).astype(dtype) if parts else np.zeros(0, dtype=dtype)
+
+        type_idx, make_idx = joined(type_idx, np.int64), joined(make_idx, np.int64)
+        feature_idx, feature_rows = joined(feature_idx, np.int64), joined(feature_rows, np.int64)
+        prices, years = joined(prices, np.float64), joined(years, np.float64)
+
+        n_types, n_makes, n_features = len(types.index), len(makes.index), len(features.index)
+        matrix = np.zeros((count, 2 + n_types + n_makes + n_features), dtype=np.float32)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            matrix[:, 0] = _standardize(np.log(np.where(prices > 0, prices, np.nan)), PRICE_WEIGHT)
+        matrix[:, 1] = _standardize(years, YEAR_WEIGHT)
+        rows = np.arange(count)
+        matrix[rows, 2 + type_idx] = TYPE_WEIGHT
+        matrix[rows, 2 + n_types + make_idx] = MAKE_WEIGHT
+        per_vehicle = np.maximum(np.bincount(feature_rows, minlength=count), 1)
+        matrix[feature_rows, 2 + n_types + n_makes + feature_idx] = FEATURES_WEIGHT / np.sqrt(per_vehicle[feature_rows])
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms > 0, norms, 1.0)
+
+        excluded = np.zeros(count, dtype=bool)
+        excluded[list(excluded_rows)] = True
+        return cls(matrix, excluded, **kwargs)
+
+    def _build_ivf(self, seed: int, iterations: int = 8):
+        count = len(self.matrix)
+        nlist = max(1, int(np.sqrt(count)))
+        rng = np.random.default_rng(seed)
+        # k-means (spherical) on a sample, then assign every row to its closest centroid
+        sample = self.matrix[rng.choice(count, size=min(count, nlist * 32), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assignment == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        assignment = np.concatenate([
+            np.argmax(self.matrix[start:start + 65536] @ centroids.T, axis=1)
+            for start in range(0, count, 65536)
+        ])
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(nlist + 1))
+        self.centroids = centroids
+        self.lists = [order[bounds[c]:bounds[c + 1]] for c in range(nlist)]
+
+    @property
+    def approximate(self) -> bool:
+        return self.centroids is not None
+
+    def query_vector(self, rows: Sequence[int]) -> np.ndarray:
+        """Normalised centroid of the given rows ("cars like these")."""
+        vec = self.matrix[list(rows)].mean(axis=0)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+    def top_k(self, vec: np.ndarray, k: int, exclude: Sequence[int] = ()) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows and cosine similarities of the `k` nearest rows, nearest first."""
+        if self.approximate:
+            probes = np.argsort(-(self.centroids @ vec))[: self.nprobe]
+            candidates = np.concatenate([self.lists[c] for c in probes])
+            scores = self.matrix[candidates] @ vec
+            keep = ~self.excluded[candidates]
+            if len(exclude):
+                keep &= ~np.isin(candidates, exclude)
+            candidates, scores = candidates[keep], scores[keep]
+        else:
+            # Excluded rows score -inf instead of being filtered, so the matrix is never copied
+            scores = self.matrix @ vec
+            scores[self.excluded] = -np.inf
+            scores[list(exclude)] = -np.inf
+            candidates = np.arange(len(scores))
+            k = min(k, len(scores) - int(np.count_nonzero(np.isneginf(scores))))
+        if len(candidates) > k > 0:
+            best = np.argpartition(-scores, k - 1)[:k]
+            candidates, scores = candidates[best], scores[best]
+        elif k <= 0:
+            candidates, scores = candidates[:0], scores[:0]
+        order = np.lexsort((candidates, -scores))
+        return candidates[order], scores[order]
@@ -0,0 +1,109 @@
+import logging
+import os
+import threading
+from typing import Dict, Optional, Sequence
+
+from fastapi import FastAPI, Request
+from opentelemetry import propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    ConsoleSpanExporter,
+    SimpleSpanProcessor,
+    SpanExporter,
+    SpanExportResult,
+)
+
+logger = logging.getLogger(__name__)
+
+TRACER_NAME = "vehicle_agent"
+
+_provider: Optional[TracerProvider] = None
+_provider_lock = threading.Lock()
+
+
+class JsonLinesSpanExporter(SpanExporter):
+    """Appends finished spans to a local file, one JSON object per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        lines = [span.to_json(indent=None) for span in spans]
+        with self._lock, open(self.path, "a") as f:
+            f.write("\n".join(lines) + "\n")
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+def _get_provider(service_name: str) -> TracerProvider:
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+            trace.set_tracer_provider(_provider)
+        return _provider
+
+
+def add_exporter(exporter: SpanExporter, service_name: str = TRACER_NAME, batch: bool = False):
+    """Installs the SDK tracer provider (once per process) and attaches `exporter` to it."""
+    processor = BatchSpanProcessor(exporter) if batch else SimpleSpanProcessor(exporter)
+    _get_provider(service_name).add_span_processor(processor)
+
+
+def configure_tracing(service_name: str):
+    """
+    Sets up tracing from the environment.
+
+    TRACING_EXPORTER: "none" (default), "console" or "file".
+    TRACING_FILE: target of the file exporter (default log/traces.jsonl).
+    """
+    exporter_name = os.environ.get("TRACING_EXPORTER", "none").lower()
+    if exporter_name == "console":
+        add_exporter(ConsoleSpanExporter(), service_name)
+    elif exporter_name == "file":
+        path = os.environ.get("TRACING_FILE", "log/traces.jsonl")
+        add_exporter(JsonLinesSpanExporter(path), service_name, batch=True)
+        logger.info(f"Writing traces for {service_name} to {path}")
+    elif exporter_name != "none":
+        logger.warning(f"Unknown TRACING_EXPORTER '{exporter_name}', tracing disabled")
+
+
+def get_tracer() -> trace.Tracer:
+    return trace.get_tracer(TRACER_NAME)
+
+
+def inject_headers(headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Returns `headers` with the current trace context (W3C traceparent) added."""
+    headers = dict(headers or {})
+    propagate.inject(headers)
+    return headers
+
+
+def instrument_app_tracing(app: FastAPI, service_name: str):
+    """Opens a server span per request, continuing any trace context sent by the caller."""
+    tracer = get_tracer()
+
+    @app.middleware("http")
+    async def tracing_middleware(request: Request, call_next):
+        parent = propagate.extract(dict(request.headers))
+        with tracer.start_as_current_span(
+            f"{request.method} {request.url.path}",
+            context=parent,
+            kind=trace.SpanKind.SERVER,
+            attributes={"service.name": service_name, "http.method": request.method},
+        ) as span:
+            response = await call_next(request)
+            route = request.scope.get("route")
+            if route is not None:
+                span.update_name(f"{request.method} {route.path}")
+                span.set_attribute("http.route", route.path)
+            span.set_attribute("http.status_code", response.status_code)
+            return response
@@ -0,0 +1,85 @@
+"""
+Per-session working set: the vehicles a conversation is currently about.
+
+Holds the rows of the last search (or similar-cars table), the pair last
+compared and the row the user last selected, as short tuples of
+(id, make, model, year, price). Book and compare intents resolve "book it",
+"the cheaper one" or "compare them" against it locally instead of asking
+the model which car was meant.
+
+Working sets are kept in the shared key/value store (servers.shared_state),
+so any worker can serve the next turn of a session.
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+NAMESPACE = "working_set"
+TTL_SECONDS = 3600
+MAX_RESULTS = 20
+
+# (id, make, model, year, price)
+CarRef = Tuple[str, str, str, Optional[int], Optional[float]]
+
+
+def _price(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)):
+        return float(value)
+    digits = re.sub(r"[^\d.]", "", str(value or ""))
+    return float(digits) if digits else None
+
+
+def car_ref(car: Dict[str, Any]) -> CarRef:
+    return (str(car["id"]), car.get("make", ""), car.get("model", ""), car.get("year"), _price(car.get("price")))
+
+
+def car_dict(ref: CarRef) -> Dict[str, Any]:
+    vid, make, model, year, price = ref
+    return {"id": vid, "make": make, "model": model, "year": year, "price": price}
+
+
+class WorkingSet:
+    __slots__ = ("results", "compared", "selected", "latest")
+
+    def __init__(self, results=(), compared=(), selected: Optional[CarRef] = None, latest: str = "results"):
+        self.results: Tuple[CarRef, ...] = tuple(tuple(r) for r in results)
+        self.compared: Tuple[CarRef, ...] = tuple(tuple(r) for r in compared)
+        self.selected: Optional[CarRef] = tuple(selected) if selected else None
+        # Which of results / compared was shown last
+        self.latest = latest
+
+    @classmethod
+    def load(cls, store, session_id: str) -> "WorkingSet":
+        value = store.get(NAMESPACE, session_id)
+        return cls(**value) if value else cls()
+
+    def save(self, store, session_id: str):
+        value = {"results": self.results, "compared": self.compared, "selected": self.selected, "latest": self.latest}
+        store.set(NAMESPACE, session_id, value, ttl=TTL_SECONDS)
+
+    def __bool__(self) -> bool:
+        return bool(self.results or self.compared or self.selected)
+
+    def observe(self, a2ui_msg: Optional[Dict[str, Any]]):
+        """Records the vehicles a surface shows: table rows as results, comparison cards as the compared pair."""
+        if not a2ui_msg:
+            return
+        surface = a2ui_msg.get("data") or {}
+        if a2ui_msg.get("surfaceType") == "table" and surface.get("rows"):
+            self.results = tuple(car_ref(car) for car in surface["rows"][:MAX_RESULTS])
+            self.latest = "results"
+            # A selection was made in the previous table
+            self.selected = None
+        elif a2ui_msg.get("surfaceType") == "card-comparison" and surface.get("cars"):
+            self.compared = tuple(car_ref(car) for car in surface["cars"])
+            self.latest = "compared"
+
+    def select(self, car: Dict[str, Any]):
+        self.selected = car_ref(car)
+
+    def candidates(self) -> List[Dict[str, Any]]:
+        """The vehicles a back-reference can mean: whichever of the last results and the compared pair was shown last."""
+        shown = self.compared if self.latest == "compared" else self.results
+        return [car_dict(ref) for ref in (shown or self.results or self.compared)]
+
+    def selection(self) -> Optional[Dict[str, Any]]:
+        return car_dict(self.selected) if self.selected else None
@@ -103,4 +103,30 @@ async def test_search_cars_columns(mock_api_server):
     # Let's check for "ID" specifically as per our implementation.
     assert "ID" in columns
     assert "Make" in columns
+    # Refinement counts over the whole match set ride along with the rows
+    facets = a2ui_msg["data"]["facets"]
+    assert facets["total"] == len(a2ui_msg["data"]["rows"])
+    assert facets["facets"]["make"] == [{"value": "Toyota", "count": 2}]
 
+
+def test_import_does_not_load_adk():
+    # The agent tree and google.adk are built lazily to keep cold starts fast
+    import subprocess, sys, os
+    code = "import sys, servers.agent_server; print('google.adk' in sys.modules, 'agent_app.agent' in sys.modules)"
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    result = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True)
+    assert result.stdout.strip().splitlines()[-1] == "False False"
+
+@pytest.mark.asyncio
+async def test_readiness_check():
+    from servers.agent_server import ADKAgent, load_root_agent
+    agent = ADKAgent(app_name="ready_test", agent_factory=load_root_agent)
+    assert not agent.ready
+    agent.warm_up()
+    assert agent.ready
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        with patch("servers.agent_server.adk_agent", agent):
+            response = await ac.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
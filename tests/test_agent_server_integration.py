@@ -210,3 +210,22 @@ async def test_comparison_fallback_logic_integration(mock_api_server, monkeypatc
             assert "2" in ids
         except json.JSONDecodeError:
             pytest.fail(f"Failed to get A2UI JSON for comparison fallback. Response: {text}")
+
+@pytest.mark.asyncio
+async def test_api_failure_opens_circuit(monkeypatch):
+    """
+    Repeated failures against a dead upstream open its circuit, which is reported on /health.
+    """
+    dead_url = "http://localhost:54322"
+    monkeypatch.setattr("servers.agent_server.MOCK_API_URL", dead_url)
+    monkeypatch.setattr("servers.agent_server.upstream.backoff_base", 0.0)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        payload = {"query": "Find Toyota cars", "session_id": "test_circuit"}
+        for _ in range(2):
+            response = await ac.post("/chat", json=payload)
+            assert response.status_code == 200
+
+        health = (await ac.get("/health")).json()
+        circuit = health["upstream"]["circuits"][f"GET {dead_url}/search"]
+        assert circuit["state"] == "open"
@@ -61,3 +61,13 @@ def test_find_vehicles_in_text_with_ids():
     # Honda Accord is id 2 in product_search.json
     assert "2" in ids
 
+
+
+def test_find_vehicles_in_text_does_not_scan_the_catalog():
+    from servers.agent_server import find_vehicles_in_text, get_catalog
+
+    with patch.object(type(get_catalog()), "records", side_effect=AssertionError("full scan")):
+        assert find_vehicles_in_text("compare 1 and 3") == ["1", "3"]
+        ids = find_vehicles_in_text("camry or honda?")
+    assert ids[0] == "1"
+    assert get_catalog().get(ids[1])["make"] == "Honda"
@@ -0,0 +1,121 @@
+import datetime
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+
+from servers.availability import AvailabilityCalendar
+from servers.bookings import BOOKED, STALE, BookingLedger
+from servers.mock_api_server import app as mock_app
+
+START = datetime.date(2025, 1, 1)
+
+
+def date(day, start=START):
+    return (start + datetime.timedelta(days=day)).isoformat()
+
+
+def test_reserve_and_list_open_days():
+    calendar = AvailabilityCalendar(START, days=180, capacity=1)
+    assert calendar.day("2025-01-01") == 0 and calendar.day("2025-06-29") == 179
+    assert calendar.day("2024-12-31") is None and calendar.day("2025-06-30") is None and calendar.day("soon") is None
+
+    for day in (3, 63, 64, 150):
+        assert calendar.reserve("1", date(day)) == (True, calendar.version("1"))
+    assert calendar.reserve("1", date(64))[0] is False
+    assert calendar.reserve("1", "2025-06-30") is None
+    calendar.reserve("2", date(5))  # grows past the initial capacity
+    assert not calendar.is_free("1", 63) and calendar.is_free("1", 62) and calendar.is_free("3", 63)
+    assert calendar.open_days("1", 60, 66) == [60, 61, 62, 65, 66]
+    assert calendar.open_days("1", 0, 179) == [d for d in range(180) if d not in (3, 63, 64, 150)]
+    assert calendar.open_days("unknown", 0, 2) == [0, 1, 2]
+
+    assert calendar.release("1", date(64))[0] and calendar.is_free("1", 64)
+
+
+def test_stale_version_is_refused():
+    calendar = AvailabilityCalendar(START)
+    seen = calendar.version("1")
+    assert calendar.reserve("1", date(10), expected_version=seen)[0]
+    assert calendar.release("1", date(10))[0]
+    done, version = calendar.reserve("1", date(10), expected_version=seen)
+    assert not done and version == seen + 2 and calendar.is_free("1", 10)
+    assert calendar.reserve("1", date(10), expected_version=version)[0]
+    # Changes to the vehicle's other days do not make the version stale
+    assert calendar.reserve("1", date(11), expected_version=seen)[0]
+
+
+def test_window_rolls_with_the_date():
+    today = [START]
+    calendar = AvailabilityCalendar(START, days=100, today=lambda: today[0])
+    for day in (0, 1, 63, 64, 99):
+        calendar.reserve("1", date(day))
+    seen = calendar.version("1")
+
+    today[0] = START + datetime.timedelta(days=2)
+    assert calendar.day("2025-01-02") is None and calendar.day("2025-01-03") == 0
+    assert calendar.start == today[0] and calendar.today() == 0
+    assert [d for d in range(100) if not calendar.is_free("1", d)] == [61, 62, 97]
+    assert calendar.date(calendar.days - 1) == "2025-04-12"
+    # Reservations name the date, so they follow the shift; the days' versions move with them
+    assert calendar.release("1", "2025-03-06") == (True, seen + 1) and calendar.is_free("1", 62)
+    assert calendar.reserve("1", "2025-03-06", expected_version=seen) == (False, seen + 1)
+    assert calendar.reserve("1", "2025-03-07", expected_version=seen) == (True, seen + 2)
+    assert not calendar.is_free("1", 63)
+
+
+def test_bookings_with_a_stale_version_are_refused():
+    calendar = AvailabilityCalendar(START)
+    ledger = BookingLedger(availability=calendar)
+    seen = calendar.version("1")
+    ledger.book_many([{"vehicle_id": "1", "customer_name": "Ann", "date": "2025-01-02"}])
+    ledger._unindex(ledger.get("BK-00001"))  # the 2025-01-02 booking is cancelled again
+    outcomes = ledger.book_many([
+        {"vehicle_id": "1", "customer_name": "Bob", "date": "2025-01-02", "availability_version": seen},
+        {"vehicle_id": "1", "customer_name": "Bob", "date": "2025-01-04", "availability_version": seen},
+    ])
+    # Only the day that changed is stale; another day of the same vehicle books
+    assert [o.status for o in outcomes] == [STALE, BOOKED]
+    assert outcomes[0].booking["availability_version"] == seen + 2
+    assert calendar.is_free("1", 1) and ledger.slot("1", "2025-01-02") is None and len(ledger) == 1
+
+
+def test_bookings_mark_the_calendar():
+    calendar = AvailabilityCalendar(START)
+    ledger = BookingLedger(availability=calendar)
+    ledger.book_many([
+        {"vehicle_id": "1", "customer_name": "Ann", "date": "2025-01-02"},
+        {"vehicle_id": "1", "customer_name": "Ann", "date": "2023-01-01"},  # outside the calendar
+    ])
+    assert calendar.open_days("1", 0, 3) == [0, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_availability_endpoint(monkeypatch):
+    calendar = AvailabilityCalendar(START, days=30)
+    monkeypatch.setattr("servers.mock_api_server.AVAILABILITY", calendar)
+    monkeypatch.setattr("servers.mock_api_server.BOOKINGS", BookingLedger(availability=calendar))
+    async with AsyncClient(transport=ASGITransport(app=mock_app), base_url="http://test") as ac:
+        await ac.post("/book", json={"vehicle_id": "1", "customer_name": "Ann", "date": "2025-01-03"})
+        default = await ac.get("/availability", params={"vehicle_id": "1"})
+        ranged = await ac.get("/availability", params={"vehicle_id": "1", "from": "2025-01-02", "to": "2025-01-04"})
+        outside = await ac.get("/availability", params={"vehicle_id": "1", "from": "2025-03-01"})
+        missing = await ac.get("/availability", params={"vehicle_id": "nope"})
+
+        await ac.post("/book", json={"vehicle_id": "1", "customer_name": "Cy", "date": "2025-01-05"})
+        stale = await ac.post(
+            "/book", json={"vehicle_id": "1", "customer_name": "Bob", "date": "2025-01-05", "availability_version": 1}
+        )
+        fresh = await ac.post(
+            "/book", json={"vehicle_id": "1", "customer_name": "Bob", "date": "2025-01-06", "availability_version": 1}
+        )
+        monkeypatch.setattr(calendar, "_today", lambda: datetime.date(2025, 1, 10))
+        rolled = await ac.get("/availability", params={"vehicle_id": "1"})
+
+    body = default.json()
+    assert (body["from"], body["to"], body["version"]) == ("2025-01-01", "2025-01-14", 1)
+    assert stale.status_code == 409 and fresh.status_code == 200
+    # The default range starts today, also once the calendar has moved on
+    assert (rolled.json()["from"], rolled.json()["to"]) == ("2025-01-10", "2025-01-23")
+    assert len(body["open"]) == 13 and "2025-01-03" not in body["open"]
+    assert ranged.json()["open"] == ["2025-01-02", "2025-01-04"]
+    assert outside.status_code == 422 and missing.status_code == 404
@@ -0,0 +1,164 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+
+from servers.bookings import BOOKED, CONFLICT, KEY_REUSED, REPLAYED, BookingJournal, BookingLedger, JournalError
+from servers.mock_api_server import app as mock_app
+
+
+def request(vehicle_id="1", date="2025-01-01", key=None, customer_name="Ann"):
+    return {"vehicle_id": vehicle_id, "customer_name": customer_name, "date": date, "idempotency_key": key}
+
+
+def test_slot_conflicts_and_idempotency_keys():
+    ledger = BookingLedger()
+    outcomes = ledger.book_many([
+        request(key="k1"),
+        request(key="k1"),                       # double submit inside one batch
+        request(key="k2"),                       # same slot, another customer
+        request(key="k1", date="2025-01-02"),    # key reused for something else
+        request(date="2025-01-02"),
+    ])
+    assert [o.status for o in outcomes] == [BOOKED, REPLAYED, CONFLICT, KEY_REUSED, BOOKED]
+    assert outcomes[1].booking["booking_id"] == outcomes[0].booking["booking_id"]
+    assert outcomes[2].booking["booking_id"] == outcomes[0].booking["booking_id"]
+    assert ledger.slot("1", "2025-01-02") == outcomes[4].booking["booking_id"]
+    assert len(ledger) == 2
+
+
+def test_journal_is_replayed_on_restart(tmp_path):
+    path = str(tmp_path / "bookings.jsonl")
+    journal = BookingJournal(path)
+    first = BookingLedger(journal).book_many([request(key="k1"), request(vehicle_id="2")])
+    journal.close()
+    with open(path, "a") as f:
+        f.write('{"booking_id": "BK-0')  # torn write from a crash
+
+    journal = BookingJournal(path)
+    ledger = BookingLedger(journal)
+    assert len(ledger) == 2
+    assert ledger.book_many([request(key="k1")])[0].booking == first[0].booking
+    assert ledger.book_many([request(vehicle_id="2")])[0].status == CONFLICT
+    assert ledger.book_many([request(vehicle_id="3")])[0].booking["booking_id"] == "BK-00003"
+    journal.close()
+
+
+def test_concurrent_appends_share_fsyncs(tmp_path):
+    journal = BookingJournal(str(tmp_path / "bookings.jsonl"), commit_delay=0.01)
+    ledger = BookingLedger(journal)
+    threads = [threading.Thread(target=ledger.book_many, args=([request(vehicle_id=str(i))],)) for i in range(40)]
+    with patch("servers.bookings.os.fsync") as fsync:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    assert journal.records == 40
+    assert fsync.call_count == journal.flushes < 40
+    journal.close()
+    assert len(journal.replay()) == 40
+
+
+def test_failed_flush_releases_the_slots(tmp_path):
+    journal = BookingJournal(str(tmp_path / "bookings.jsonl"))
+    ledger = BookingLedger(journal)
+    with patch("servers.bookings.os.fsync", side_effect=OSError("disk full")):
+        with pytest.raises(JournalError):
+            ledger.book_many([request(key="k1")])
+    assert ledger.slot("1", "2025-01-01") is None
+    assert ledger.book_many([request(key="k1")])[0].status == BOOKED
+    journal.close()
+
+
+@pytest.mark.asyncio
+async def test_book_endpoints(monkeypatch):
+    monkeypatch.setattr("servers.mock_api_server.BOOKINGS", BookingLedger())
+    booking = {"vehicle_id": "4", "customer_name": "Ann", "date": "2025-03-01"}
+    async with AsyncClient(transport=ASGITransport(app=mock_app), base_url="http://test") as ac:
+        first = await ac.post("/book", json=booking, headers={"Idempotency-Key": "abc"})
+        again = await ac.post("/book", json=booking, headers={"Idempotency-Key": "abc"})
+        taken = await ac.post("/book", json=dict(booking, customer_name="Bob"))
+        batch = await ac.post("/book/batch", json={"bookings": [
+            dict(booking, date="2025-03-02"), dict(booking, date="2025-03-02"), dict(booking, idempotency_key="abc"),
+        ]})
+
+    assert first.status_code == 200 and first.json()["message"] == "Vehicle booked for inspection successfully."
+    assert again.json()["booking_id"] == first.json()["booking_id"]
+    assert again.headers["Idempotent-Replayed"] == "true"
+    assert taken.status_code == 409
+    results = batch.json()["results"]
+    assert [r["status"] for r in results] == ["Success", "Conflict", "Success"]
+    assert results[2]["replayed"] and results[2]["booking_id"] == first.json()["booking_id"]
+
+    # A retried batch (same Idempotency-Key) replays instead of conflicting
+    async with AsyncClient(transport=ASGITransport(app=mock_app), base_url="http://test") as ac:
+        retried = [
+            await ac.post("/book/batch", json={"bookings": [dict(booking, date="2025-03-05")]}, headers={"Idempotency-Key": "b1"})
+            for _ in range(2)
+        ]
+    assert [r.json()["results"][0].get("replayed", False) for r in retried] == [False, True]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_bookings_are_batched(monkeypatch):
+    import asyncio
+
+    from servers.agent_server import BookingBatcher, book_appointment, booking_idempotency_key
+
+    sent, sent_headers = [], []
+
+    def fake_post(url, json=None, headers=None):
+        sent.append(json["bookings"])
+        sent_headers.append(headers or {})
+        return {"results": [{"status": "Success", "message": f"booked {b['vehicle_id']}"} for b in json["bookings"]]}
+
+    monkeypatch.setattr("servers.agent_server.upstream.post", fake_post)
+    monkeypatch.setattr("servers.agent_server.booking_batcher", BookingBatcher(window=0.2))
+    results = await asyncio.gather(*(book_appointment(str(i), "2025-01-01", "a@b.c") for i in range(5)))
+    assert len(sent) == 1 and len(sent[0]) == 5
+    assert results == [f"booked {i}" for i in range(5)]
+    assert len({b["idempotency_key"] for b in sent[0]}) == 5
+    assert "Idempotency-Key" in sent_headers[0]  # retried by the upstream client
+    # The same form submitted twice carries the same idempotency key
+    assert booking_idempotency_key("1", "2025-01-01", "A@b.c ") == booking_idempotency_key("1", "2025-01-01", "a@b.c")
+
+
+@pytest.mark.parametrize("reply", [{"results": [{"status": "Success"}]}, {"detail": "Internal error"}])
+def test_short_batch_replies_fail_every_booking(monkeypatch, reply):
+    from servers.agent_server import BookingBatcher
+
+    monkeypatch.setattr("servers.agent_server.upstream.post", lambda url, json=None, headers=None: reply)
+    batcher = BookingBatcher(window=0.2)
+    futures = [batcher._enqueue({"vehicle_id": str(i), "idempotency_key": str(i)}) for i in range(3)]
+    for future in futures:
+        # Resolved (with the error) rather than left waiting forever
+        assert future.exception(timeout=5) is not None
+
+
+@pytest.mark.asyncio
+async def test_concurrent_form_submits_through_chat_are_batched(monkeypatch):
+    import asyncio
+
+    from servers.agent_server import BookingBatcher
+    from servers.agent_server import app as agent_app
+
+    sent = []
+
+    def fake_post(url, json=None, headers=None):
+        sent.append(json["bookings"])
+        return {"results": [{"status": "Success", "message": f"booked {b['vehicle_id']}"} for b in json["bookings"]]}
+
+    monkeypatch.setattr("servers.agent_server.upstream.post", fake_post)
+    monkeypatch.setattr("servers.agent_server.booking_batcher", BookingBatcher(window=0.2))
+
+    def submit(i):
+        event = {"type": "formSubmit", "payload": {"carId": str(i), "date": "2025-01-01", "email": "a@b.c"}}
+        return ac.post("/chat", json={"query": "", "session_id": f"batch_{i}", "event": event})
+
+    async with AsyncClient(transport=ASGITransport(app=agent_app), base_url="http://test") as ac:
+        responses = await asyncio.gather(*(submit(i) for i in range(10)))
+
+    assert [r.json()["text"] for r in responses] == [f"booked {i}" for i in range(10)]
+    # The leader's wait does not block the loop, so the other submits join its batch
+    assert len(sent) == 1 and len(sent[0]) == 10
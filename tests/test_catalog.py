@@ -0,0 +1,185 @@
+import threading
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+from unittest.mock import patch, MagicMock
+
+from servers.catalog import Catalog, CatalogSubscriber
+from servers.resilience import UpstreamClient
+from servers.semantic_cache import SemanticCache
+from servers import agent_server
+from servers.mock_api_server import app as mock_app, CATALOG
+
+
+def vehicle(vehicle_id, make="Toyota", model="Camry", type="Sedan"):
+    return {"id": vehicle_id, "make": make, "model": model, "year": 2024, "price": 28000,
+            "color": "Silver", "type": type, "features": ["Reliable"]}
+
+
+def lock_is_free(lock) -> bool:
+    """Whether another thread can take `lock` right now."""
+    acquired = []
+
+    def probe():
+        if lock.acquire(timeout=1):
+            acquired.append(True)
+            lock.release()
+
+    thread = threading.Thread(target=probe)
+    thread.start()
+    thread.join()
+    return bool(acquired)
+
+
+def test_change_log_and_snapshot_fallback():
+    source = Catalog([vehicle("1")], max_log=2)
+    assert source.version == 0
+
+    source.upsert(vehicle("2", make="Honda", model="Civic"))
+    source.upsert(vehicle("1", model="Corolla"))
+    feed = source.changes_since(1, source.epoch)
+    assert feed["version"] == 2
+    assert feed["snapshot"] is None
+    assert [c["id"] for c in feed["changes"]] == ["1"]
+
+    source.delete("2")
+    assert source.delete("2") is None
+    # Version 1 fell out of the retained log, so a replica at 0 resyncs from a snapshot
+    behind = source.changes_since(0, source.epoch)
+    assert behind["changes"] == []
+    assert [v["id"] for v in behind["snapshot"]] == ["1"]
+    # So does a replica from another epoch
+    assert source.changes_since(3, "other")["snapshot"] is not None
+
+
+def test_replica_apply_reports_affected_records():
+    source = Catalog([vehicle("1"), vehicle("2", make="Honda")])
+    replica = Catalog([vehicle("1"), vehicle("2", make="Honda")], epoch="local")
+
+    # First sync: same contents, different epoch -> snapshot with nothing affected
+    assert replica.apply(source.changes_since(replica.version, replica.epoch)) == []
+    assert replica.epoch == source.epoch
+
+    source.upsert(vehicle("3", make="Kia", model="Telluride"))
+    source.delete("2")
+    affected = replica.apply(source.changes_since(replica.version, replica.epoch))
+    assert affected == [(None, vehicle("3", make="Kia", model="Telluride")), (vehicle("2", make="Honda"), None)]
+    assert replica.version == source.version
+    assert sorted(v["id"] for v in replica.all()) == ["1", "3"]
+
+
+def test_snapshot_is_diffed_outside_the_lock():
+    source = Catalog([vehicle("1"), vehicle("2", make="Honda")])
+    replica = Catalog([vehicle("1", model="Corolla")], epoch="local")
+    decode, probes = replica.all, []
+
+    def all_while_editing():
+        # Another thread can take the lock (searches go on) while the replica decodes
+        probes.append(lock_is_free(replica._lock))
+        if len(probes) == 1:
+            replica.upsert(vehicle("3", make="Kia"))  # an edit in between: the diff starts over
+        return decode()
+
+    replica.all = all_while_editing
+    affected = replica.apply(source.changes_since(replica.version, replica.epoch))
+    assert probes == [True, True]
+    assert {(old and old["id"], new and new["id"]) for old, new in affected} == {(None, "2"), ("1", "1"), ("3", None)}
+    assert decode() == source.all()
+
+
+@pytest.mark.asyncio
+async def test_subscriber_polls_and_notifies():
+    source = Catalog([vehicle("1")])
+    replica = Catalog([vehicle("1")], epoch="local")
+    seen = []
+    subscriber = CatalogSubscriber(replica, source.changes_since, seen.append)
+
+    assert await subscriber.poll_once() == []
+    source.upsert(vehicle("1", model="Corolla"))
+    await subscriber.poll_once()
+    assert seen == [[(vehicle("1"), vehicle("1", model="Corolla"))]]
+    assert replica.get("1")["model"] == "Corolla"
+
+
+@pytest.mark.asyncio
+async def test_mock_api_change_feed_and_etag():
+    async with AsyncClient(transport=ASGITransport(app=mock_app), base_url="http://test") as ac:
+        before = await ac.get("/search", params={"make": "Rivian"})
+        feed = (await ac.get("/changes", params={"since": 0})).json()
+        assert feed["snapshot"] is not None
+
+        created = await ac.put("/vehicles/r1", json={
+            "make": "Rivian", "model": "R1S", "year": 2025, "price": 76000,
+            "color": "Green", "type": "SUV", "features": ["Quad Motor"],
+        })
+        assert created.status_code == 200
+
+        changes = (await ac.get("/changes", params={"since": feed["version"], "epoch": feed["epoch"]})).json()
+        assert [(c["op"], c["id"]) for c in changes["changes"]] == [("upsert", "r1")]
+
+        # The catalog version is part of the ETag, so the old one no longer matches
+        after = await ac.get("/search", params={"make": "Rivian"}, headers={"If-None-Match": before.headers["etag"]})
+        assert after.status_code == 200
+        assert [v["id"] for v in after.json()] == ["r1"]
+
+        assert (await ac.delete("/vehicles/r1")).status_code == 200
+        assert (await ac.delete("/vehicles/r1")).status_code == 404
+    assert CATALOG.get("r1") is None
+
+
+def test_invalidation_drops_only_affected_entries(monkeypatch):
+    def respond(method, url, params=None, **kwargs):
+        response = MagicMock(status_code=200, headers={})
+        response.json.return_value = [params]
+        return response
+
+    client = UpstreamClient(sleep=lambda _: None)
+    with patch("servers.resilience.requests.request", side_effect=respond):
+        client.get("http://api/search", params={"make": "Toyota"})
+        client.get("http://api/search", params={"make": "Honda"})
+        client.get("http://api/compare", params={"vehicle1_id": "1", "vehicle2_id": "2"})
+        client.get("http://api/compare", params={"vehicle1_id": "5", "vehicle2_id": "6"})
+
+    cache = SemanticCache(threshold=0.99)
+    cache.store("is the camry reliable", "The Toyota Camry is very reliable.")
+    cache.store("which suv has the most cargo space", "The Honda CR-V has the most cargo space.")
+
+    agent = MagicMock(response_cache=cache)
+    monkeypatch.setattr(agent_server, "upstream", client)
+    monkeypatch.setattr(agent_server, "adk_agent", agent)
+
+    agent_server.invalidate_vehicles([(vehicle("1"), vehicle("1", model="Corolla"))])
+
+    remaining = {(url, tuple(sorted(params))) for _, url, params in client._stale}
+    assert remaining == {
+        ("http://api/search", (("make", "Honda"),)),
+        ("http://api/compare", (("vehicle1_id", "5"), ("vehicle2_id", "6"))),
+    }
+    assert cache.lookup("is the camry reliable") is None
+    assert cache.lookup("which suv has the most cargo space") is not None
+
+
+def test_compact_records_round_trip_and_share_strings():
+    import json
+    raw = json.loads(json.dumps([vehicle("1"), vehicle("2"), dict(vehicle("3"), badge="new")]))
+    catalog = Catalog(raw)
+
+    assert catalog.all() == raw
+    first, second, _ = catalog.records()
+    assert first.make is second.make
+    assert first.feature_ids == second.feature_ids
+    assert first.features == ["Reliable"]
+
+    # Results are copies; editing them leaves the catalog intact
+    result = catalog.get("1")
+    result["price"] = "$1"
+    result["features"].append("Edited")
+    assert catalog.get("1") == raw[0]
+
+
+def test_ui_transform_does_not_mutate_records():
+    record = vehicle("1")
+    row = agent_server.to_ui_vehicle(record)
+    assert row["price"] == "$28,000"
+    assert row["image"] == "assets/toyota_camry.jpg"
+    assert record == vehicle("1")
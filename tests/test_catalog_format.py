@@ -0,0 +1,108 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from servers.catalog import Catalog, open_catalog
+from servers.catalog_format import ColumnarCatalog, compile_catalog
+
+DATA_FILE = Path(__file__).resolve().parent.parent / "data" / "product_search.json"
+
+
+@pytest.fixture
+def vehicles():
+    with open(DATA_FILE) as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def compiled(vehicles, tmp_path):
+    path = tmp_path / "catalog.vcat"
+    compile_catalog(vehicles, str(path))
+    return str(path)
+
+
+def test_round_trip(vehicles, compiled):
+    columnar = ColumnarCatalog(compiled)
+    assert len(columnar) == len(vehicles)
+    assert [columnar.row(i) for i in range(len(columnar))] == vehicles
+    assert columnar.find("3") == 2
+    assert columnar.find("missing") is None
+
+
+def test_round_trip_edge_values(tmp_path):
+    vehicles = [
+        {"id": "b", "make": "Kia", "model": "EV6", "year": None, "price": 42000.5,
+         "color": "Green", "type": "SUV", "features": [], "badge": "new"},
+        {"id": "a", "make": "Kia", "model": "Niro", "year": 2023, "price": None,
+         "color": "Grey", "type": "SUV", "features": ["Hybrid Option"]},
+    ]
+    path = str(tmp_path / "edge.vcat")
+    compile_catalog(vehicles, path)
+    columnar = ColumnarCatalog(path)
+    assert [columnar.row(0), columnar.row(1)] == vehicles
+    assert columnar.find("a") == 1
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "not_a_catalog.vcat"
+    path.write_bytes(b"{}" * 16)
+    with pytest.raises(ValueError):
+        ColumnarCatalog(str(path))
+
+
+def test_mapped_catalog_matches_json_catalog(vehicles, compiled):
+    mapped = Catalog(base=ColumnarCatalog(compiled))
+    parsed = Catalog(vehicles)
+    assert mapped.all() == parsed.all()
+    assert len(mapped) == len(parsed)
+    for filters in [{}, {"make": "toyota"}, {"type": "SUV"}, {"make": "Honda", "model": "cr-v"}]:
+        assert mapped.filter(**filters) == parsed.filter(**filters)
+
+
+def test_edits_overlay_the_mapped_rows(vehicles, compiled):
+    catalog = Catalog(base=ColumnarCatalog(compiled))
+    camry = catalog.get("1")
+
+    catalog.upsert(dict(camry, price=1000))
+    catalog.upsert(dict(camry, id="new", model="Crown"))
+    assert catalog.delete("2") is not None
+    assert catalog.delete("2") is None
+
+    assert catalog.get("1")["price"] == 1000
+    assert catalog.get("2") is None
+    assert len(catalog) == len(vehicles)  # one added, one deleted
+    assert [v["id"] for v in catalog.filter(make="Toyota")] == ["5", "1", "new"]
+    assert sorted(catalog.ids()) == sorted([v["id"] for v in vehicles if v["id"] != "2"] + ["new"])
+    assert [v["id"] for v in catalog.filter(make="Toyota", limit=2)] == ["5", "1"]
+    assert "Crown" in catalog.values("model") and "Toyota" in catalog.values("make")
+
+    # A replica of the same file catches up through the change feed
+    replica = Catalog(base=ColumnarCatalog(compiled), epoch="local")
+    affected = replica.apply(catalog.changes_since(0, "local"))
+    assert {(old and old["id"], new and new["id"]) for old, new in affected} == {
+        (None, "new"), ("1", "1"), ("2", None),
+    }
+    assert replica.all() == catalog.all()
+
+    # Seeded with the file's epoch, a replica catches up from the log without a snapshot
+    seeded = Catalog(base=ColumnarCatalog(compiled), epoch=catalog.base_epoch)
+    feed = catalog.changes_since(0, seeded.epoch)
+    assert feed["snapshot"] is None and len(feed["changes"]) == 3
+    seeded.apply(feed)
+    assert seeded.all() == catalog.all() and seeded.epoch == catalog.epoch
+
+
+def test_open_catalog_prefers_fresh_binary(compiled, tmp_path):
+    source = tmp_path / "catalog.json"
+    source.write_text(json.dumps([{"id": "x", "make": "Ford", "model": "Ka", "year": 2010,
+                                   "price": 5000, "color": "Red", "type": "Hatchback", "features": []}]))
+    os.utime(compiled, (os.path.getmtime(source) + 10,) * 2)
+    assert open_catalog(source, compiled).get("1") is not None
+
+    # A binary older than its source is ignored
+    os.utime(compiled, (os.path.getmtime(source) - 10,) * 2)
+    stale = open_catalog(source, compiled)
+    assert stale.get("1") is None and stale.get("x") is not None
+    assert open_catalog(source, None).get("x") is not None
@@ -0,0 +1,99 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from google.genai.types import Content, FunctionCall, FunctionResponse, GenerateContentResponseUsageMetadata, Part
+
+from agent_app.history import SUMMARY_PREFIX, compact_history, compact_history_callback, estimate_tokens
+
+VEHICLES = [
+    {"id": str(i), "make": "Toyota", "model": f"Model {i}", "year": 2024, "price": 28000 + i,
+     "features": ["Reliable", "Fuel Efficient", "Safety Sense"]}
+    for i in range(20)
+]
+
+
+def turn(question, answer, tool_result=None):
+    contents = [Content(role="user", parts=[Part(text=question)])]
+    if tool_result is not None:
+        contents.append(Content(role="model", parts=[Part(function_call=FunctionCall(name="search_vehicles_tool", args={}))]))
+        contents.append(Content(role="user", parts=[Part(function_response=FunctionResponse(name="search_vehicles_tool", response={"result": tool_result}))]))
+    contents.append(Content(role="model", parts=[Part(text=answer)]))
+    return contents
+
+
+def test_bulky_payloads_of_earlier_turns_are_compacted():
+    surface = json.dumps({"action": "beginRendering", "surfaceId": "s1", "surfaceType": "table", "data": {"rows": VEHICLES}})
+    contents = turn("find toyotas", surface, VEHICLES) + turn("and now?", "ok", VEHICLES)[:3]
+
+    compacted, stats = compact_history(contents, budget=100000)
+    assert stats["compacted_parts"] == 2
+    old_result = compacted[2].parts[0].function_response.response
+    assert old_result["compacted"] and old_result["summary"].startswith("20 vehicle(s): Toyota Model 0 (id 0)")
+    assert compacted[3].parts[0].text.startswith("[A2UI table surface s1: 20 vehicle(s)")
+    # The current turn's tool result is what the model is answering from: left intact
+    assert compacted[-1].parts[0].function_response.response == {"result": VEHICLES}
+    assert stats["tokens_after"] < stats["tokens_before"]
+    # The input is not modified
+    assert contents[2].parts[0].function_response.response == {"result": VEHICLES}
+
+
+def test_old_turns_are_summarized_past_the_budget():
+    contents = []
+    for i in range(30):
+        contents += turn(f"question {i} " + "details " * 40, f"answer {i} " + "words " * 60)
+
+    compacted, stats = compact_history(contents, budget=1500, keep_turns=4)
+    assert stats["summarized_turns"] == 26
+    assert compacted[0].parts[0].text.startswith(SUMMARY_PREFIX)
+    assert "- User: question 25" in compacted[0].parts[0].text
+    assert compacted[1:] == contents[-8:]
+    assert stats["tokens_after"] <= 1500
+
+    # Under budget: nothing changes
+    short, stats = compact_history(contents[-4:], budget=1500)
+    assert short == contents[-4:] and stats["summarized_turns"] == 0
+
+
+def test_compaction_keeps_prompt_size_flat():
+    sizes = []
+    contents = []
+    for i in range(40):
+        contents += turn(f"find cars {i}", "Here you go. " * 20, VEHICLES)
+        sizes.append(estimate_tokens(compact_history(contents, budget=3000)[0]))
+    assert max(sizes[10:]) <= 3000
+    assert estimate_tokens(contents) > 10 * 3000
+
+
+def test_callback_rewrites_request_contents():
+    request = MagicMock()
+    request.contents = turn("find toyotas", "done", VEHICLES) + turn("thanks", "welcome")
+    context = MagicMock(agent_name="ProductSearchAgent")
+    assert compact_history_callback(context, request) is None
+    assert request.contents[2].parts[0].function_response.response["compacted"]
+
+
+@pytest.mark.asyncio
+async def test_prompt_tokens_are_reported():
+    from servers.agent_server import ADKAgent, METRICS
+    from agent_app.agent import root_agent
+
+    agent = ADKAgent(adk_agent=root_agent, app_name="tokens_test")
+
+    async def fake_run_async(**kwargs):
+        for author, tokens in [("RootAgent", 900), ("IntentAgent", 1100)]:
+            event = MagicMock(author=author)
+            event.content = Content(role="model", parts=[Part(text="hi")])
+            event.usage_metadata = GenerateContentResponseUsageMetadata(
+                prompt_token_count=tokens, cached_content_token_count=tokens // 2
+            )
+            yield event
+
+    agent.runner = MagicMock()
+    agent.runner.run_async = MagicMock(side_effect=fake_run_async)
+    await agent.process_message("tell me a joke about cars", "tokens_sess")
+
+    rendered = METRICS.render()
+    assert 'agent_prompt_tokens_count{agent="IntentAgent"}' in rendered
+    assert "agent_turn_prompt_tokens_sum 2000" in rendered
+    assert 'agent_cached_prompt_tokens_total{agent="IntentAgent"} 550' in rendered
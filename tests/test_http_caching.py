@@ -0,0 +1,118 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from httpx import AsyncClient, ASGITransport
+from unittest.mock import patch, MagicMock
+
+from servers.http_caching import CompressionMiddleware, etag_matches, make_etag, negotiate_encoding
+from servers.mock_api_server import app as mock_app
+from servers.resilience import UpstreamClient
+
+
+def make_app():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+    @app.get("/small")
+    async def small():
+        return PlainTextResponse("x" * 10)
+
+    @app.get("/large")
+    async def large():
+        return PlainTextResponse("x" * 1000, headers={"ETag": '"abc"'})
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for i in range(3):
+                yield f"chunk-{i}\n".encode()
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    return app
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding("gzip, deflate") == "gzip"
+    assert negotiate_encoding("gzip;q=0") is None
+    assert negotiate_encoding("identity") is None
+
+
+def test_etag_matching():
+    etag = make_etag("v1", "/search", [("make", "Toyota")])
+    assert etag == make_etag("v1", "/search", [("make", "Toyota")])
+    assert etag != make_etag("v2", "/search", [("make", "Toyota")])
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert not etag_matches('"other"', etag)
+
+
+@pytest.mark.asyncio
+async def test_compression_threshold_and_streaming():
+    async with AsyncClient(transport=ASGITransport(app=make_app()), base_url="http://test") as ac:
+        small = await ac.get("/small", headers={"Accept-Encoding": "gzip"})
+        large = await ac.get("/large", headers={"Accept-Encoding": "gzip"})
+        plain = await ac.get("/large", headers={"Accept-Encoding": "identity"})
+        stream = await ac.get("/stream", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in small.headers
+    assert large.headers["content-encoding"] == "gzip"
+    assert large.headers["etag"] == 'W/"abc"'
+    assert "Accept-Encoding" in large.headers["vary"]
+    assert large.text == "x" * 1000  # httpx decodes transparently
+    assert "content-encoding" not in plain.headers
+    assert stream.headers["content-encoding"] == "gzip"
+    assert stream.text == "chunk-0\nchunk-1\nchunk-2\n"
+
+
+@pytest.mark.asyncio
+async def test_mock_api_etag_revalidation():
+    async with AsyncClient(transport=ASGITransport(app=mock_app), base_url="http://test") as ac:
+        first = await ac.get("/search", params={"make": "Toyota"})
+        etag = first.headers["etag"]
+        second = await ac.get("/search", params={"make": "Toyota"}, headers={"If-None-Match": etag})
+        other = await ac.get("/search", params={"make": "Honda"}, headers={"If-None-Match": etag})
+        compare = await ac.get("/compare", params={"vehicle1_id": "1", "vehicle2_id": "2"})
+        compare_again = await ac.get(
+            "/compare", params={"vehicle1_id": "1", "vehicle2_id": "2"},
+            headers={"If-None-Match": compare.headers["etag"]},
+        )
+
+    assert first.status_code == 200
+    assert second.status_code == 304
+    assert second.content == b""
+    assert other.status_code == 200
+    assert compare_again.status_code == 304
+
+
+def test_upstream_client_reuses_body_on_304():
+    body = [{"id": "1", "make": "Toyota"}]
+    ok = MagicMock(status_code=200, headers={"ETag": '"v1"'})
+    ok.json.return_value = body
+    not_modified = MagicMock(status_code=304, headers={"ETag": '"v1"'})
+
+    client = UpstreamClient(sleep=lambda _: None)
+    with patch("servers.resilience.requests.request", side_effect=[ok, not_modified]) as request:
+        assert client.get("http://api/search", params={"make": "Toyota"}) == body
+        assert client.get("http://api/search", params={"make": "Toyota"}) == body
+
+    assert "If-None-Match" not in request.call_args_list[0].kwargs["headers"]
+    assert request.call_args_list[1].kwargs["headers"]["If-None-Match"] == '"v1"'
+    not_modified.json.assert_not_called()
+    assert client.snapshot()["not_modified"] == 1
+
+
+def test_upstream_client_cache_is_bounded():
+    def respond(method, url, params=None, **kwargs):
+        response = MagicMock(status_code=200, headers={"ETag": f'"{params["q"]}"'})
+        response.json.return_value = params["q"]
+        return response
+
+    client = UpstreamClient(sleep=lambda _: None, max_cached=2)
+    with patch("servers.resilience.requests.request", side_effect=respond) as request:
+        for q in ("a", "b", "a", "c"):
+            client.get("http://api/search", params={"q": q})
+        client.get("http://api/search", params={"q": "b"})
+
+    # "b" was least recently used when "c" came in: no ETag left to revalidate it with
+    assert len(client._stale) == len(client._etags) == 2
+    assert "If-None-Match" not in request.call_args_list[-1].kwargs["headers"]
@@ -0,0 +1,54 @@
+import json
+import pytest
+from httpx import AsyncClient, ASGITransport
+from servers import json_codec
+from servers.agent_server import app, render_chat_response
+
+
+def test_encoders_produce_equivalent_json():
+    payload = {"rows": [{"make": "Škoda", "price": 28000.5, "features": ["A", "B"]}], "ok": True, "none": None}
+    for name in json_codec.ENCODERS:
+        assert json.loads(json_codec.get_encoder(name)(payload)) == payload
+
+
+def test_unknown_encoder_falls_back_to_stdlib():
+    assert json_codec.get_encoder("missing")({"a": 1}) == b'{"a":1}'
+
+
+def test_register_custom_encoder():
+    json_codec.register_encoder("upper", lambda obj: json.dumps(obj).upper().encode())
+    try:
+        assert json_codec.get_encoder("upper")({"a": "b"}) == b'{"A": "B"}'
+    finally:
+        del json_codec.ENCODERS["upper"]
+
+
+def test_render_chat_response_formats():
+    a2ui_msg = {"action": "beginRendering", "surfaceId": "s1", "surfaceType": "table", "data": {"rows": []}}
+    response = {"text": "", "data": a2ui_msg}
+
+    compat = json.loads(render_chat_response(response, "compat").body)
+    assert compat["data"] is None
+    assert json.loads(compat["text"]) == a2ui_msg
+
+    structured = json.loads(render_chat_response(response, "structured").body)
+    assert structured == {"text": "", "data": a2ui_msg}
+
+    # Plain text turns look the same in both formats
+    text_only = {"text": "Hello!", "data": None}
+    assert json.loads(render_chat_response(text_only, "structured").body) == text_only
+    assert json.loads(render_chat_response(text_only, "compat").body) == text_only
+
+
+@pytest.mark.asyncio
+async def test_chat_structured_response(mock_api_server, monkeypatch):
+    monkeypatch.setattr("servers.agent_server.MOCK_API_URL", mock_api_server)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        payload = {"query": "Find Honda cars", "session_id": "structured_sess", "response_format": "structured"}
+        response = await ac.post("/chat", json=payload)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    data = response.json()
+    assert data["text"] == ""
+    assert data["data"]["surfaceType"] == "table"
+    assert all(row["make"] == "Honda" for row in data["data"]["data"]["rows"])
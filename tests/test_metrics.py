@@ -0,0 +1,87 @@
+import threading
+import pytest
+from httpx import AsyncClient, ASGITransport
+from servers.metrics import Registry
+
+
+def test_counter_sums_across_threads():
+    registry = Registry()
+    counter = registry.counter("jobs_total", "Jobs.", ["kind"])
+
+    def work():
+        for _ in range(1000):
+            counter.labels("a").inc()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert counter.labels("a").value == 4000
+    assert 'jobs_total{kind="a"} 4000' in registry.render()
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "Latency.", ["route"], buckets=(0.25, 1.0))
+    for value in (0.25, 0.5, 0.5, 2.0):
+        histogram.labels("/search").observe(value)
+
+    text = registry.render()
+    assert 'latency_seconds_bucket{route="/search",le="0.25"} 1' in text
+    assert 'latency_seconds_bucket{route="/search",le="1.0"} 3' in text
+    assert 'latency_seconds_bucket{route="/search",le="+Inf"} 4' in text
+    assert 'latency_seconds_count{route="/search"} 4' in text
+    assert 'latency_seconds_sum{route="/search"} 3.25' in text
+
+
+def test_histogram_timer_decorates_functions():
+    registry = Registry()
+    histogram = registry.histogram("tool_seconds", "Tool latency.", ["tool"])
+
+    @histogram.labels("noop").time()
+    def noop():
+        return 42
+
+    assert noop() == 42
+    assert histogram.labels("noop").snapshot()[2] == 1
+
+
+def test_gauge_and_label_validation():
+    registry = Registry()
+    gauge = registry.gauge("sessions", "Sessions.")
+    gauge.set_function(lambda: 3)
+    assert "sessions 3" in registry.render()
+
+    counter = registry.counter("events_total", "Events.", ["type"])
+    with pytest.raises(ValueError):
+        counter.labels("a", "b")
+    with pytest.raises(ValueError):
+        registry.counter("events_total", "Duplicate.")
+
+
+@pytest.mark.asyncio
+async def test_mock_api_metrics_endpoint():
+    from servers.mock_api_server import app
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        await ac.get("/search", params={"make": "Toyota"})
+        response = await ac.get("/metrics")
+    assert response.status_code == 200
+    assert 'http_requests_total{method="GET",route="/search",status="200"}' in response.text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/search",le="+Inf"}' in response.text
+
+
+@pytest.mark.asyncio
+async def test_agent_server_metrics_endpoint():
+    from servers.agent_server import app
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        payload = {"query": "", "session_id": "metrics_sess", "event": {"type": "rowSelect", "payload": {"carId": "1"}}}
+        await ac.post("/chat", json=payload)
+        response = await ac.get("/metrics")
+    assert response.status_code == 200
+    text = response.text
+    assert 'agent_intent_duration_seconds_count{intent="event"}' in text
+    assert 'http_requests_total{method="POST",route="/chat",status="200"}' in text
+    assert "agent_sessions " in text
+    assert 'agent_cache_hit_ratio{cache="semantic"}' in text
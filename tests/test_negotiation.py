@@ -0,0 +1,106 @@
+import json
+import threading
+from pathlib import Path
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+
+from servers.mock_api_server import app as mock_app
+from servers.negotiation import ACCEPTED, COUNTERED, MAX_ROUNDS, NOT_FOUND, REJECTED, NegotiationEngine, floor_price
+from servers.shared_state import MemoryStore, SQLiteStore
+
+DATA_FILE = Path(__file__).resolve().parent.parent / "data" / "product_search.json"
+
+
+@pytest.fixture
+def vehicles():
+    with open(DATA_FILE) as f:
+        return {v["id"]: v for v in json.load(f)}
+
+
+def test_dealer_concedes_toward_the_floor(vehicles):
+    engine = NegotiationEngine(vehicles.get, MemoryStore())
+    floor = floor_price("1", 28000)
+    assert 28000 * 0.88 <= floor <= 28000 * 0.96
+
+    assert engine.negotiate("1", 10000, "s")["status"] == REJECTED
+    asks = [engine.negotiate("1", floor - 1000, "s")["counter_price"] for _ in range(MAX_ROUNDS - 2)]
+    assert asks == sorted(asks, reverse=True) and min(asks) >= floor
+    final = engine.negotiate("1", floor - 1000, "s")
+    assert final["round"] == MAX_ROUNDS and final["counter_price"] == floor and "Final offer" in final["message"]
+
+    # Another session starts over; a one-off offer is always a first round
+    other = engine.negotiate("1", floor - 1000, "other")
+    assert other["round"] == 1 and other["counter_price"] > asks[-1]
+    assert engine.negotiate("1", floor - 1000) == other
+
+
+def test_accepted_deal_is_kept(vehicles):
+    engine = NegotiationEngine(vehicles.get, MemoryStore())
+    deal = engine.negotiate("1", 27900, "s")
+    assert deal["status"] == ACCEPTED and deal["final_price"] == 27900 and deal["savings"] == 100
+    again = engine.negotiate("1", 20000, "s")
+    assert again["status"] == ACCEPTED and again["final_price"] == 27900
+    assert engine.negotiate("nope", 1000, "s")["status"] == NOT_FOUND
+
+
+def test_batch_matches_one_by_one(vehicles):
+    offers = [
+        {"vehicle_id": vid, "offer_price": vehicles[vid]["price"] * share, "session_id": f"s{n % 3}"}
+        for n, (vid, share) in enumerate((vid, share) for share in (0.8, 0.9, 0.93, 0.95, 0.97) for vid in vehicles)
+    ]
+    batched = NegotiationEngine(vehicles.get, MemoryStore()).negotiate_many(offers)
+    single = NegotiationEngine(vehicles.get, MemoryStore())
+    assert batched == [single.negotiate(o["vehicle_id"], o["offer_price"], o["session_id"]) for o in offers]
+    assert {r["status"] for r in batched} == {ACCEPTED, COUNTERED, REJECTED}
+
+
+def test_session_state_survives_restart(vehicles, tmp_path):
+    path = str(tmp_path / "state.db")
+    first = NegotiationEngine(vehicles.get, SQLiteStore(path)).negotiate("1", 25000, "s")
+    second = NegotiationEngine(vehicles.get, SQLiteStore(path)).negotiate("1", 25000, "s")
+    assert second["round"] == 2 and second["counter_price"] < first["counter_price"]
+
+
+def test_workers_sharing_a_store_do_not_lose_rounds(vehicles, tmp_path):
+    path = str(tmp_path / "state.db")
+    workers = [NegotiationEngine(vehicles.get, SQLiteStore(path)) for _ in range(2)]
+
+    def lowball(engine):
+        for _ in range(20):
+            engine.negotiate("1", 1000, "s")
+
+    threads = [threading.Thread(target=lowball, args=(engine,)) for engine in workers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert workers[0].negotiate("1", 1000, "s")["round"] == 41
+
+
+@pytest.mark.asyncio
+async def test_negotiate_batch_endpoint():
+    offers = [{"vehicle_id": "1", "offer_price": 27950}, {"vehicle_id": "3", "offer_price": 100}, {"vehicle_id": "v1", "offer_price": 1}]
+    async with AsyncClient(transport=ASGITransport(app=mock_app), base_url="http://test") as ac:
+        response = await ac.post("/negotiate/batch", json={"offers": offers})
+        invalid = await ac.post("/negotiate", json={"vehicle_id": "1", "offer_price": -5})
+    assert [r["status"] for r in response.json()["results"]] == [ACCEPTED, REJECTED, NOT_FOUND]
+    assert invalid.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_negotiate_endpoint_runs_off_the_event_loop(monkeypatch):
+    from servers import mock_api_server
+
+    threads = []
+    negotiate_many = mock_api_server.NEGOTIATIONS.negotiate_many
+
+    def record_thread(offers):
+        threads.append(threading.current_thread())
+        return negotiate_many(offers)
+
+    monkeypatch.setattr(mock_api_server.NEGOTIATIONS, "negotiate_many", record_thread)
+    async with AsyncClient(transport=ASGITransport(app=mock_app), base_url="http://test") as ac:
+        response = await ac.post("/negotiate", json={"vehicle_id": "1", "offer_price": 27950})
+    assert response.json()["status"] == ACCEPTED
+    assert threads and threads[0] is not threading.current_thread()
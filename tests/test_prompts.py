@@ -0,0 +1,62 @@
+import json
+from unittest.mock import MagicMock
+
+from google.genai.types import FunctionDeclaration, GenerateContentConfig, Tool
+
+from agent_app.prompts import (
+    AGENT_INSTRUCTIONS, CATALOG_FILE, SHARED_PREFIX, SUMMARY_FACETS, catalog_summary, file_facets, prefix_hash, static_instruction,
+)
+from servers.catalog import Catalog
+from servers.catalog_format import ColumnarCatalog, compile_catalog
+
+
+def request(system_instruction, tools=()):
+    llm_request = MagicMock(model="gemini-2.0-flash")
+    llm_request.config = GenerateContentConfig(
+        system_instruction=system_instruction,
+        tools=[Tool(function_declarations=[FunctionDeclaration(name=name, description=name)]) for name in tools],
+    )
+    return llm_request
+
+
+def test_instructions_share_a_stable_prefix():
+    search, book = static_instruction("ProductSearchAgent"), static_instruction("ProductBookAgent")
+    assert search.startswith(SHARED_PREFIX) and book.startswith(SHARED_PREFIX)
+    assert search.endswith(AGENT_INSTRUCTIONS["ProductSearchAgent"])
+    # Same text for every call: nothing per-request (dates, session state) is templated in
+    assert search == static_instruction("ProductSearchAgent")
+    assert "{" not in search
+
+
+def facets(catalog):
+    return catalog.facets(fields=SUMMARY_FACETS, price_buckets=1)
+
+
+def test_catalog_summary_is_deterministic(tmp_path):
+    vehicles = [
+        {"id": "1", "make": "Toyota", "model": "Camry", "type": "Sedan", "price": 28000},
+        {"id": "2", "make": "Honda", "model": "CR-V", "type": "SUV", "price": 31000},
+    ]
+    summary = catalog_summary(facets(Catalog(vehicles)))
+    assert summary == "Catalog summary: 2 vehicles. Makes: Honda, Toyota. Body types: SUV, Sedan. Prices from $28,000 to $31,000."
+    assert catalog_summary(facets(Catalog(vehicles[::-1]))) == summary
+    assert "unavailable" in catalog_summary(facets(Catalog()))
+    # Outside the agent server the same summary comes from the JSON file
+    path = tmp_path / "catalog.json"
+    path.write_text(json.dumps(vehicles))
+    assert catalog_summary(file_facets(path)) == summary
+
+
+def test_catalog_summary_uses_the_mapped_catalog(tmp_path):
+    compiled = str(tmp_path / "catalog.bin")
+    compile_catalog(json.loads(CATALOG_FILE.read_text()), compiled)
+    summary = catalog_summary(facets(Catalog(base=ColumnarCatalog(compiled))))
+    assert summary == catalog_summary(facets(Catalog.from_file(CATALOG_FILE))) == catalog_summary(file_facets())
+
+
+def test_prefix_hash_covers_instruction_and_tools():
+    instruction = static_instruction("ProductSearchAgent")
+    digest = prefix_hash(request(instruction, ["search_vehicles_tool"]))
+    assert digest == prefix_hash(request(instruction, ["search_vehicles_tool"]))
+    assert digest != prefix_hash(request(instruction, ["search_vehicles_tool", "find_similar_vehicles_tool"]))
+    assert digest != prefix_hash(request(instruction + " ", ["search_vehicles_tool"]))
@@ -0,0 +1,168 @@
+import pytest
+import requests
+from unittest.mock import patch, MagicMock
+from servers.resilience import CircuitBreaker, RetryBudget, UpstreamClient, UpstreamUnavailable
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def ok_response(body):
+    response = MagicMock()
+    response.status_code = 200
+    response.json.return_value = body
+    response.raise_for_status.return_value = None
+    return response
+
+
+def test_breaker_opens_and_half_opens():
+    clock = FakeClock()
+    breaker = CircuitBreaker("search", failure_threshold=2, reset_timeout=10, clock=clock)
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    clock.now = 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only one probe at a time while half-open
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_failed_probe_reopens():
+    clock = FakeClock()
+    breaker = CircuitBreaker("search", failure_threshold=1, reset_timeout=5, clock=clock)
+    breaker.record_failure()
+    clock.now = 5
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.snapshot()["retry_in_seconds"] == 5
+
+
+def test_retry_budget_bounds_retries():
+    budget = RetryBudget(ratio=0.5, min_tokens=1, max_tokens=2)
+    assert budget.try_withdraw()
+    assert not budget.try_withdraw()
+    budget.deposit()
+    budget.deposit()
+    assert budget.try_withdraw()
+
+
+def test_client_stops_calling_dead_upstream_and_serves_stale():
+    clock = FakeClock()
+    client = UpstreamClient(max_retries=1, failure_threshold=2, reset_timeout=30, clock=clock, sleep=lambda s: None)
+    url = "http://upstream/search"
+
+    with patch("servers.resilience.requests.request") as mock_request:
+        mock_request.return_value = ok_response([{"id": "1"}])
+        assert client.get(url, params={"make": "Toyota"}) == [{"id": "1"}]
+
+        mock_request.reset_mock()
+        mock_request.side_effect = requests.ConnectionError("refused")
+        # Two failed attempts (1 try + 1 retry) open the breaker; stale data is served
+        assert client.get(url, params={"make": "Toyota"}) == [{"id": "1"}]
+        assert mock_request.call_count == 2
+        assert client.breaker(f"GET {url}").state == CircuitBreaker.OPEN
+
+        # While open the upstream is not contacted at all
+        mock_request.reset_mock()
+        assert client.get(url, params={"make": "Toyota"}) == [{"id": "1"}]
+        with pytest.raises(UpstreamUnavailable):
+            client.get(url, params={"make": "Kia"})
+        assert mock_request.call_count == 0
+
+        # After the reset timeout a probe goes through and closes the breaker
+        clock.now = 30
+        mock_request.side_effect = None
+        mock_request.return_value = ok_response([{"id": "2"}])
+        assert client.get(url, params={"make": "Kia"}) == [{"id": "2"}]
+        assert client.breaker(f"GET {url}").state == CircuitBreaker.CLOSED
+
+    assert client.snapshot()["stale_served"] == 2
+
+
+def test_counters_are_not_lost_under_concurrency():
+    import threading
+
+    client = UpstreamClient(failure_threshold=1, reset_timeout=3600, sleep=lambda s: None)
+    url = "http://upstream/search"
+    with patch("servers.resilience.requests.request") as mock_request:
+        mock_request.return_value = ok_response([{"id": "1"}])
+        client.get(url)
+        mock_request.side_effect = requests.ConnectionError("refused")
+        client.get(url)  # opens the breaker: from now on every call is served stale
+
+        def serve_stale():
+            for _ in range(500):
+                client.get(url)
+
+        threads = [threading.Thread(target=serve_stale) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    snapshot = client.snapshot()
+    assert snapshot["stale_served"] == 1 + 8 * 500
+    assert snapshot["circuits"][f"GET {url}"]["total_rejections"] == 8 * 500
+
+
+def test_uncacheable_get_is_retried_but_never_served_stale():
+    client = UpstreamClient(max_retries=1, failure_threshold=2, sleep=lambda s: None)
+    url = "http://upstream/changes"
+
+    with patch("servers.resilience.requests.request") as mock_request:
+        mock_request.return_value = ok_response({"changes": []})
+        assert client.get(url, params={"since": 0}, cacheable=False) == {"changes": []}
+        assert not client._stale
+
+        mock_request.side_effect = requests.ConnectionError("refused")
+        with pytest.raises(UpstreamUnavailable):
+            client.get(url, params={"since": 0}, cacheable=False)
+        assert mock_request.call_count == 3  # first call, then 1 try + 1 retry
+        with pytest.raises(UpstreamUnavailable):
+            client.get(url, params={"since": 0}, cacheable=False)  # circuit open
+    assert client.snapshot()["stale_served"] == 0
+
+
+def test_client_does_not_retry_posts_or_client_errors():
+    client = UpstreamClient(max_retries=3, sleep=lambda s: None)
+
+    with patch("servers.resilience.requests.request") as mock_request:
+        mock_request.side_effect = requests.ConnectionError("refused")
+        with pytest.raises(UpstreamUnavailable):
+            client.post("http://upstream/book", json={"vehicle_id": "1"})
+        assert mock_request.call_count == 1
+
+        mock_request.reset_mock()
+        mock_request.side_effect = None
+        not_found = MagicMock()
+        not_found.status_code = 404
+        not_found.raise_for_status.side_effect = requests.HTTPError(response=not_found)
+        mock_request.return_value = not_found
+        with pytest.raises(requests.HTTPError):
+            client.get("http://upstream/compare")
+        assert mock_request.call_count == 1
+        assert client.breaker("GET http://upstream/compare").state == CircuitBreaker.CLOSED
+
+
+def test_client_retries_posts_with_an_idempotency_key():
+    client = UpstreamClient(max_retries=2, sleep=lambda s: None)
+    ok = MagicMock(status_code=200)
+    ok.json.return_value = {"status": "Success"}
+    with patch("servers.resilience.requests.request") as mock_request:
+        mock_request.side_effect = [requests.ConnectionError("reset"), ok]
+        assert client.post("http://upstream/book", json={}, headers={"Idempotency-Key": "k"}) == {"status": "Success"}
+    assert mock_request.call_count == 2
+    assert mock_request.call_args.kwargs["headers"]["Idempotency-Key"] == "k"
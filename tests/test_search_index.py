@@ -0,0 +1,156 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+from httpx import AsyncClient, ASGITransport
+
+from servers.catalog import Catalog
+from servers.catalog_format import ColumnarCatalog, compile_catalog
+from servers.mock_api_server import app as mock_app
+from servers.search_index import edit_distance, histogram, text_matches
+
+DATA_FILE = Path(__file__).resolve().parent.parent / "data" / "product_search.json"
+
+
+@pytest.fixture
+def vehicles():
+    with open(DATA_FILE) as f:
+        return json.load(f)
+
+
+def models(results):
+    return [v["model"] for v in results]
+
+
+def test_edit_distance():
+    assert edit_distance("toyta", "toyota", 1) == 1
+    assert edit_distance("telsa", "tesla", 1) == 1  # transposition
+    assert edit_distance("honda", "hyundai", 1) == 2  # gave up past the limit
+
+
+def test_ranked_full_text_search(vehicles):
+    catalog = Catalog(vehicles)
+    assert models(catalog.search("fuel efficient sedan with advanced tech"))[:2] == ["Camry", "Accord"]
+    assert {v["make"] for v in catalog.search("Find Toyota cars")} == {"Toyota"}
+    assert models(catalog.search("show me a red suv"))[0] == "CR-V"
+    assert models(catalog.search("sedan", make="toyota")) == ["Camry"]
+    assert len(catalog.search("suv", limit=2)) == 2
+    # No searchable words: the caller should not filter at all
+    assert catalog.search("find me some cars") is None
+    assert catalog.search("zeppelin") == []
+
+
+def test_typo_tolerance(vehicles):
+    catalog = Catalog(vehicles)
+    assert {v["make"] for v in catalog.search("toyta")} == {"Toyota"}
+    assert models(catalog.search("telsa")) == ["Model 3"]
+    assert models(catalog.search("mercedez")) == ["C-Class"]
+    # Short words are never fuzzy-matched
+    assert catalog.search("bmx") == []
+
+
+def test_edits_after_index_build_are_searchable(vehicles):
+    catalog = Catalog(vehicles)
+    catalog.search("toyota")  # builds the index
+
+    catalog.upsert({"id": "r1", "make": "Rivian", "model": "R1S", "year": 2025, "price": 76000,
+                    "color": "Green", "type": "SUV", "features": ["Quad Motor", "Fuel Efficient"]})
+    catalog.upsert(dict(vehicles[0], model="Corolla"))
+    catalog.delete("5")
+
+    assert models(catalog.search("rivian")) == ["R1S"]
+    assert models(catalog.search("toyota")) == ["Corolla"]
+    assert "R1S" in models(catalog.search("fuel efficient"))
+    assert models(catalog.search("camry")) == []
+
+
+def test_mapped_catalog_search_matches(vehicles, tmp_path):
+    path = str(tmp_path / "catalog.vcat")
+    compile_catalog(vehicles, path)
+    mapped, parsed = Catalog(base=ColumnarCatalog(path)), Catalog(vehicles)
+    for query in ["fuel efficient sedan", "toyta suv", "white tesla", "family friendly"]:
+        assert mapped.search(query) == parsed.search(query)
+
+    mapped.delete("1")
+    mapped.upsert(dict(vehicles[1], id="2b", color="White"))
+    assert "1" not in [v["id"] for v in mapped.search("camry toyota")]
+    assert "2b" in [v["id"] for v in mapped.search("white honda")]
+
+
+def test_text_matches():
+    assert text_matches("find a toyta", ["Toyota", "Camry"])
+    assert not text_matches("find a honda", ["Toyota", "Camry"])
+
+
+@pytest.mark.asyncio
+async def test_search_endpoint_query():
+    async with AsyncClient(transport=ASGITransport(app=mock_app), base_url="http://test") as ac:
+        ranked = await ac.get("/search", params={"q": "fuel efficient sedan with advanced tech", "limit": 2})
+        everything = await ac.get("/search", params={"q": "find cars"})
+        bad_limit = await ac.get("/search", params={"q": "suv", "limit": 0})
+    assert ranked.status_code == 200
+    assert models(ranked.json()) == ["Camry", "Accord"]
+    assert len(everything.json()) == 10
+    assert bad_limit.status_code == 422
+
+
+def facet(result, field):
+    return {b["value"]: b["count"] for b in result["facets"][field]}
+
+
+def test_facets(vehicles):
+    catalog = Catalog(vehicles)
+    everything = catalog.facets()
+    assert everything["total"] == 10
+    assert facet(everything, "type") == {"SUV": 6, "Sedan": 4}
+    assert facet(everything, "make")["Toyota"] == 2
+    assert facet(everything, "year") == {2024: 10}
+    assert sum(b["count"] for b in everything["price"]["buckets"]) == 10
+
+    suvs = catalog.facets("suv", make="toyota", fields=["model", "features"])
+    assert suvs["total"] == 1
+    assert facet(suvs, "model") == {"RAV4": 1}
+    assert "Hybrid Option" in facet(suvs, "features")
+
+    # Edits after the index build are counted too
+    catalog.delete("1")
+    catalog.upsert(dict(vehicles[3], id="r1", price=76000))
+    after = catalog.facets()
+    assert after["total"] == 10
+    assert facet(after, "make")["Toyota"] == 1
+    assert after["price"]["max"] == 76000
+
+
+def test_mapped_catalog_facets_match(vehicles, tmp_path):
+    path = str(tmp_path / "catalog.vcat")
+    compile_catalog(vehicles, path)
+    mapped, parsed = Catalog(base=ColumnarCatalog(path)), Catalog(vehicles)
+    for query in [None, "suv", "toyta"]:
+        assert mapped.facets(query, fields=["make", "type", "features", "year"]) == parsed.facets(query, fields=["make", "type", "features", "year"])
+
+
+def test_price_histogram():
+    result = histogram(np.array([28000, 29000, 31000, 65000], dtype=np.float64), 8)
+    widths = {b["max"] - b["min"] for b in result["buckets"]}
+    assert widths == {5000}
+    assert result["buckets"][0] == {"min": 25000, "max": 30000, "count": 2}
+    assert (result["min"], result["max"]) == (28000, 65000)
+    assert histogram(np.array([]), 8)["buckets"] == []
+
+
+@pytest.mark.asyncio
+async def test_facets_endpoints():
+    async with AsyncClient(transport=ASGITransport(app=mock_app), base_url="http://test") as ac:
+        facets = await ac.get("/facets", params={"q": "suv", "fields": "make,type"})
+        search = await ac.get("/search", params={"q": "suv", "limit": 2, "facets": "type"})
+        plain = await ac.get("/search", params={"q": "suv", "limit": 2})
+        bad = await ac.get("/facets", params={"fields": "make,wheels"})
+    assert facets.status_code == 200
+    assert facet(facets.json(), "type") == {"SUV": 6}
+    assert set(facets.json()["facets"]) == {"make", "type"}
+    body = search.json()
+    assert len(body["results"]) == 2 and body["total"] == 6
+    assert facet(body, "type") == {"SUV": 6}
+    assert isinstance(plain.json(), list)
+    assert bad.status_code == 422
@@ -0,0 +1,111 @@
+import pytest
+from unittest.mock import MagicMock
+from servers.semantic_cache import SemanticCache, normalize_query
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalize_query():
+    assert normalize_query("What are popular SUVs right now?") == "popular suvs"
+
+
+def test_paraphrase_hits_and_unrelated_query_misses():
+    cache = SemanticCache(threshold=0.85)
+    cache.store("what are popular SUVs right now?", "RAV4 and CR-V.", model_calls=3)
+
+    assert cache.lookup("Popular SUVs, please") == "RAV4 and CR-V."
+    assert cache.lookup("what are popular sedans right now?") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+    assert stats["saved_model_calls"] == 3
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = SemanticCache(ttl_seconds=60, clock=clock)
+    cache.store("latest market trends for electric vehicles", "EVs are growing.")
+    assert len(cache) == 1
+
+    clock.now = 61
+    assert cache.lookup("latest market trends for electric vehicles") is None
+    assert len(cache) == 0
+
+
+def test_oldest_entry_is_evicted_when_full():
+    cache = SemanticCache(max_entries=2)
+    cache.store("popular suvs", "A")
+    cache.store("popular sedans", "B")
+    cache.store("popular trucks", "C")
+    assert cache.lookup("popular suvs") is None
+    assert cache.lookup("popular trucks") == "C"
+
+
+@pytest.mark.asyncio
+async def test_llm_fallback_uses_semantic_cache():
+    from servers.agent_server import ADKAgent
+    from agent_app.agent import root_agent
+    from google.genai.types import Content, Part
+
+    agent = ADKAgent(adk_agent=root_agent, app_name="cache_test", response_cache=SemanticCache())
+
+    async def fake_run_async(**kwargs):
+        for text in ["", "SUVs like the RAV4 are popular."]:
+            event = MagicMock()
+            event.content = Content(role="model", parts=[Part(text=text)])
+            event.usage_metadata = None
+            yield event
+
+    agent.runner = MagicMock()
+    agent.runner.run_async = MagicMock(side_effect=fake_run_async)
+
+    first = await agent.process_message("What are popular SUVs right now?", "cache_sess")
+    second = await agent.process_message("popular SUVs?", "cache_sess_2")
+
+    assert first["text"] == second["text"] == "SUVs like the RAV4 are popular."
+    assert agent.runner.run_async.call_count == 1
+    assert agent.response_cache.stats()["saved_model_calls"] == 2
+
+    # The answered turn is part of the session's history
+    session = await agent.ensure_session("cache_sess_2")
+    assert [e.content.parts[0].text for e in session.events] == ["popular SUVs?", "SUVs like the RAV4 are popular."]
+
+    # A session with history is not answered from (or stored in) the cache
+    await agent.process_message("popular SUVs", "cache_sess_2")
+    assert agent.runner.run_async.call_count == 2
+    assert agent.response_cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_follow_ups_are_not_shared_between_sessions():
+    from servers.agent_server import ADKAgent
+    from agent_app.agent import root_agent
+    from google.genai.types import Content, Part
+
+    agent = ADKAgent(adk_agent=root_agent, app_name="cache_follow_up", response_cache=SemanticCache())
+    answers = iter(["The Camry is a sedan.", "It gets 52 mpg.", "The F-150 is a truck.", "It tows 13,000 lbs."])
+
+    async def fake_run_async(user_id, session_id, new_message):
+        session = await agent.ensure_session(session_id)
+        await agent.record_turn(session, new_message.parts[0].text, "")
+        event = MagicMock()
+        event.content = Content(role="model", parts=[Part(text=next(answers))])
+        event.usage_metadata = None
+        yield event
+
+    agent.runner = MagicMock()
+    agent.runner.run_async = MagicMock(side_effect=fake_run_async)
+
+    await agent.process_message("tell me about the camry", "alice")
+    assert (await agent.process_message("tell me more", "alice"))["text"] == "It gets 52 mpg."
+    await agent.process_message("tell me about the f-150", "bob")
+    assert (await agent.process_message("more please", "bob"))["text"] == "It tows 13,000 lbs."
+    assert agent.runner.run_async.call_count == 4
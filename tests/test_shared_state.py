@@ -0,0 +1,92 @@
+import pytest
+from unittest.mock import patch
+from servers.shared_state import MemoryStore, SQLiteStore
+from servers.semantic_cache import SemanticCache
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStore()
+    return SQLiteStore(str(tmp_path / "state.db"))
+
+
+def test_store_get_set_delete(store):
+    assert store.get("ns", "a") is None
+    store.set("ns", "a", {"ids": ["1", "2"]})
+    assert store.get("ns", "a") == {"ids": ["1", "2"]}
+    assert store.get("other", "a") is None
+    store.delete("ns", "a")
+    assert store.get("ns", "a") is None
+
+
+def test_store_ttl_and_change_feed(store):
+    store.set("ns", "a", 1)
+    store.set("ns", "b", 2)
+    store.set("ns", "a", 3)  # rewrite moves "a" after "b"
+    items = store.items_since("ns", 0)
+    assert [(key, value) for _, key, value in items] == [("b", 2), ("a", 3)]
+    assert store.items_since("ns", items[-1][0]) == []
+
+    with patch("servers.shared_state.time.time", return_value=0):
+        store.set("ns", "short", "x", ttl=10)
+    assert store.get("ns", "short") is None
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+def test_expired_entries_are_purged_on_write(kind, tmp_path):
+    store = MemoryStore(purge_interval=0) if kind == "memory" else SQLiteStore(str(tmp_path / "state.db"), purge_interval=0)
+    with patch("servers.shared_state.time.time", return_value=0):
+        store.set("ns", "old", "x", ttl=10)
+    store.set("ns", "new", "y", ttl=10)
+    # The second write already removed the expired entry
+    assert store.purge_expired() == 0
+    assert [key for _, key, _ in store.items_since("ns", 0)] == ["new"]
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "state.db")
+    worker_a, worker_b = SQLiteStore(path), SQLiteStore(path)
+    worker_a.set("sessions", "s1", {"last_search": ["3"]})
+    assert worker_b.get("sessions", "s1") == {"last_search": ["3"]}
+
+
+def test_semantic_cache_entries_are_shared_across_workers(tmp_path):
+    path = str(tmp_path / "state.db")
+    cache_a = SemanticCache(shared_store=SQLiteStore(path))
+    cache_b = SemanticCache(shared_store=SQLiteStore(path))
+
+    cache_a.store("what are popular SUVs right now?", "RAV4 and CR-V.", model_calls=3)
+    assert cache_b.lookup("popular SUVs?") == "RAV4 and CR-V."
+    # Syncing its own write back does not duplicate the entry
+    assert cache_a.lookup("popular SUVs?") == "RAV4 and CR-V."
+    assert len(cache_a) == 1
+
+
+@pytest.mark.asyncio
+async def test_sessions_do_not_need_sticky_routing(tmp_path):
+    """Two agents standing in for two workers see the same conversation."""
+    from google.adk.events.event import Event
+    from google.adk.sessions.sqlite_session_service import SqliteSessionService
+    from google.genai.types import Content, Part
+    from servers.agent_server import ADKAgent, load_root_agent
+
+    path = str(tmp_path / "state.db")
+    worker_a = ADKAgent(app_name="multi_worker", agent_factory=load_root_agent)
+    worker_b = ADKAgent(app_name="multi_worker", agent_factory=load_root_agent)
+    worker_a.session_service = SqliteSessionService(path)
+    worker_b.session_service = SqliteSessionService(path)
+
+    session = await worker_a.ensure_session("sess_1")
+    await worker_a.session_service.append_event(
+        session, Event(author="user", invocation_id="inv1", content=Content(role="user", parts=[Part(text="Hi")]))
+    )
+
+    # The same session id on the other worker continues the conversation instead of starting over
+    session_b = await worker_b.ensure_session("sess_1")
+    assert [e.content.parts[0].text for e in session_b.events] == ["Hi"]
+
+    response = await worker_b.process_message(
+        "", "sess_1", event_payload={"type": "rowSelect", "payload": {"carId": "2"}}
+    )
+    assert "User selected car 2" in response["text"]
@@ -0,0 +1,138 @@
+import json
+import threading
+from pathlib import Path
+
+import numpy as np
+import pytest
+from httpx import AsyncClient, ASGITransport
+
+from benchmarks.synthetic import make_vehicles
+from servers.agent_server import app, route_intent
+from servers.catalog import Catalog, _feature_names
+from servers.catalog_format import ColumnarCatalog, compile_catalog
+from servers.mock_api_server import app as mock_app
+from servers.similarity import SimilarityIndex
+
+DATA_FILE = Path(__file__).resolve().parent.parent / "data" / "product_search.json"
+
+
+@pytest.fixture
+def vehicles():
+    with open(DATA_FILE) as f:
+        return json.load(f)
+
+
+def similar_ids(catalog, vehicle_ids, k=3):
+    return [v["id"] for _, v in catalog.similar(vehicle_ids, k)]
+
+
+def test_similar_vehicles(vehicles):
+    catalog = Catalog(vehicles)
+    results = catalog.similar(["1"], 3)  # Toyota Camry
+    assert results[0][1]["model"] == "Accord"
+    assert [score for score, _ in results] == sorted((score for score, _ in results), reverse=True)
+    assert "1" not in similar_ids(catalog, ["1"], k=20)
+    assert len(catalog.similar(["1"], 20)) == len(vehicles) - 1
+    assert catalog.similar(["nope"]) is None
+    # Several seeds: neighbours of their centroid, none of the seeds themselves
+    assert not {"1", "2"} & set(similar_ids(catalog, ["1", "2"]))
+
+
+def test_edits_rebuild_the_index(vehicles):
+    catalog = Catalog(vehicles)
+    catalog.similar(["1"])
+    catalog.upsert(dict(vehicles[0], id="1b", color="Blue"))
+    assert similar_ids(catalog, ["1"], k=1) == ["1b"]
+    catalog.delete("1b")
+    assert "1b" not in similar_ids(catalog, ["1"], k=20)
+
+
+def test_index_is_built_outside_the_catalog_lock(vehicles, monkeypatch):
+    catalog = Catalog(vehicles)
+    build = SimilarityIndex.build
+
+    def build_while_editing(*args):
+        # Another thread can take the lock (search or edit) now; this edit makes the build stale
+        acquired = []
+
+        def take_lock():
+            if catalog._lock.acquire(timeout=1):
+                acquired.append(True)
+                catalog._lock.release()
+
+        probe = threading.Thread(target=take_lock)
+        probe.start()
+        probe.join()
+        assert acquired == [True]
+        catalog.upsert(dict(vehicles[0], id="1b", color="Blue"))
+        return build(*args)
+
+    monkeypatch.setattr(SimilarityIndex, "build", build_while_editing)
+    assert "1b" not in similar_ids(catalog, ["1"], k=20)
+    monkeypatch.setattr(SimilarityIndex, "build", build)
+    # The stale index was not kept: the next call sees the edit
+    assert similar_ids(catalog, ["1"], k=1) == ["1b"]
+
+
+def test_mapped_catalog_similarity_matches(vehicles, tmp_path):
+    path = str(tmp_path / "catalog.vcat")
+    compile_catalog(vehicles, path)
+    mapped, parsed = Catalog(base=ColumnarCatalog(path)), Catalog(vehicles)
+    for seed in ["1", "4", "7"]:
+        assert similar_ids(mapped, [seed], k=5) == similar_ids(parsed, [seed], k=5)
+
+    mapped.delete("2")
+    mapped.upsert(dict(vehicles[0], id="1b"))
+    assert "2" not in similar_ids(mapped, ["1"], k=20)
+    assert similar_ids(mapped, ["1"], k=1) == ["1b"]
+
+
+def test_approximate_index_recall():
+    records = list(Catalog(make_vehicles(5000)).records())
+    exact = SimilarityIndex.build(None, records, _feature_names, approximate=False)
+    approximate = SimilarityIndex.build(None, records, _feature_names, approximate=True)
+    assert approximate.approximate and not exact.approximate
+
+    rng = np.random.default_rng(1)
+    found = 0
+    seeds = rng.choice(len(records), size=20, replace=False)
+    for seed in seeds:
+        vec = exact.query_vector([seed])
+        expected = set(exact.top_k(vec, 10, [seed])[0])
+        found += len(expected & set(approximate.top_k(vec, 10, [seed])[0]))
+    assert found / (10 * len(seeds)) >= 0.9
+
+
+def test_route_similar_intent():
+    assert route_intent("Find cars similar to the Camry") == "similar"
+    assert route_intent("show me cars like the RAV4") == "similar"
+    assert route_intent("Find Toyota cars") == "search"
+
+
+@pytest.mark.asyncio
+async def test_similar_endpoint():
+    async with AsyncClient(transport=ASGITransport(app=mock_app), base_url="http://test") as ac:
+        response = await ac.get("/similar", params={"vehicle_id": "1", "k": 2})
+        missing = await ac.get("/similar", params={"vehicle_id": "nope"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["vehicles"][0]["model"] == "Camry"
+    assert [v["model"] for v in body["results"]][0] == "Accord"
+    assert len(body["results"]) == 2 and "similarity" in body["results"][0]
+    assert response.headers["ETag"]
+    assert missing.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_similar_chat_table(mock_api_server, monkeypatch):
+    monkeypatch.setattr("servers.agent_server.MOCK_API_URL", mock_api_server)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        response = await ac.post("/chat", json={"query": "Show me cars similar to the Camry", "session_id": "similar"})
+        unknown = await ac.post("/chat", json={"query": "Show me something similar", "session_id": "similar2"})
+    a2ui_msg = json.loads(response.json()["text"])
+    assert a2ui_msg["surfaceType"] == "table"
+    assert "Similarity" in a2ui_msg["data"]["columns"]
+    rows = a2ui_msg["data"]["rows"]
+    assert rows[0]["model"] == "Accord" and rows[0]["price"] == "$29,000"
+    assert all(r["model"] != "Camry" for r in rows)
+    assert "Which car" in unknown.json()["text"]
@@ -62,3 +62,27 @@ async def test_negotiate_price_tool():
         
         assert result["status"] == "accepted"
         mock_post.assert_awaited_once()
+
+
+def test_tool_slots_follow_the_running_loop(monkeypatch):
+    import asyncio
+
+    from agent_app.agent import bounded
+
+    monkeypatch.setattr("agent_app.agent.TOOL_CONCURRENCY", 1)
+    running, peak = [0], [0]
+
+    @bounded
+    async def tool():
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+
+    async def contended():
+        await asyncio.gather(tool(), tool(), tool())
+
+    # A semaphore made at import would be bound to the first loop and fail in the second
+    asyncio.run(contended())
+    asyncio.run(contended())
+    assert peak[0] == 1
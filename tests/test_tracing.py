@@ -0,0 +1,66 @@
+import pytest
+from httpx import AsyncClient, ASGITransport
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from servers.agent_server import app
+from servers.tracing import add_exporter
+
+exporter = InMemorySpanExporter()
+add_exporter(exporter)
+
+
+@pytest.fixture(autouse=True)
+def clear_spans():
+    exporter.clear()
+    yield
+
+
+@pytest.mark.asyncio
+async def test_search_turn_is_traced_end_to_end(mock_api_server, monkeypatch):
+    monkeypatch.setattr("servers.agent_server.MOCK_API_URL", mock_api_server)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        response = await ac.post("/chat", json={"query": "Find Toyota cars", "session_id": "trace_sess"})
+    assert response.status_code == 200
+
+    # First finished span per name: the search call finishes before the facets call
+    spans = {}
+    for span in exporter.get_finished_spans():
+        spans.setdefault(span.name, span)
+    for name in ["POST /chat", "chat_turn", "route_intent", "tool.search_cars", "HTTP GET",
+                 "GET /search", "a2ui.validate", "a2ui.serialize"]:
+        assert name in spans, f"missing span {name}: {sorted(spans)}"
+
+    trace_id = spans["POST /chat"].context.trace_id
+    # The mock API continues the agent server's trace through the traceparent header
+    assert spans["GET /search"].context.trace_id == trace_id
+    assert spans["GET /search"].parent.span_id == spans["HTTP GET"].context.span_id
+    assert spans["HTTP GET"].parent.span_id == spans["tool.search_cars"].context.span_id
+    assert spans["route_intent"].attributes["agent.intent"] == "search"
+    assert spans["a2ui.serialize"].attributes["a2ui.surface_type"] == "table"
+
+
+@pytest.mark.asyncio
+async def test_event_turn_records_intent():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        payload = {"query": "", "session_id": "trace_event", "event": {"type": "rowSelect", "payload": {"carId": "2"}}}
+        await ac.post("/chat", json=payload)
+
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    assert spans["chat_turn"].attributes["agent.intent"] == "event"
+    assert spans["chat_turn"].attributes["session.id"] == "trace_event"
+
+
+@pytest.mark.asyncio
+async def test_agent_tools_open_client_spans(mock_api_server, monkeypatch):
+    from agent_app.agent import compare_vehicles_tool
+    from servers.tracing import get_tracer
+
+    monkeypatch.setattr("agent_app.agent.API_BASE_URL", mock_api_server)
+    with get_tracer().start_as_current_span("tool_call") as parent:
+        await compare_vehicles_tool("1", "2")
+
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    assert spans["HTTP GET"].parent.span_id == parent.get_span_context().span_id
+    assert spans["HTTP GET"].attributes["http.status_code"] == 200
+    # The mock API continues the trace from the injected headers
+    assert spans["GET /compare"].parent.span_id == spans["HTTP GET"].context.span_id
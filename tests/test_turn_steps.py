@@ -0,0 +1,84 @@
+import json
+import time
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+
+from servers.agent_server import TurnStep, app, execute_steps, plan_turn
+
+
+def test_plan_turn():
+    steps = plan_turn("compare the Camry and Accord and book the cheaper one for Friday")
+    assert [(s.intent, s.text, s.depends_on) for s in steps] == [
+        ("compare", "compare the Camry and Accord", None),
+        ("book", "book the cheaper one for Friday", 0),
+    ]
+    # Independent clauses, one naming its own vehicle
+    steps = plan_turn("find Honda cars and then find cars similar to the Camry")
+    assert [(s.intent, s.depends_on) for s in steps] == [("search", None), ("similar", None)]
+    # "and" inside one action, or followed by something that is not a tool action
+    assert len(plan_turn("Compare vehicle 1 and vehicle 3")) == 1
+    assert len(plan_turn("Find Toyota cars and show me the cheapest")) == 1
+
+
+def slow_step(delays):
+    def run(step, prior, working_set=None):
+        time.sleep(delays[step.index])
+        return {"text": f"{step.index}<-{prior['text'] if prior else None}", "data": None}
+    return run
+
+
+@pytest.mark.asyncio
+async def test_independent_steps_run_concurrently(monkeypatch):
+    monkeypatch.setattr("servers.agent_server.run_tool_step", slow_step([0.3, 0.1, 0.1]))
+    steps = [TurnStep(0, "search", "a"), TurnStep(1, "search", "b"), TurnStep(2, "book", "c", depends_on=1)]
+    start = time.perf_counter()
+    finished = [(index, result["text"]) async for index, result in execute_steps(steps)]
+    elapsed = time.perf_counter() - start
+
+    # Each surface is yielded as soon as it is ready; the dependent step saw its input
+    assert finished == [(1, "1<-None"), (2, "2<-1<-None"), (0, "0<-None")]
+    assert elapsed < 0.45
+
+
+@pytest.mark.asyncio
+async def test_step_concurrency_is_bounded(monkeypatch):
+    monkeypatch.setattr("servers.agent_server.run_tool_step", slow_step([0.1, 0.1, 0.1]))
+    monkeypatch.setattr("servers.agent_server.TOOL_CONCURRENCY", 1)
+    start = time.perf_counter()
+    results = [i async for i, _ in execute_steps([TurnStep(i, "search", str(i)) for i in range(3)])]
+    assert sorted(results) == [0, 1, 2]
+    assert time.perf_counter() - start >= 0.3
+
+
+@pytest.mark.asyncio
+async def test_multi_step_chat(mock_api_server, monkeypatch):
+    monkeypatch.setattr("servers.agent_server.MOCK_API_URL", mock_api_server)
+    query = "compare the Camry and Accord and book the cheaper one for Friday"
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        response = await ac.post("/chat", json={"query": query, "session_id": "multi"})
+        streamed = await ac.post("/chat/stream", json={"query": query, "session_id": "multi_stream"})
+        structured = await ac.post(
+            "/chat/stream", json={"query": query, "session_id": "multi_structured", "response_format": "structured"}
+        )
+
+    body = response.json()
+    # compat (the default): every A2UI message is a JSON string, in `text` and in `surfaces`
+    surfaces = [json.loads(s) for s in body["surfaces"]]
+    assert [s["surfaceType"] for s in surfaces] == ["card-comparison", "booking-form"]
+    assert json.loads(body["text"]) == surfaces[0] and body["data"] is None
+    # The Camry ($28,000) is cheaper than the Accord ($29,000)
+    form = surfaces[1]["data"]
+    assert {k: form[k] for k in ("carId", "make", "model")} == {"carId": "1", "make": "Toyota", "model": "Camry"}
+    # Pre-filled with the car's next open test-drive dates
+    assert len(form["slots"]) == 5 and form["slots"] == sorted(form["slots"])
+
+    assert streamed.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in streamed.text.splitlines()]
+    assert lines[-1] == {"done": True, "steps": 2}
+    assert sorted(line["index"] for line in lines[:-1]) == [0, 1]
+    assert all(line["data"] is None for line in lines[:-1])
+    assert {json.loads(line["text"])["surfaceType"] for line in lines[:-1]} == {"card-comparison", "booking-form"}
+    # structured: objects in `data`, as from /chat
+    lines = [json.loads(line) for line in structured.text.splitlines()]
+    assert {line["data"]["surfaceType"] for line in lines[:-1]} == {"card-comparison", "booking-form"}
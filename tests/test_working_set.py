@@ -0,0 +1,83 @@
+import json
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+
+from servers.agent_server import app, resolve_cars
+from servers.shared_state import SQLiteStore
+from servers.working_set import WorkingSet
+
+ROWS = [
+    {"id": "1", "make": "Toyota", "model": "Camry", "year": 2024, "price": "$28,000"},
+    {"id": "5", "make": "Toyota", "model": "RAV4", "year": 2024, "price": "$30,000"},
+]
+
+
+def table(rows):
+    return {"surfaceType": "table", "data": {"rows": rows}}
+
+
+def test_working_set_tracks_what_was_shown(tmp_path):
+    working_set = WorkingSet()
+    assert not working_set
+    working_set.observe(table(ROWS))
+    working_set.select(ROWS[1])
+    assert working_set.results[0] == ("1", "Toyota", "Camry", 2024, 28000.0)
+
+    store = SQLiteStore(str(tmp_path / "state.db"))
+    working_set.save(store, "s")
+    loaded = WorkingSet.load(store, "s")
+    assert loaded.results == working_set.results and loaded.selection()["id"] == "5"
+
+    loaded.observe({"surfaceType": "card-comparison", "data": {"cars": ROWS[::-1]}})
+    assert [car["id"] for car in loaded.candidates()] == ["5", "1"]
+    # A new table replaces the results and drops the selection made in the old one
+    loaded.observe(table(ROWS[:1]))
+    assert loaded.selected is None and [car["id"] for car in loaded.candidates()] == ["1"]
+
+
+def test_resolve_cars():
+    working_set = WorkingSet()
+    working_set.observe(table(ROWS))
+    assert [c["id"] for c in resolve_cars("book", "book the more expensive one", [], working_set, 1)] == ["5"]
+    assert [c["id"] for c in resolve_cars("book", "book it", [], working_set, 1)] == ["1"]
+    working_set.select(ROWS[1])
+    assert [c["id"] for c in resolve_cars("book", "book it", [], working_set, 1)] == ["5"]
+    # Named vehicles win; a back-reference takes its car from the working set, the text the rest
+    assert [c["id"] for c in resolve_cars("book", "book the Accord", [], working_set, 1)] == ["2"]
+    assert [c["id"] for c in resolve_cars("compare", "compare it with the Accord", [], working_set, 2)] == ["5", "2"]
+    assert resolve_cars("book", "book a test drive", [], WorkingSet(), 1) == []
+
+
+def test_back_references_do_not_scan_the_text(monkeypatch):
+    monkeypatch.setattr("servers.agent_server.find_vehicles_in_text", pytest.fail)
+    working_set = WorkingSet()
+    working_set.observe(table(ROWS))
+    assert [c["id"] for c in resolve_cars("book", "book the cheaper one", [], working_set, 1)] == ["1"]
+    assert [c["id"] for c in resolve_cars("compare", "compare them", [], working_set, 2)] == ["1", "5"]
+    working_set.select(ROWS[1])
+    assert [c["id"] for c in resolve_cars("book", "book it", [], working_set, 1)] == ["5"]
+
+
+@pytest.mark.asyncio
+async def test_book_and_compare_use_the_session(mock_api_server, monkeypatch):
+    monkeypatch.setattr("servers.agent_server.MOCK_API_URL", mock_api_server)
+
+    async def chat(ac, session_id, query=None, event=None):
+        response = await ac.post("/chat", json={"query": query or "", "session_id": session_id, "event": event})
+        text = response.json()["text"]
+        return json.loads(text)["data"] if text.startswith("{") else text
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        await chat(ac, "ws1", "Find Honda cars")
+        form = await chat(ac, "ws1", "book the cheaper one")
+        assert (form["make"], form["model"]) == ("Honda", "Accord")
+        comparison = await chat(ac, "ws1", "compare them")
+        assert [car["model"] for car in comparison["cars"]] == ["Accord", "CR-V"]
+
+        await chat(ac, "ws2", "Find Toyota cars")
+        await chat(ac, "ws2", event={"type": "rowSelect", "payload": {"carId": "5"}})
+        form = await chat(ac, "ws2", "I want to book it")
+        assert form["model"] == "RAV4"
+        # Another session is unaffected
+        assert (await chat(ac, "ws3", "I want to book it"))["make"] == "Tesla"
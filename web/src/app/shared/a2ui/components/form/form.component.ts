@@ -78,6 +78,22 @@ import { FormsModule } from '@angular/forms';
               [style.color]="disabled ? '#9ca3af' : '#374151'"
               class="w-full border border-gray-300 focus:ring-2 focus:ring-green-500 focus:border-green-500 outline-none transition-all text-gray-700"
             >
+            <!-- Open test-drive dates from the availability calendar -->
+            <div *ngIf="data.slots?.length" class="flex flex-wrap gap-2 mt-3">
+              <span class="text-sm text-gray-600 self-center">Open:</span>
+              <button
+                *ngFor="let slot of data.slots"
+                type="button"
+                (click)="formData.date = slot"
+                [disabled]="disabled"
+                style="border-radius: 9999px; padding: 4px 12px;"
+                [style.background-color]="formData.date === slot ? '#15803d' : '#ffffff'"
+                [style.color]="formData.date === slot ? '#ffffff' : '#15803d'"
+                class="text-sm border border-green-600 transition-colors"
+              >
+                {{slot}}
+              </button>
+            </div>
           </div>
 
           <!-- Actions -->
@@ -112,7 +128,7 @@ import { FormsModule } from '@angular/forms';
   `
 })
 export class FormComponent {
-  @Input() data: any; // { carId, make, model, year, price, image }
+  @Input() data: any; // { carId, make, model, year, price, image, slots }
   @Input() surfaceId!: string;
   @Input() disabled = false;
   @Output() clientEvent = new EventEmitter<any>();
@@ -7,6 +7,13 @@ import { CommonModule } from '@angular/common';
   standalone: true,
   imports: [CommonModule],
   template: `
+    <div class="facets" *ngIf="data.facets">
+      <span class="total">{{data.facets.total}} matches</span>
+      <span *ngFor="let field of facetFields()" class="facet">
+        <strong>{{field}}:</strong>
+        <span *ngFor="let bucket of data.facets.facets[field]">{{bucket.value}} ({{bucket.count}})</span>
+      </span>
+    </div>
     <div class="overflow-x-auto">
       <table>
         <thead>
@@ -44,6 +51,16 @@ import { CommonModule } from '@angular/common';
       font-weight: bold;
       text-transform: capitalize;
     }
+    .facets {
+      display: flex;
+      flex-wrap: wrap;
+      gap: 8px 16px;
+      font-size: 0.85em;
+      margin-top: 10px;
+    }
+    .facet span + span::before {
+      content: ', ';
+    }
     tr:hover {
       background-color: rgba(0,0,0,0.05);
     }
@@ -55,6 +72,10 @@ export class TableComponent {
   @Output() clientEvent = new EventEmitter<any>();
   eventType = 'rowSelect';
 
+  facetFields(): string[] {
+    return Object.keys(this.data.facets?.facets || {});
+  }
+
   onRowClick(row: any) {
     // Send back the selected car ID
     this.clientEvent.emit({ carId: row.id, surfaceId: this.surfaceId });